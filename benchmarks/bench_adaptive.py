@@ -0,0 +1,37 @@
+"""
+Compares the fixed-step numerov integration against the adaptive-step one for high n.
+For hydrogen (integer n) the dipole overlap <n l|r|n+dn l+1> is known exactly from the
+Gordon formula, so each method is reported with its number of points, time per
+wavefunction and relative error.
+
+run from the top of the repository:  python -m benchmarks.bench_adaptive
+"""
+from timeit import repeat
+from rydprop.numerov import wf_prealloc,wf_adaptive,wf_overlap
+from rydprop.hydrogenic import gordon_dipole
+
+def fixed(n,l,nmax,step):
+    r,y = wf_prealloc(n,l,nmax,step)
+    return r,y,len(r)
+
+def adaptive(n,l,nmax,tol):
+    return wf_adaptive(n,l,nmax,0.005,0.65,tol)
+
+def run(label,method,arg,n,l,dn,number=5):
+    nmax = float(n + dn)
+    r1,y1,points = method(float(n),l,nmax,arg)
+    r2,y2,_ = method(float(n + dn),l + 1,nmax,arg)
+    error = wf_overlap(r1,y1,r2,y2,1.0) / gordon_dipole(n,l,n + dn,l + 1) - 1.0
+    t = min(repeat(lambda: method(float(n),l,nmax,arg),number=number,repeat=3)) / number
+    print("{:>5} {:>4} {:>22} {:>8} {:>10.1f} {:>10.1e}".format(n,l,label,points,t*1e6,error))
+
+def main(ns=(80,100,120,150),l=3,dn=1):
+    print("{:>5} {:>4} {:>22} {:>8} {:>10} {:>10}".format('n','l','method','points','time (us)','rel. error'))
+    for n in ns:
+        for step in (0.005,0.001):
+            run('fixed step='+str(step),fixed,step,n,l,dn)
+        for tol in (1e-6,1e-7):
+            run('adaptive tol='+str(tol),adaptive,tol,n,l,dn)
+
+if __name__ == '__main__':
+    main()
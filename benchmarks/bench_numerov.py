@@ -0,0 +1,38 @@
+"""
+Micro-benchmark of the list based numerov integrator wf() against the preallocated
+nopython wf_prealloc() for n = 10...150. Reports the time per call and the largest
+difference between the two outputs.
+
+run from the top of the repository:  python -m benchmarks.bench_numerov
+"""
+from timeit import repeat
+import numpy as np
+from rydprop.numerov import wf,wf_prealloc
+
+def compare(n,l,nmax,number=20):
+    """
+    returns the best time per call of wf and wf_prealloc, in seconds, and the
+    maximum absolute difference in r and y.
+    """
+    r1,y1 = wf(n,l,nmax)
+    r2,y2 = wf_prealloc(n,l,nmax)
+    if len(r1) != len(r2):
+        raise RuntimeError("wf and wf_prealloc returned different lengths for n = "+str(n))
+    dr = np.max(np.abs(r1 - r2))
+    dy = np.max(np.abs(y1 - y2))
+
+    t_list = min(repeat(lambda: wf(n,l,nmax),number=number,repeat=5)) / number
+    t_prealloc = min(repeat(lambda: wf_prealloc(n,l,nmax),number=number,repeat=5)) / number
+    return t_list,t_prealloc,dr,dy
+
+def main(ns=range(10,151,10),l=2,defect=0.0029):
+    print("{:>5} {:>8} {:>12} {:>12} {:>8} {:>10} {:>10}".format('n','points','wf (us)','prealloc (us)','speedup','max |dr|','max |dy|'))
+    for n in ns:
+        neff = n - defect
+        points = len(wf_prealloc(neff,l,neff)[0])
+        t_list,t_prealloc,dr,dy = compare(neff,l,neff)
+        print("{:>5} {:>8} {:>12.1f} {:>12.1f} {:>8.2f} {:>10.2e} {:>10.2e}".format(
+            n,points,t_list*1e6,t_prealloc*1e6,t_list/t_prealloc,dr,dy))
+
+if __name__ == '__main__':
+    main()
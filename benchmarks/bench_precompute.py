@@ -0,0 +1,35 @@
+"""
+Benchmark of RydbergAtom.precompute_radial: the numerov dipole integrals of a block of
+helium-like states, in one process and in pools of increasing size.
+
+run from the top of the repository:  python -m benchmarks.bench_precompute
+"""
+import os
+import time
+from rydprop.atom import RydbergAtom
+from rydprop.state import State_nlm
+from rydprop.numerov import clear_wf_cache
+
+defects = {0:{1:[0.29665486,0.0]},1:{2:[0.06835886,0.0]},2:{3:[0.00289043,0.0]},3:{4:[0.00043,0.0]}}
+
+def run(states,workers):
+    clear_wf_cache()
+    atom = RydbergAtom(defects=defects,radial_backend='numerov')
+    start = time.perf_counter()
+    pairs = atom.precompute_radial(states,workers=workers)
+    return time.perf_counter() - start,pairs
+
+def main(ns=range(40,61),lmax=8):
+    states = [State_nlm(n,l,0) for n in ns for l in range(min(n,lmax+1))]
+    t_serial,pairs = run(states,1)
+    print("{} states, {} dipole pairs".format(len(states),pairs))
+    print("{:>8} {:>10} {:>8}".format('workers','time (s)','speedup'))
+    print("{:>8} {:>10.3f} {:>8.2f}".format(1,t_serial,1.0))
+    workers = 2
+    while workers <= (os.cpu_count() or 1):
+        t,_ = run(states,workers)
+        print("{:>8} {:>10.3f} {:>8.2f}".format(workers,t,t_serial/t))
+        workers *= 2
+
+if __name__ == '__main__':
+    main()
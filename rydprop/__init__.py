@@ -2,7 +2,9 @@ from .atom import RydbergAtom
 from .elements import TripletHelium
 from .state import State_nlm
 from .space import Space
-from .interaction import magnetic_interaction,interaction,electric_interaction
+from .symmetric import Symmetric_matrix
+from .matrix_free import Stark_operator
+from .interaction import magnetic_interaction,interaction,electric_interaction,radial_moment_matrices,spherical_operators,polarisation_operator,field_vector,diamagnetic_interaction,field_interactions,Field_hamiltonian
 from .units import *   #sets up the units conversions
 from .floquet import Floquet_space
 from .adiabatic import Adiabatic
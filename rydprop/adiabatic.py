@@ -2,6 +2,7 @@ from .state import State_nlm
 from scipy.sparse import coo_matrix,csr_matrix,diags
 import numpy as np
 from tqdm import tqdm
+from .interaction import selection_pairs,electric_elements
 """
 module which creates an object based around a 'space' which contains the evolution of
 an eigenvector and eigenvalue with a field parameter.
@@ -103,7 +104,7 @@ def angular_wf(adi_state1,parameter):
 # FUNCTIONS FOR GETTING EVOLUTION OF THE TRANSITION DIPOLE MOMENT BETWEEN TWO STATES. CURRENTLY REQUIRES BOTH TO HAVE THE SAME
 # SPACE.
 
-def get_dipole_coupling_matrix(adi_state1,adi_state2,parallel):
+def get_dipole_coupling_matrix(adi_state1,adi_state2,parallel,workers=None):
     """
     computes the dipole coupling matrix between two spaces.
 
@@ -115,6 +116,8 @@ def get_dipole_coupling_matrix(adi_state1,adi_state2,parallel):
         second state
     para: boolean
         if the field is parallel to the space.
+    workers: int
+        number of threads computing the matrix elements when both states share a space
 
     returns
     -------
@@ -129,6 +132,16 @@ def get_dipole_coupling_matrix(adi_state1,adi_state2,parallel):
     else:
         selection_rules={'dl':1,'dml':1}
 
+    if adi_state1.space is adi_state2.space:
+        #only the pairs allowed by the selection rules, computed in bulk
+        space = adi_state1.space
+        rows,cols = selection_pairs(space.array['l'],space.array['ml'],1,(0,) if parallel == True else (-1,1))
+        elements = electric_elements(space,rows,cols,parallel,workers)
+        nonzero = elements != 0.0
+        rows,cols,elements = rows[nonzero],cols[nonzero],elements[nonzero]
+        return coo_matrix((np.concatenate((elements,elements)),(np.concatenate((rows,cols)),np.concatenate((cols,rows)))),
+                          shape = (len(space),len(space)))
+
     space1_index_list=[]
     space2_index_list=[]
     value=[]
@@ -150,7 +163,6 @@ def get_dipole_coupling_matrix(adi_state1,adi_state2,parallel):
                     value.append(matrix_value)
     dipole_matrix = coo_matrix( (value,(space1_index_list,space2_index_list)),\
                                shape = (len(adi_state1.space),len(adi_state2.space)))
-    print(np.sum(dipole_matrix.toarray()[0][:]))
     return dipole_matrix
 
 def _get_transition_dipole(adi_state1,adi_state2,coupling_matrix,param):
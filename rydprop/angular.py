@@ -5,6 +5,8 @@
 Functions to compute angular integrals.
 """
 import sqlite3
+import functools
+import numpy as np
 from numba import jit
 
 @jit
@@ -47,3 +49,79 @@ def angular_overlap_analytical(L_1, L_2, M_1, M_2,para):
                 overlap = (-(0.5*(-1)**(-M+2*L)) * (((L+M-1)*(L+M))  /((2*L-1)*(2*L+1)))**0.5)
     return overlap
 
+
+
+@jit(nopython=True, cache=True)
+def _fill_angular_table(lmax):
+    table = np.zeros((2, lmax, 2*lmax - 1, 2, 3))
+    for p in range(2):
+        for L in range(lmax):
+            for M in range(-L, L+1):
+                for i in range(2):
+                    for j in range(3):
+                        table[p, L, M + lmax - 1, i, j] = angular_overlap_analytical(L, L + 2*i - 1, M, M + j - 1, p == 0)
+    return table
+
+@functools.lru_cache(maxsize=8)
+def angular_table(lmax):
+    """
+    every non-zero value of angular_overlap_analytical for l < lmax, |ml| <= l, as a read-only array
+    indexed [polarisation, l, ml + lmax - 1, dL index, dM index], where polarisation is 0 for parallel
+    and 1 for perpendicular, dL index is (dL+1)//2 and dM index is dM+1. tables are built once per lmax.
+
+    Parameters
+    ----------
+    lmax: int
+        one more than the largest l of the first state
+    """
+    if lmax < 1:
+        raise ValueError("lmax must be at least 1, got " + str(lmax))
+    table = _fill_angular_table(int(lmax))
+    table.flags.writeable = False
+    return table
+
+@jit(nopython=True, nogil=True, cache=True)
+def angular_factor(table, L_1, L_2, M_1, M_2, para):
+    """
+    angular_overlap_analytical from a table made by angular_table, for use in nopython code.
+    """
+    lmax = table.shape[1]
+    dL = L_2 - L_1
+    dM = M_2 - M_1
+    if (dL != 1 and dL != -1) or dM < -1 or dM > 1 or L_1 < 0 or L_1 >= lmax or abs(M_1) > L_1:
+        return 0.0
+    return table[0 if para else 1, L_1, M_1 + lmax - 1, (dL + 1)//2, dM + 1]
+
+def angular_factors(table, L_1, L_2, M_1, M_2, para):
+    """
+    angular_factor for arrays of quantum numbers, gathered from the table in one indexing operation.
+    pairs outside the dipole selection rules are zero.
+    """
+    L_1, L_2, M_1, M_2 = np.broadcast_arrays(*[np.asarray(x, dtype=np.int64) for x in (L_1, L_2, M_1, M_2)])
+    lmax = table.shape[1]
+    dL = L_2 - L_1
+    dM = M_2 - M_1
+    allowed = (np.abs(dL) == 1) & (np.abs(dM) <= 1) & (L_1 >= 0) & (L_1 < lmax) & (np.abs(M_1) <= L_1)
+    factors = table[0 if para else 1, np.where(allowed, L_1, 0), np.where(allowed, M_1 + lmax - 1, 0),
+                    np.where(allowed, (dL + 1)//2, 0), np.where(allowed, dM + 1, 0)]
+    return np.where(allowed, factors, 0.0)
+
+def sin_squared_factors(L_1, L_2, M):
+    """
+    <l1, m| sin^2(theta) |l2, m> for arrays of quantum numbers, from 1 - cos^2(theta) with cos(theta)
+    summed over the intermediate l, in the phase convention of angular_overlap_analytical. non-zero only
+    for l2 - l1 in (-2, 0, 2).
+    """
+    L_1, L_2, M = np.broadcast_arrays(*[np.asarray(x, dtype=np.int64) for x in (L_1, L_2, M)])
+
+    def cos_factor(L):
+        #<L, m| cos(theta) |L+1, m>, zero where either state does not exist
+        allowed = (L >= 0) & (np.abs(M) <= L)
+        return np.where(allowed, np.sqrt(np.where(allowed, ((L + 1)**2 - M**2)/((2*L + 3)*(2*L + 1)), 0.0)), 0.0)
+
+    L = np.minimum(L_1, L_2)
+    dL = np.abs(L_2 - L_1)
+    diagonal = 1.0 - cos_factor(L)**2 - cos_factor(L - 1)**2
+    off_diagonal = -cos_factor(L) * cos_factor(L + 1)
+    allowed = np.abs(M) <= L
+    return np.where(allowed & (dL == 0), diagonal, np.where(allowed & (dL == 2), off_diagonal, 0.0))
@@ -1,14 +1,18 @@
 """
 Basic class to compute atom properties. Using GHz as the energy.
 """
-from .numerov import radial_overlap,wf
+from .numerov import cached_radial_overlap,radial_moments,wf
+from .radial import Radial_grid,Radial_table,thread_map
+from .hydrogenic import radial_overlap_hydrogenic
+from .store import Radial_store,grids
+from .precompute import pair_key,radial_pairs,compute_pairs
 from .angular import angular_overlap_analytical
 from .state import basis_options
 
 import scipy.constants as consts
 from numba import jit
 import numpy as np
-import functools
+from collections import OrderedDict
 from scipy import special as sp
 m_e = consts.physical_constants['electron mass'][0]
 R_0 = consts.physical_constants['Rydberg constant'][0]
@@ -21,8 +25,209 @@ e = consts.physical_constants['elementary charge'][0]
 epsilon_0 = consts.epsilon_0
 hbar = consts.hbar
 
+#largest n and l whose matrix elements can be cached, see Element_cache.keys
+element_nmax = 2048
+element_lmax = 1024
+#key of the pairs which cannot be packed, never stored
+unpacked_key = np.uint64(2**64 - 1)
+
+class Element_cache:
+    def __init__(self,max_entries=2**20):
+        """
+        least-recently-used store of matrix elements keyed on the two states, the polarisation and
+        the power of r. matrix elements are symmetric, <a|r|b> = <b|r|a> for the real angular factors
+        of angular_overlap_analytical, so the two states are put in a fixed order and both share an entry.
+        the two states are packed into one uint64, see keys, and the elements of each polarisation and
+        power are kept in arrays sorted on it, so the elements of a whole interaction are looked up and
+        added with searchsorted rather than one at a time. elements added one at a time wait in a
+        dictionary until they are merged into the arrays.
+
+        Parameters
+        ----------
+        max_entries: int
+            maximum number of matrix elements held, 0 turns the cache off
+        """
+        if max_entries < 0:
+            raise ValueError("max_entries must be positive, got " + str(max_entries))
+        self.max_entries = max_entries
+        #(para,order) -> [sorted keys, values, time of last use]
+        self._tables = {}
+        #(para,order,key) -> (value, time of last use), merged into the tables in bulk
+        self._pending = OrderedDict()
+        self._clock = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._pending) + sum(len(table[0]) for table in self._tables.values())
+
+    @staticmethod
+    def keys(numbers1,numbers2):
+        """
+        key of the pair of states of each pair of rows of two structured arrays of quantum numbers
+        (n,l,ml), such as Space.array, as a uint64 array. each state takes 32 bits, n, l and l + ml,
+        and the lower is put first. pairs with n >= element_nmax or l >= element_lmax get
+        unpacked_key and are never held.
+        """
+        packed = []
+        valid = np.ones(len(numbers1),dtype=bool)
+        for numbers in (numbers1,numbers2):
+            n = np.asarray(numbers['n'],dtype=np.int64)
+            l = np.asarray(numbers['l'],dtype=np.int64)
+            ml = np.asarray(numbers['ml'],dtype=np.int64)
+            valid &= (n >= 0) & (n < element_nmax) & (l >= 0) & (l < element_lmax) & (np.abs(ml) <= l)
+            packed.append(((n << 21) | (l << 11) | (l + ml)).astype(np.uint64))
+        low = np.minimum(packed[0],packed[1])
+        high = np.maximum(packed[0],packed[1])
+        keys = (low << np.uint64(32)) | high
+        keys[~valid] = unpacked_key
+        return keys
+
+    @staticmethod
+    def key(state1,state2,para,order=1.0):
+        """
+        key of a matrix element, the same for both orders of the states.
+        """
+        numbers = np.array([(state1.n,state1.l,state1.ml),(state2.n,state2.l,state2.ml)],
+                           dtype=[('n','i8'),('l','i8'),('ml','i8')])
+        return (bool(para),float(order),int(Element_cache.keys(numbers[:1],numbers[1:])[0]))
+
+    def _tick(self,count=1):
+        self._clock += count
+        return self._clock - count
+
+    def get(self,key):
+        """
+        the matrix element for key, None if it is not held.
+        """
+        para,order,packed = key
+        if key in self._pending:
+            value,_ = self._pending.pop(key)
+            self._pending[key] = (value,self._tick())
+            self.hits += 1
+            return value
+        table = self._tables.get((para,order))
+        if table is not None:
+            i = np.searchsorted(table[0],np.uint64(packed))
+            if i < len(table[0]) and table[0][i] == packed:
+                table[2][i] = self._tick()
+                self.hits += 1
+                return float(table[1][i])
+        self.misses += 1
+        return None
+
+    def lookup(self,keys,para,order=1.0):
+        """
+        the matrix elements of an array of keys, from keys, for the polarisation para and power order,
+        counted as get. returns an array of the values, nan where they are not held, and the indices
+        of the keys which are not held.
+        """
+        keys = np.asarray(keys,dtype=np.uint64)
+        self._merge()
+        values = np.full(len(keys),np.nan)
+        table = self._tables.get((bool(para),float(order)))
+        found = np.zeros(len(keys),dtype=bool)
+        if table is not None and len(table[0]) > 0:
+            positions = np.minimum(np.searchsorted(table[0],keys),len(table[0]) - 1)
+            found = table[0][positions] == keys
+            values[found] = table[1][positions[found]]
+            table[2][positions[found]] = self._tick(len(keys)) + np.flatnonzero(found)
+        self.hits += int(np.count_nonzero(found))
+        self.misses += len(keys) - int(np.count_nonzero(found))
+        return values,np.flatnonzero(~found)
+
+    def add(self,key,value):
+        if self.max_entries == 0 or key[2] == unpacked_key:
+            return
+        self._pending.pop(key,None)
+        self._pending[key] = (value,self._tick())
+        if len(self._pending) >= 4096:
+            self._merge()
+        self._evict()
+
+    def update(self,keys,values,para,order=1.0):
+        """
+        add the matrix elements of an array of keys, from keys, for the polarisation para and power
+        order. a batch larger than max_entries would only evict itself, so is not added.
+        """
+        keys = np.asarray(keys,dtype=np.uint64)
+        values = np.asarray(values,dtype=float)
+        keep = keys != unpacked_key
+        if self.max_entries == 0 or np.count_nonzero(keep) > self.max_entries:
+            return
+        self._merge()
+        self._insert((bool(para),float(order)),keys[keep],values[keep],self._tick(len(keys)) + np.flatnonzero(keep))
+        self._evict()
+
+    def _insert(self,name,keys,values,stamps):
+        """
+        merges keys, values and stamps into the table of name, the new value winning for keys
+        already held.
+        """
+        if name in self._tables:
+            old_keys,old_values,old_stamps = self._tables[name]
+            keys = np.concatenate((old_keys,keys))
+            values = np.concatenate((old_values,values))
+            stamps = np.concatenate((old_stamps,stamps))
+        order = np.argsort(keys,kind='stable')
+        keys = keys[order]
+        last = np.append(keys[1:] != keys[:-1],True)
+        order = order[last]
+        self._tables[name] = [keys[last],values[order],np.asarray(stamps,dtype=np.int64)[order]]
+
+    def _merge(self):
+        """
+        moves the elements added one at a time into the tables.
+        """
+        if len(self._pending) == 0:
+            return
+        names = {}
+        for (para,order,packed),(value,stamp) in self._pending.items():
+            names.setdefault((para,order),[]).append((packed,value,stamp))
+        for name,entries in names.items():
+            keys,values,stamps = zip(*entries)
+            self._insert(name,np.array(keys,dtype=np.uint64),np.array(values,dtype=float),np.array(stamps,dtype=np.int64))
+        self._pending.clear()
+
+    def _evict(self):
+        """
+        drops the least recently used elements once there are more than max_entries. a large cache
+        is taken a sixteenth below max_entries so the next additions do not evict again at once.
+        """
+        if len(self) <= self.max_entries:
+            return
+        self._merge()
+        target = self.max_entries - self.max_entries // 16
+        stamps = np.concatenate([table[2] for table in self._tables.values()])
+        excess = len(stamps) - target
+        #stamps are unique, so exactly excess elements are at or below the threshold
+        threshold = np.partition(stamps,excess - 1)[excess - 1]
+        for name,table in self._tables.items():
+            keep = table[2] > threshold
+            self._tables[name] = [table[0][keep],table[1][keep],table[2][keep]]
+        self.evictions += excess
+
+    def clear(self):
+        """
+        empty the cache and reset the counters.
+        """
+        self._tables.clear()
+        self._pending.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def info(self):
+        """
+        dictionary of the cache statistics.
+        """
+        return dict({'hits':self.hits,'misses':self.misses,'evictions':self.evictions,
+                     'entries':len(self),'max_entries':self.max_entries})
+
 class RydbergAtom:
-    def __init__(self,mass = 1.00794,defects={},basis = 'nlm',additional_states = None):
+    def __init__(self,mass = 1.00794,defects={},basis = 'nlm',additional_states = None,radial_backend = 'auto',defect_tol = 1e-10,numerov_tol = None,
+                 element_cache_size = 2**20):
         """
         Base class for atom, needs mass and defects to be able to compute all the properties of Rydberg states.
         Routines not accurate at low states so if try and pass a state with a low n will first try and find
@@ -37,9 +242,21 @@ class RydbergAtom:
             as a nested dictionary in format {0 : {0:[x,y,z]}, 1: {0:[a,b,c], 2:[d,e,f] }}
         additional_states: dictionary
             contain energies of additional states at low energies in n,l,ml {n: {l:{ml:energy}   }  }
+        radial_backend: string
+            how radial overlaps are computed, one of radial_backends
+            'auto' - closed form for pairs of states whose defects are both below defect_tol, numerov otherwise
+            'numerov' - always integrate numerically
+        defect_tol: float
+            largest |defect| for which a state is treated as hydrogenic by the 'auto' backend
+        numerov_tol: float
+            if given, numerov wavefunctions use the adaptive-step integrator with this tolerance.
+            worthwhile for n >= 80, where the fixed step is both long and inaccurate.
+        element_cache_size: int
+            number of matrix elements remembered by matrix_element, 0 to always recompute
         """
         self.mass = mass * m_atomic
         self.defects = defects
+        self.defect_coeffs = defect_matrix(defects)
         self.additional_states = additional_states
 
         # the basis in which calculations are to be made. feature to be extended to spin-orbit basis
@@ -48,6 +265,19 @@ class RydbergAtom:
         else:
             raise KeyError("couldnt find the desired basis option, choose from "+str(basis_options))
 
+        if radial_backend in radial_backends:
+            self.radial_backend = radial_backend
+        else:
+            raise KeyError("couldnt find the desired radial backend, choose from "+str(radial_backends))
+        self.defect_tol = defect_tol
+        self.numerov_tol = numerov_tol
+        self.radial_store = None
+        #radial integrals filled in bulk by precompute_radial, one dictionary keyed by pair_key for
+        #each numerov grid of store.grids, as their values differ. only grows when precompute_radial
+        #is called, see clear_radial_cache
+        self.radial_cache = {grid:{} for grid in grids}
+        self.element_cache = Element_cache(element_cache_size)
+
         #compute the scaled rydberg constant
         self.mass_core = self.mass - m_e
         self.reduced_mass = (self.mass_core*m_e)/ (self.mass)
@@ -71,14 +301,316 @@ class RydbergAtom:
         neff = self.n_eff(state1)
         return energy_au(neff) *self.scalefactor
 
+    def n_effs(self,n,l=None):
+        """
+        effective n of arrays of states, see energies.
+        """
+        if l is None:
+            n,l = n['n'],n['l']
+        n = np.asarray(n,dtype=float)
+        return n - get_defects(self.defect_coeffs,n,l)
+
+    def energies(self,n,l=None):
+        """
+        energies of arrays of states in units of H'_e, as energy but evaluating the Ritz expansion
+        for every state at once.
+
+        Parameters
+        ----------
+        n: array
+            principal quantum numbers, or a structured array with fields 'n' and 'l'
+        l: array
+            orbital angular momenta, broadcast against n
+        """
+        return energy_au(self.n_effs(n,l)) *self.scalefactor
+
+    def radial_route(self,l,defect):
+        """
+        backend used for a state of orbital angular momentum l and quantum defect defect, either
+        'hydrogenic' or 'numerov'.
+        """
+        if self.radial_backend == 'auto' and abs(defect) <= self.defect_tol:
+            return 'hydrogenic'
+        return 'numerov'
+
+    def radial_method(self,state1,state2,order=1.0):
+        """
+        returns the name of the backend which computes the radial overlap of the two states. the
+        closed form is only used for dipole moments between two hydrogenic states.
+        """
+        if order == 1.0 and abs(state1.l - state2.l) == 1:
+            route1 = self.radial_route(state1.l,get_defect(self.defects,state1.n,state1.l))
+            route2 = self.radial_route(state2.l,get_defect(self.defects,state2.n,state2.l))
+            if route1 == 'hydrogenic' and route2 == 'hydrogenic':
+                return 'hydrogenic'
+        return 'numerov'
+
+    def use_radial_store(self,directory=None):
+        """
+        keep every radial integral this atom computes in an on-disk Radial_store, and reuse
+        those computed by previous sessions. integrals are written out in batches, see
+        Radial_store.flush. returns the store.
+        """
+        self.radial_store = Radial_store(self,directory)
+        return self.radial_store
+
+    def precompute_radial(self,states,order=1.0,dl=1,workers=None,block_size=4):
+        """
+        evaluates the radial overlaps between every pair of states whose l differs by dl in a pool
+        of processes, one (n,n') block per task, and merges them into the 'pair' grid of radial_cache
+        (and the radial store if in use) so later overlaps are lookups.
+
+        Parameters
+        ----------
+        states: iterable
+            the states, or a Space
+        order: float
+            power of r
+        dl: int
+            difference in l of the pairs
+        workers: int
+            number of processes, defaults to the number of cpus
+        block_size: int
+            number of values of n on each side of a block
+
+        Returns
+        -------
+        int: number of integrals added to the cache
+        """
+        pairs,bounds = radial_pairs(states,dl,block_size)
+        #the pairs are integrated on their own grid, as radial_overlap
+        cache = self.radial_cache['pair']
+        added = []
+        numeric = []
+        numeric_bounds = []
+        for start,stop in bounds:
+            first = len(numeric)
+            for state1,state2 in pairs[start:stop]:
+                key = pair_key(state1.n,state1.l,state2.n,state2.l,order)
+                if key in cache:
+                    continue
+                if self.radial_store is not None:
+                    stored = self.radial_store.get(state1.n,state1.l,state2.n,state2.l,order)
+                    if stored is not None:
+                        cache[key] = stored
+                        continue
+                added.append((state1,state2))
+                #the closed form is cheaper than sending the pair to a worker
+                if self.radial_method(state1,state2,order) == 'hydrogenic':
+                    cache[key] = radial_overlap_hydrogenic(state1.n,state1.l,state2.n,state2.l,order)
+                else:
+                    numeric.append((state1,state2))
+            if len(numeric) > first:
+                numeric_bounds.append((first,len(numeric)))
+
+        if len(numeric) > 0:
+            quantum = np.array([(self.n_eff(s1),s1.l,self.n_eff(s2),s2.l) for s1,s2 in numeric],dtype=float)
+            integrals = compute_pairs(quantum,numeric_bounds,order,self.numerov_tol,workers)
+            for (s1,s2),integral in zip(numeric,integrals):
+                cache[pair_key(s1.n,s1.l,s2.n,s2.l,order)] = float(integral)
+
+        if self.radial_store is not None and len(added) > 0:
+            quantum = np.array([(s1.n,s1.l,s2.n,s2.l) for s1,s2 in added],dtype=int)
+            values = [cache[pair_key(s1.n,s1.l,s2.n,s2.l,order)] for s1,s2 in added]
+            self.radial_store.add(quantum[:,0],quantum[:,1],quantum[:,2],quantum[:,3],order,values)
+        return len(added)
+
+    def clear_radial_cache(self):
+        """
+        forget the radial integrals filled in by precompute_radial, the radial store is untouched.
+        """
+        for cache in self.radial_cache.values():
+            cache.clear()
+
     def radial_overlap(self,state1,state2,order=1.0):
         """
-        compute the radial overlap of two states. returns in units of a'0, convert to non-scaled a0
+        compute the radial overlap of two states. returns in units of a'0^order, convert to non-scaled a0
         """
-        n1_eff = self.n_eff(state1)
-        n2_eff = self.n_eff(state2)
+        if len(self.radial_cache['pair']) > 0:
+            cached = self.radial_cache['pair'].get(pair_key(state1.n,state1.l,state2.n,state2.l,order))
+            if cached is not None:
+                return cached *self.scalefactor**order
+
+        if self.radial_store is not None:
+            stored = self.radial_store.get(state1.n,state1.l,state2.n,state2.l,order)
+            if stored is not None:
+                return stored *self.scalefactor**order
+
+        if self.radial_method(state1,state2,order) == 'hydrogenic':
+            integral = radial_overlap_hydrogenic(state1.n,state1.l,state2.n,state2.l,order)
+        else:
+            n1_eff = self.n_eff(state1)
+            n2_eff = self.n_eff(state2)
+            integral = cached_radial_overlap(n1_eff,state1.l,n2_eff,state2.l,order,self.numerov_tol)
+
+        if self.radial_store is not None:
+            self.radial_store.add(state1.n,state1.l,state2.n,state2.l,order,integral)
+        return integral *self.scalefactor**order
 
-        return radial_overlap(n1_eff,state1.l,n2_eff,state2.l,order) *self.scalefactor
+    def radial_grid(self,states,step=0.005,rmin=0.65):
+        """
+        returns a Radial_grid holding the wavefunctions of all the states on a single shared grid.
+        """
+        neffs = [self.n_eff(state) for state in states]
+        ls = [state.l for state in states]
+        return Radial_grid(neffs,ls,step,rmin,self.numerov_tol)
+
+    def radial_moments(self,state1,state2,powers):
+        """
+        radial overlaps of two states for several powers of r, aligning the wavefunctions once.
+        returns an array in the same units as radial_overlap.
+        """
+        powers = np.asarray(powers,dtype=float)
+        integrals = np.full(len(powers),np.nan)
+        if self.radial_store is not None:
+            integrals = self.radial_store.lookup(state1.n,state1.l,state2.n,state2.l,powers)
+        if len(self.radial_cache['pair']) > 0:
+            cached = [self.radial_cache['pair'].get(pair_key(state1.n,state1.l,state2.n,state2.l,p),np.nan) for p in powers]
+            integrals = np.where(np.isnan(integrals),cached,integrals)
+
+        for k,p in enumerate(powers):
+            if np.isnan(integrals[k]) and self.radial_method(state1,state2,p) == 'hydrogenic':
+                integrals[k] = radial_overlap_hydrogenic(state1.n,state1.l,state2.n,state2.l,p)
+
+        missing = np.isnan(integrals)
+        if np.any(missing):
+            n1_eff = self.n_eff(state1)
+            n2_eff = self.n_eff(state2)
+            integrals[missing] = radial_moments(n1_eff,state1.l,n2_eff,state2.l,powers[missing],self.numerov_tol)
+            if self.radial_store is not None:
+                self.radial_store.add(state1.n,state1.l,state2.n,state2.l,powers[missing],integrals[missing])
+        return integrals *self.scalefactor**powers
+
+    def radial_overlaps(self,numbers1,numbers2,order=1.0,workers=None):
+        """
+        radial overlaps of the pairs of states (numbers1[k],numbers2[k]), structured arrays with
+        fields 'n' and 'l', for when only some pairs of a space are needed. stored, cached and
+        closed form values are looked up as in radial_table, and the rest are integrated on a
+        Radial_grid of only the states in those pairs, which gives the values of radial_table as the
+        grid does not depend on the other states. returns an array in the same units as
+        radial_overlap. with workers the integration and the pairs of each pair of l are shared
+        between that many threads.
+        """
+        n1 = np.asarray(numbers1['n'],dtype=np.int64)
+        l1 = np.asarray(numbers1['l'],dtype=np.int64)
+        n2 = np.asarray(numbers2['n'],dtype=np.int64)
+        l2 = np.asarray(numbers2['l'],dtype=np.int64)
+        values = np.full(len(n1),np.nan)
+        if len(n1) == 0:
+            return values
+        if self.radial_store is not None:
+            values = self.radial_store.lookup(n1,l1,n2,l2,order,grid='grid')
+        if len(self.radial_cache['grid']) > 0:
+            cached = [self.radial_cache['grid'].get(pair_key(a,b,c,d,order),np.nan) for a,b,c,d in zip(n1.tolist(),l1.tolist(),n2.tolist(),l2.tolist())]
+            values = np.where(np.isnan(values),cached,values)
+        missing = np.flatnonzero(np.isnan(values))
+
+        if self.radial_backend == 'auto' and order == 1.0 and len(missing) > 0:
+            hydrogenic = (np.abs(l1[missing] - l2[missing]) == 1) \
+                & (np.abs(get_defects(self.defect_coeffs,n1[missing],l1[missing])) <= self.defect_tol) \
+                & (np.abs(get_defects(self.defect_coeffs,n2[missing],l2[missing])) <= self.defect_tol)
+            for k in missing[hydrogenic].tolist():
+                values[k] = radial_overlap_hydrogenic(n1[k],l1[k],n2[k],l2[k],order)
+            numeric = missing[~hydrogenic]
+        else:
+            numeric = missing
+
+        if len(numeric) > 0:
+            #one row of the grid per distinct state of the numeric pairs
+            states = np.unique(np.concatenate((np.stack((n1[numeric],l1[numeric]),axis=1),
+                                               np.stack((n2[numeric],l2[numeric]),axis=1))),axis=0)
+            grid = Radial_grid(self.n_effs(states[:,0],states[:,1]),states[:,1],tol=self.numerov_tol)
+            #the integral is symmetric so each pair is put with the lower l first, and found once
+            lookup = np.searchsorted(states[:,0] * (states[:,1].max() + 1) + states[:,1],
+                                     np.stack((n1[numeric],n2[numeric])) * (states[:,1].max() + 1) + np.stack((l1[numeric],l2[numeric])))
+            rows = grid.index[lookup]
+            swap = grid.ls[rows[0]] > grid.ls[rows[1]]
+            rows[:,swap] = rows[::-1,swap]
+            pairs,inverse = np.unique(rows,axis=1,return_inverse=True)
+            inverse = inverse.reshape(-1)
+
+            ls = grid.ls[pairs]
+            groups = [np.flatnonzero((ls[0] == la) & (ls[1] == lb)) for la,lb in np.unique(ls,axis=1).T.tolist()]
+            grid.integrate(np.unique(ls),workers)
+            integrals = np.empty(pairs.shape[1])
+            products = thread_map(lambda group: grid.pairs(pairs[0,group],pairs[1,group],order),groups,workers)
+            for group,product in zip(groups,products):
+                integrals[group] = product
+            values[numeric] = integrals[inverse]
+
+        if self.radial_store is not None and len(missing) > 0:
+            self.radial_store.add(n1[missing],l1[missing],n2[missing],l2[missing],order,values[missing],grid='grid')
+        return values *self.scalefactor**order
+
+    def radial_table(self,states,order=1.0,dl=1,workers=None):
+        """
+        radial overlaps between every pair of states whose l differs by dl, built with one matrix
+        product per l. blocks between two hydrogenic values of l use the closed form and never
+        integrate a wavefunction. returns an index array mapping each state onto a row of the table,
+        and the table, a Radial_table keeping only the l blocks, in the same units as radial_overlap.
+        with workers the integration and the matrix products of the l blocks are shared between that
+        many threads.
+        """
+        index,tables = self.radial_tables(states,[order],dl,workers)
+        return index,tables[0]
+
+    def radial_tables(self,states,powers,dl=1,workers=None):
+        """
+        as radial_table for several powers of r, sharing the wavefunctions and computing every
+        power of an l block in one matrix product. returns the index array and a list of
+        Radial_tables, one for each power, which keep only the l blocks.
+        """
+        powers = np.asarray(powers,dtype=float)
+        grid = self.radial_grid(states)
+        #a representative state for each row of the grid
+        first = np.zeros(len(grid),dtype=int)
+        first[grid.index[::-1]] = np.arange(len(grid.index))[::-1]
+        representatives = [states[i] for i in first]
+
+        #stored, cached and closed form values first, the l blocks left need the grid
+        blocks = []
+        for l in np.unique(grid.ls):
+            if l + dl not in grid.ls:
+                continue
+            rows1 = np.flatnonzero(grid.ls == l)
+            rows2 = np.flatnonzero(grid.ls == l + dl)
+            pairs = [(representatives[r1],representatives[r2]) for r1 in rows1 for r2 in rows2]
+            n1 = np.array([s1.n for s1,s2 in pairs])
+            n2 = np.array([s2.n for s1,s2 in pairs])
+
+            values = np.full((len(powers),len(pairs)),np.nan)
+            if self.radial_store is not None:
+                for k,p in enumerate(powers):
+                    values[k] = self.radial_store.lookup(n1,l,n2,l+dl,p,grid='grid')
+            if len(self.radial_cache['grid']) > 0:
+                for k,p in enumerate(powers):
+                    cached = [self.radial_cache['grid'].get(pair_key(s1.n,s1.l,s2.n,s2.l,p),np.nan) for s1,s2 in pairs]
+                    values[k] = np.where(np.isnan(values[k]),cached,values[k])
+
+            missing = [k for k in range(len(powers)) if np.any(np.isnan(values[k]))]
+            hydrogenic = [k for k in missing if all(self.radial_method(s1,s2,powers[k]) == 'hydrogenic' for s1,s2 in pairs)]
+            numeric = [k for k in missing if k not in hydrogenic]
+            for k in hydrogenic:
+                values[k] = [radial_overlap_hydrogenic(s1.n,s1.l,s2.n,s2.l,powers[k]) for s1,s2 in pairs]
+            blocks.append((l,rows1,rows2,n1,n2,values,missing,numeric))
+
+        numeric_blocks = [block for block in blocks if len(block[7]) > 0]
+        needed = sorted(set([block[0] for block in numeric_blocks]) | set([block[0] + dl for block in numeric_blocks]))
+        grid.integrate(needed,workers)
+        products = thread_map(lambda block: grid.block_moments(block[0],block[0]+dl,powers[block[7]])[2],numeric_blocks,workers)
+        for (l,rows1,rows2,n1,n2,values,missing,numeric),block in zip(numeric_blocks,products):
+            values[numeric] = block.reshape(len(numeric),len(rows1)*len(rows2))
+
+        tables = [{} for p in powers]
+        for l,rows1,rows2,n1,n2,values,missing,numeric in blocks:
+            if self.radial_store is not None:
+                for k in missing:
+                    self.radial_store.add(n1,l,n2,l+dl,powers[k],values[k],grid='grid')
+            values = values.reshape(len(powers),len(rows1),len(rows2))
+            for k in range(len(powers)):
+                tables[k][int(l)] = values[k] *self.scalefactor**powers[k]
+
+        return grid.index,[Radial_table(grid.ls,table,dl) for table in tables]
 
     def angular_overlap(self,state1,state2,para):
         """
@@ -88,15 +620,35 @@ class RydbergAtom:
 
     def matrix_element(self,state1,state2,para,order=1.0):
         """
-        computes the matrix element between two states units of ea0.
+        computes the matrix element between two states units of ea0. each pair is only computed once,
+        later calls are served from element_cache.
         """
+        key = Element_cache.key(state1,state2,para,order)
+        cached = self.element_cache.get(key)
+        if cached is not None:
+            return cached
+
         angular_integral = self.angular_overlap(state1,state2,para)
         if angular_integral == 0.0:
-            return 0.0
+            element = 0.0
         else:
             radial_integral = self.radial_overlap(state1,state2,order)
+            element = angular_integral * radial_integral
 
-        return angular_integral * radial_integral
+        self.element_cache.add(key,element)
+        return element
+
+    def element_cache_info(self):
+        """
+        hit, miss and eviction statistics of the matrix element cache.
+        """
+        return self.element_cache.info()
+
+    def clear_element_cache(self):
+        """
+        empty the matrix element cache.
+        """
+        self.element_cache.clear()
 
     def inglis_teller(self,n):
         """
@@ -187,17 +739,77 @@ class RydbergAtom:
         _y,_z = np.meshgrid(y_grid,z_grid)
         #### Get the arrays in polar coorindates
         theta_grid,phi_grid,r_grid = _cart2sph(x,_y,_z)
-        #### Get the radial part of wavefunction
-        r_wf_2d = np.array([list(map(functools.partial(
-        _find_nearest_rad_y, find_array_X = radial_wf_x, find_array_Y = radial_wf_y), i)) for i in r_grid])
-        sph_wf_2d = sp.sph_harm(state1.ml, state1.l, theta_grid, phi_grid)
+        #### Get the radial part of wavefunction, interpolated on the sorted radial grid
+        r_wf_2d = _interp_radial(r_grid,radial_wf_x,radial_wf_y)
+        sph_wf_2d = _sph_harm(state1.ml, state1.l, theta_grid, phi_grid)
         return _y,_z,r_wf_2d,sph_wf_2d,r_grid
 
+    def get_3d_wf(self,state1,frac_r_max = 1.0,num_points=100,out=None,density=True,chunk_size=2**18):
+        """
+        evaluates the wavefunction, or its density, on a num_points^3 cube, chunk_size points at a
+        time so the memory used beyond out is fixed.
+
+        Parameters
+        ----------
+        state1: state
+            the state to render
+        frac_r_max: float
+            half width of the cube as a fraction of the radial extent of the wavefunction
+        num_points: int
+            points along each axis
+        out: array
+            buffer of shape (num_points,num_points,num_points) to write into, float for a density
+            and complex otherwise. allocated if not given.
+        density: bool
+            return |psi|^2 rather than psi
+        chunk_size: int
+            number of points evaluated at once
+
+        Returns
+        -------
+        grid: array
+            coordinates along each axis, the cube is indexed [x,y,z]
+        out: array
+            the wavefunction or density
+        """
+        radial_wf_x,radial_wf_y = self.get_radial_wf(state1)
+        extent = np.max(radial_wf_x)*frac_r_max
+        grid = np.linspace(-extent,extent,num_points)
+
+        shape = (num_points,num_points,num_points)
+        dtype = np.float64 if density else np.complex128
+        if out is None:
+            out = np.empty(shape,dtype=dtype)
+        elif out.shape != shape or out.dtype != dtype:
+            raise ValueError("out must have shape " + str(shape) + " and dtype " + str(np.dtype(dtype)))
+
+        #the azimuthal factor only depends on x and y, so is computed once for the whole cube
+        l,am = state1.l,abs(state1.ml)
+        _x,_y = np.meshgrid(grid,grid,indexing='ij')
+        azimuth = np.exp(1j*am*_cart2sph(_x,_y,0.0)[0])
+        norm = np.sqrt((2*l+1)/(4*np.pi) * np.exp(sp.gammaln(l-am+1) - sp.gammaln(l+am+1)))
+        radial_x = np.ascontiguousarray(radial_wf_x[::-1])
+        radial_y = np.ascontiguousarray(radial_wf_y[::-1])
+
+        planes = max(1,chunk_size // num_points**2)
+        for start in range(0,num_points,planes):
+            stop = min(start + planes,num_points)
+            values = _wf_planes(grid,start,stop,radial_x,radial_y,l,am,norm,azimuth)
+            if state1.ml < 0:
+                values = (-1)**am * np.conj(values)
+            if density:
+                out[start:stop] = values.real**2 + values.imag**2
+            else:
+                out[start:stop] = values
+        return grid,out
+
 
 
 
 # FUNCTIONS FOR USE BY ATOM CLASS
 
+radial_backends = ['auto','numerov']
+
 def get_defect(defects,n,l):
     """
     routine which takes a dictionary of defects and computes the defect at higher n.
@@ -218,6 +830,35 @@ def get_defect(defects,n,l):
             return ritz_sum
     else:
         return 0.0
+def defect_matrix(defects):
+    """
+    the Ritz coefficients of a defects dictionary as an array, row l holding the coefficients of
+    defects[l][l+1] padded with zeros. values of l without an entry are left as zeros.
+    """
+    rows = {l:js[l+1] for l,js in defects.items() if l+1 in js}
+    if len(rows) == 0:
+        return np.zeros((1,1))
+    coeffs = np.zeros((max(rows)+1,max(len(c) for c in rows.values())))
+    for l,c in rows.items():
+        coeffs[l,:len(c)] = c
+    return coeffs
+
+def get_defects(coeffs,n,l):
+    """
+    vectorised get_defect: the defects of arrays n, l from a coefficient matrix made by defect_matrix.
+    """
+    n = np.asarray(n,dtype=float)
+    l = np.asarray(l,dtype=int)
+    n,l = np.broadcast_arrays(n,l)
+    known = (l >= 0) & (l < len(coeffs))
+    rows = coeffs[np.where(known,l,0)]
+    rows[~known] = 0.0
+
+    ritz_sum = rows[...,0].copy()
+    for i in range(1,coeffs.shape[1]):
+        ritz_sum += rows[...,i] / (n - rows[...,0])**(2*i)
+    return ritz_sum
+
 @jit
 def get_neff(n,defect):
     """
@@ -264,6 +905,62 @@ def _cart2sph(x, y, z):
     el = np.arctan2(z, hxy) + np.pi/2.0
     az = np.arctan2(y, x) + np.pi/2.0
     return az, el, r
-def _find_nearest_rad_y(value, find_array_X, find_array_Y):
-    idx = (np.abs(find_array_X-value)).argmin()
-    return find_array_Y[idx]
+@jit(nopython=True, nogil=True, cache=True)
+def _wf_planes(grid, start, stop, radial_x, radial_y, l, am, norm, azimuth):
+    """
+    psi on the planes x = grid[start:stop] of a cube, for ml = am >= 0, angles as in _cart2sph.
+    the radial wavefunction is interpolated on radial_x, which must be increasing.
+    """
+    n = len(grid)
+    values = np.empty((stop-start, n, n), dtype=np.complex128)
+    last = len(radial_x) - 1
+    for ix in range(start, stop):
+        for iy in range(n):
+            rho_sq = grid[ix]**2 + grid[iy]**2
+            for iz in range(n):
+                r = np.sqrt(rho_sq + grid[iz]**2)
+                # linear interpolation, clamped at the ends of the grid
+                if r <= radial_x[0]:
+                    radial = radial_y[0]
+                elif r >= radial_x[last]:
+                    radial = radial_y[last]
+                else:
+                    k = np.searchsorted(radial_x, r)
+                    frac = (r - radial_x[k-1]) / (radial_x[k] - radial_x[k-1])
+                    radial = radial_y[k-1] + frac * (radial_y[k] - radial_y[k-1])
+                # associated legendre function of cos(polar) by upward recurrence
+                c = -grid[iz] / r if r > 0.0 else 0.0
+                s = np.sqrt(max(0.0, 1.0 - c*c))
+                pmm = 1.0
+                for i in range(am):
+                    pmm = -pmm * (2*i + 1) * s
+                if l == am:
+                    legendre = pmm
+                else:
+                    pm1 = c * (2*am + 1) * pmm
+                    for ll in range(am + 2, l + 1):
+                        pll = (c * (2*ll - 1) * pm1 - (ll + am - 1) * pmm) / (ll - am)
+                        pmm = pm1
+                        pm1 = pll
+                    legendre = pm1
+                values[ix-start, iy, iz] = radial * norm * legendre * azimuth[ix, iy]
+    return values
+
+def _interp_radial(r, find_array_X, find_array_Y):
+    """
+    radial wavefunction at the points r, linearly interpolated on the numerov grid, which runs
+    inwards from rmax. points outside the grid take the value at its nearest end.
+    """
+    return np.interp(r, find_array_X[::-1], find_array_Y[::-1])
+
+def _sph_harm(m, l, theta, phi):
+    """
+    spherical harmonic Y_l^m at azimuth theta and polar angle phi, the argument order of
+    scipy's sph_harm, from the associated Legendre function with the normalisation computed once.
+    """
+    am = abs(m)
+    norm = np.sqrt((2*l+1)/(4*np.pi) * np.exp(sp.gammaln(l-am+1) - sp.gammaln(l+am+1)))
+    harmonic = norm * sp.lpmv(am, l, np.cos(phi)) * np.exp(1j*am*theta)
+    if m < 0:
+        harmonic = (-1)**am * np.conj(harmonic)
+    return harmonic
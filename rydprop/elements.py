@@ -1,7 +1,7 @@
 from .atom import RydbergAtom
 from .state import default_basis
 
-def TripletHelium(basis = default_basis):
+def TripletHelium(basis = default_basis,radial_backend = 'auto'):
     mass = 4.002602
     defects = dict({
 0 : {
@@ -62,4 +62,5 @@ def TripletHelium(basis = default_basis):
 })
 
 
-    return RydbergAtom(mass = mass,defects= defects,additional_states = additional_states,basis = basis)
+    return RydbergAtom(mass = mass,defects= defects,additional_states = additional_states,basis = basis,\
+                       radial_backend = radial_backend)
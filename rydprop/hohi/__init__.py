@@ -1 +1 @@
-from .adiabatic_solver import Adiabatic_solver
+from .adiabatic_solver import Adiabatic_solver,Grid_solver
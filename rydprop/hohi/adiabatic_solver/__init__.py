@@ -1,5 +1,6 @@
 from .adiabatic_state import Adiabatic
 from .adiabatic_solver import Adiabatic_solver
 from .solver import Solver
+from .grid_solver import Grid_solver
 
 from .plugins import *
@@ -1,4 +1,5 @@
 from scipy.sparse import isspmatrix
+from scipy.sparse.linalg import LinearOperator
 from .plugins.state_init import State_initialiser   #gnerates the initial adiabatic states to track
 from .plugins.sigma_guesser import Sigma_gen        #determines how the eigenstate guess should change
 from .plugins.diag_engine import Diagonaliser       #determines which diagonalisation routine to use
@@ -8,7 +9,7 @@ import numpy as np
 
 class Adiabatic_solver:
     def __init__(self,h0,h1,parameters,sigma = 0.0,num_eigs = None,return_vecs=True,algorithim='basic',return_failed = False,\
-                 energy_list = None,index_list = None,sig_method = 'static',target=None,ratio=None):
+                 energy_list = None,index_list = None,sig_method = 'static',target=None,ratio=None,iterative='eigsh'):
         """
         The interface which user interacts with. It generates all the classes which are
         needed to be given to the solver to impliment the desired tracking. 
@@ -21,7 +22,8 @@ class Adiabatic_solver:
         h0: sparse or dense matrix
             diagonal matrix which dosent change with parameter
         h1: sparse or dense matrix
-            interaction matrix which changes with parameter
+            interaction matrix which changes with parameter, or a scipy LinearOperator such as a
+            symmetric matrix holding only its upper triangle
         parameters: numpy array
             the values of the interaction parameter for which eigenvalues and vectors are computed
         sigma: float
@@ -48,9 +50,12 @@ class Adiabatic_solver:
         ratio: float 
             ratio of the target states to guess eigenvalue. same length as target,
             if not provided will set to equal
+        iterative: string
+            routine used for a h1 LinearOperator which is not a matrix, such as a matrix-free
+            Hamiltonian, see Diagonaliser. 'eigsh' or 'lobpcg'
         """
         dimension = h0.shape[0]       
-        self.Diag_engine = init_diagonalizer(return_vecs,num_eigs,h0,h1)
+        self.Diag_engine = init_diagonalizer(return_vecs,num_eigs,h0,h1,iterative)
         self.Sigma_logic = init_sigma_checker(sig_method,target,ratio,dimension)
         self.Adibatic_generator = init_adibatic_state(energy_list,index_list,dimension)
         self.Matcher_logic = init_matcher(algorithim,dimension,num_eigs)
@@ -166,7 +171,7 @@ def init_matcher(algorithim,dimension,num_eigs):
             raise ValueError("currently, 'basic' algorithim only supports dense mode where num_eigs = dimenison of space " +str(dimension))
     return Matcher(algorithim)
         
-def init_diagonalizer(return_vecs,num_eigs,h0,h1):
+def init_diagonalizer(return_vecs,num_eigs,h0,h1,iterative='eigsh'):
     """
     initialises which method is going to be used to perform the diagonalisation, i.e if
     a sparse or dense method is required.
@@ -176,8 +181,10 @@ def init_diagonalizer(return_vecs,num_eigs,h0,h1):
         matrix_fine = True
     elif type(h0) == np.ndarray and type(h1) == np.ndarray:
         matrix_fine = True
+    elif isinstance(h1,LinearOperator) and (isspmatrix(h0) or type(h0) == np.ndarray or isinstance(h0,LinearOperator)):
+        matrix_fine = True
     else:
-        raise TypeError("Matrices must be provided in either scipy sparse or numpy format.")
+        raise TypeError("Matrices must be provided in either scipy sparse or numpy format, or h1 as a LinearOperator.")
             
     #check matrices are square
     if h0.shape[0] != h0.shape[1] or h1.shape[0] != h1.shape[1]:
@@ -196,5 +203,5 @@ def init_diagonalizer(return_vecs,num_eigs,h0,h1):
         raise ValueError("number of eigenstates to find must be <= dimension of system " + str(h0.shape))
         
     #returns a function which given a h0,h1 and parameter gives the eigens.
-    return Diagonaliser(return_vecs,num_eigs,h0,h1)
+    return Diagonaliser(return_vecs,num_eigs,h0,h1,iterative)
         
\ No newline at end of file
@@ -0,0 +1,113 @@
+from scipy.optimize import linear_sum_assignment
+from .adiabatic_solver import init_diagonalizer
+from tqdm import tqdm
+import numpy as np
+
+class Grid_solver:
+    def __init__(self,h0,h1s,axes,weights=None,sigma = 0.0,num_eigs = None,return_vecs = False,follow = True,iterative = 'eigsh'):
+        """
+        diagonalises h0 plus several interaction matrices at every point of a two-dimensional grid of
+        parameters, such as electric and magnetic field. the grid is walked in snake order, along the
+        second axis forwards then backwards, so each point is next to the one before. the sparse
+        routines start from the eigenvectors of the previous point, and the eigenstates of each point
+        are put in the order of those they overlap most, so a state index follows one adiabatic state
+        over the whole grid.
+
+        Parameters
+        ----------
+        h0: sparse or dense matrix
+            diagonal matrix which dosent change with parameter
+        h1s: list
+            the interaction matrices, sparse, dense or LinearOperators as the h1 of Adiabatic_solver
+        axes: list
+            two numpy arrays, the values of the parameters along each axis of the grid
+        weights: function
+            weights(x,y) returns the parameter multiplying each of h1s at the grid point (x,y), for
+            example (F,B,B**2/8) with a diamagnetic matrix. if not given the parameters are x and y.
+        sigma: float
+            the initial eigenvalue region to search in. see ARPACK diagonalisation routine.
+        num_eigs: int
+            the number of eigenvalues to compute. If not provided will compute all
+        return_vecs: boolean
+            keep the eigenvectors of every point, a (x, y, dimension, state) array
+        follow: boolean
+            move sigma to the mean eigenvalue of the previous point, so the states stay in the window
+        iterative: string
+            routine for LinearOperators which are not matrices, see Diagonaliser
+        """
+        if len(axes) != 2:
+            raise ValueError("axes must hold the values of two parameters, got " + str(len(axes)))
+        self.axes = [np.asarray(axis,dtype=float) for axis in axes]
+        h1s = list(h1s)
+        if len(h1s) == 0:
+            raise ValueError("at least one interaction matrix is needed")
+        if weights is None:
+            if len(h1s) != 2:
+                raise ValueError("weights must be given unless there are two interaction matrices, got " + str(len(h1s)))
+            weights = lambda x,y: (x,y)
+        self.weights = weights
+
+        #every h1 is checked and converted as the first is
+        self.Diag_engine = init_diagonalizer(True,num_eigs,h0,h1s[0],iterative)
+        self.h1s = [self.Diag_engine.h1]
+        for h1 in h1s[1:]:
+            if h1.shape != h0.shape:
+                raise ValueError("every h1 must be the same dimension as H0, got " + str(h1.shape))
+            self.h1s.append(self.Diag_engine.matrix_converter(h0,h1,self.Diag_engine.sparse)[1])
+        self.Diag_engine.seed = True
+
+        self.sigma = sigma
+        self.return_vecs = return_vecs
+        self.follow = follow
+
+    def run(self):
+        """
+        diagonalises every point of the grid. returns the (x, y, state) array of eigenvalues, and the
+        (x, y, dimension, state) array of eigenvectors if return_vecs.
+        """
+        shape = (len(self.axes[0]),len(self.axes[1]))
+        dimension = self.Diag_engine.h0.shape[0]
+        num_eigs = self.Diag_engine.num_eigs
+        vals_grid = np.zeros(shape + (num_eigs,))
+        vecs_grid = None
+        previous = None
+        sigma = self.sigma
+        for i,j in tqdm(snake_order(shape)):
+            params = self.weights(self.axes[0][i],self.axes[1][j])
+            vals,vecs = self.Diag_engine.get_values_sum(self.Diag_engine.h0,self.h1s,params,sigma)
+            vals,vecs = match_states(previous,np.real(vals),vecs)
+            if vecs_grid is None and self.return_vecs == True:
+                vecs_grid = np.zeros(shape + (dimension,num_eigs),dtype=vecs.dtype)
+            vals_grid[i,j] = vals
+            if self.return_vecs == True:
+                vecs_grid[i,j] = vecs
+            previous = vecs
+            if self.follow == True and self.Diag_engine.sparse == True:
+                sigma = np.mean(vals)
+
+        if self.return_vecs == True:
+            return vals_grid,vecs_grid
+        return vals_grid
+
+def snake_order(shape):
+    """
+    the points (i,j) of a grid of the given shape, along j forwards for even i and backwards for odd i.
+    """
+    order = []
+    for i in range(shape[0]):
+        js = range(shape[1]) if i % 2 == 0 else range(shape[1]-1,-1,-1)
+        order.extend([(i,j) for j in js])
+    return order
+
+def match_states(previous,vals,vecs):
+    """
+    orders the eigenvalues and vectors so that each vector is the one overlapping most with the
+    vector of the same index in previous, the vectors of the previous point, taking each once. without
+    previous they are ordered by eigenvalue.
+    """
+    if previous is None:
+        order = np.argsort(vals)
+    else:
+        overlaps = np.abs(previous.conj().T @ vecs)
+        _,order = linear_sum_assignment(-overlaps)
+    return vals[order],vecs[:,order]
@@ -1,14 +1,18 @@
-from scipy.sparse.linalg import eigs
+from scipy.sparse.linalg import eigs,eigsh,lobpcg,LinearOperator,aslinearoperator
 from scipy.sparse import csr_matrix,isspmatrix
 from numpy.linalg import eigh,eigvalsh
 import numpy as np
 
 class Diagonaliser: 
-    def __init__(self,return_vecs,num_eigs,h0,h1):
+    def __init__(self,return_vecs,num_eigs,h0,h1,iterative='eigsh'):
         """
         Determines which routine to use for the diagonalisation and return of vectors and values.
         has a toggle if vectors are returned. If all eigenvectors are requested uses the numpy dense
-        routine with dense matrices, else will use the scipy ARPACK routine and csr sparse matrices 
+        routine with dense matrices, else will use the scipy ARPACK routine and csr sparse matrices.
+        h1 may also be a scipy LinearOperator, such as a symmetric matrix stored as its upper triangle or
+        a matrix-free Hamiltonian, which the sparse routine keeps as it is and solves by an iterative
+        routine which only needs products. shift-invert would need the whole matrix to factorise, so
+        a symmetric matrix is never expanded into both triangles.
         
         Parameters
         ----------
@@ -19,7 +23,11 @@ class Diagonaliser:
         h0: matrix
             the parameter-free matrix
         h1: matrix
-            the interaction matrix
+            the interaction matrix, or a real symmetric scipy LinearOperator
+        iterative: string
+            routine for the eigenstates closest to sigma of a LinearOperator, one of iterative_methods
+            'eigsh' - ARPACK in regular mode for the smallest magnitude eigenvalues of h - sigma
+            'lobpcg' - LOBPCG on (h - sigma)^2, starting from the vectors of the previous call
         """
         if num_eigs == None:
             self.num_eigs = h0.shape[0]
@@ -32,6 +40,14 @@ class Diagonaliser:
             self.sparse = True
         else:
             self.sparse = False
+
+        if iterative not in iterative_methods:
+            raise KeyError("Not avaivable iterative method, choose from: " + str(iterative_methods.keys()))
+        self.iterative = iterative_methods[iterative]
+        #the last eigenvectors of the iterative routine, which starts from them. the sparse routine
+        #only starts from them with seed True
+        self.guess = None
+        self.seed = False
             
         self.h0,self.h1 = self.matrix_converter(h0,h1,self.sparse)
             
@@ -40,8 +56,14 @@ class Diagonaliser:
         determines the type of matrix which has been given to the diagonaliser, 
         and sees if it can be converted into sparse format. Assumes either a
         dense numpy array was provided or a scipy sparse array of some format
-        Works for sparse and numpy arrays.
+        Works for sparse and numpy arrays. LinearOperators are made dense for the dense engine and
+        kept by the sparse engine, with h0 put into csr format.
         """
+        if isinstance(h1,LinearOperator):
+            if sparse_engine == True:
+                return operator_converter(h0,csr_matrix),h1
+            return to_dense(h0),to_dense(h1)
+
         matrix_type = type(h0)
         
         if sparse_engine == True and matrix_type!=csr_matrix:
@@ -71,11 +93,41 @@ class Diagonaliser:
         """
         given a parameter will return the eigenvalues/vectors
         """
-            
-        total_matrix = self.h0 + self.h1 * param
+        return self.get_values_sum(self.h0,[self.h1],[param],sigma)
+
+    def get_values_sum(self,h0,h1s,params,sigma):
+        """
+        eigenvalues/vectors of h0 plus the sum of each of h1s times its parameter, for matrices already
+        converted by matrix_converter. with seed True the sparse routine starts from the vectors of the
+        previous call, as the iterative routines always do.
+        """
+        if self.sparse == True and any(isinstance(h1,LinearOperator) for h1 in h1s):
+            total_operator = aslinearoperator(h0)
+            for h1,param in zip(h1s,params):
+                total_operator = total_operator + aslinearoperator(h1) * param
+            vals,vecs,self.guess = self.iterative(total_operator,self.num_eigs,sigma,self.guess)
+            if self.return_vecs == False:
+                vecs = None
+            return vals,vecs
+
+        total_matrix = h0
+        for h1,param in zip(h1s,params):
+            total_matrix = total_matrix + h1 * param
         vals = None
         vecs = None
         if self.sparse == True:
+            start = None
+            if self.seed == True and self.guess is not None:
+                start = self.guess.sum(axis=1)
+                if not np.iscomplexobj(total_matrix):
+                    start = np.real(start)
+            if self.seed == True:
+                #the matrices are hermitian, so the real vectors of eigsh carry over as a real start
+                vals,vecs = eigsh(total_matrix,k=self.num_eigs,sigma=sigma,v0=start)
+                self.guess = vecs
+                if self.return_vecs == False:
+                    vecs = None
+            else:
                 vals,vecs = eigs(total_matrix,k=self.num_eigs,sigma=sigma,return_eigenvectors=self.return_vecs)
         elif self.sparse == False:
             if self.return_vecs == True:
@@ -83,4 +135,67 @@ class Diagonaliser:
             elif self.return_vecs == False:
                 vals = eigvalsh(total_matrix)
             
-        return vals,vecs
\ No newline at end of file
+        return vals,vecs
+
+def operator_converter(matrix,converter):
+    """
+    applies converter to a matrix unless it is already a LinearOperator.
+    """
+    if isinstance(matrix,LinearOperator):
+        return matrix
+    try:
+        return converter(matrix)
+    except:
+        raise ValueError("Failed to convert matrix, type: " + str(type(matrix)))
+
+def to_dense(matrix):
+    """
+    dense numpy array of a numpy, scipy sparse or LinearOperator matrix. operators without a toarray
+    method are applied to the identity.
+    """
+    if type(matrix) == np.ndarray:
+        return matrix
+    if hasattr(matrix,'toarray'):
+        return matrix.toarray()
+    return matrix @ np.eye(matrix.shape[0])
+
+def shifted_operator(matrix,sigma):
+    """
+    the operator matrix - sigma, for a real symmetric LinearOperator matrix.
+    """
+    return LinearOperator(matrix.shape,matvec=lambda x: matrix @ x - sigma * x,
+                          matmat=lambda x: matrix @ x - sigma * x,rmatvec=lambda x: matrix @ x - sigma * x,dtype=float)
+
+def iterative_eigsh(matrix,num_eigs,sigma,guess):
+    """
+    the num_eigs eigenstates of matrix closest to sigma, from ARPACK without shift-invert, so only
+    products with the matrix are needed. returns the values, vectors and the vector to start the
+    next call from.
+    """
+    start = None if guess is None else np.real(guess).sum(axis=1)
+    vals,vecs = eigsh(shifted_operator(matrix,sigma),k=num_eigs,which='SM',v0=start)
+    order = np.argsort(vals)
+    return vals[order] + sigma,vecs[:,order],vecs
+
+def iterative_lobpcg(matrix,num_eigs,sigma,guess,tol=1e-10,maxiter=2000):
+    """
+    the num_eigs eigenstates of matrix closest to sigma, as the smallest of (matrix - sigma)^2 found
+    by LOBPCG. starts from guess, the vectors of the previous parameter, when given, which is where
+    it gains over eigsh along a sweep. the eigenvalues come from the matrix on the converged subspace.
+    """
+    shifted = shifted_operator(matrix,sigma)
+    #scaled by the size of the spectrum so tol is relative to it
+    probe = np.random.default_rng(0).standard_normal(matrix.shape[0])
+    scale = np.linalg.norm(shifted @ probe)/np.linalg.norm(probe)
+    folded = LinearOperator(matrix.shape,matvec=lambda x: shifted @ (shifted @ x)/scale**2,
+                            matmat=lambda x: shifted @ (shifted @ x)/scale**2,dtype=float)
+    if guess is None or guess.shape != (matrix.shape[0],num_eigs):
+        guess = np.random.default_rng(0).standard_normal((matrix.shape[0],num_eigs))
+    _,vectors = lobpcg(folded,np.real(guess),largest=False,tol=tol,maxiter=maxiter)
+    basis,_ = np.linalg.qr(vectors)
+    vals,rotation = eigh(basis.T @ (matrix @ basis))
+    vecs = basis @ rotation
+    return vals,vecs,vecs
+
+#iterative routines for LinearOperators, see Diagonaliser
+iterative_methods = {'eigsh':iterative_eigsh,'lobpcg':iterative_lobpcg}
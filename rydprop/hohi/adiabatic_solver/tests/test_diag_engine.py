@@ -109,4 +109,39 @@ def test_matrix_converter_coo_to_sparse():
     num_eig = 1
     my_diag = Diagonaliser(return_vecs,num_eig,h0,h1)
 
-    assert type(my_diag.h0) == csr_matrix and type(my_diag.h0) == csr_matrix
\ No newline at end of file
+    assert type(my_diag.h0) == csr_matrix and type(my_diag.h0) == csr_matrix
+def test_linear_operator_h1():
+    """
+    a LinearOperator interaction is kept by the sparse engine and made dense for the dense one
+    """
+    from scipy.sparse.linalg import aslinearoperator
+    h0 = csr_matrix(np.diag(np.arange(4.0)))
+    h1 = np.random.rand(4,4)
+    h1 = h1 + h1.T
+    my_diag = Diagonaliser(False,1,h0,aslinearoperator(h1))
+    assert type(my_diag.h0) == csr_matrix and not isspmatrix(my_diag.h1)
+    dense = Diagonaliser(True,4,h0,aslinearoperator(h1))
+    assert type(dense.h1) == np.ndarray and np.allclose(dense.h1,h1)
+    vals,vecs = dense(0.5,0.0)
+    assert np.allclose(vals,np.linalg.eigvalsh(h0.toarray() + 0.5*h1))
+
+@pytest.mark.parametrize("iterative",['eigsh','lobpcg'])
+def test_iterative_operator(iterative):
+    """
+    an operator with no matrix is solved by products alone, the second call starting from the first
+    """
+    from scipy.sparse.linalg import aslinearoperator
+    rng = np.random.default_rng(1)
+    h1 = rng.standard_normal((40,40))
+    h1 = h1 + h1.T
+    h0 = csr_matrix(np.diag(np.arange(40.0)))
+    my_diag = Diagonaliser(True,3,h0,aslinearoperator(h1),iterative)
+    for param in (0.01,0.02):
+        vals,vecs = my_diag(param,20.2)
+        dense = np.linalg.eigvalsh(h0.toarray() + param*h1)
+        assert np.allclose(np.sort(vals),np.sort(dense[np.argsort(np.abs(dense - 20.2))[:3]]))
+    assert my_diag.guess is not None
+
+@pytest.mark.xfail(raises=KeyError)
+def test_iterative_unknown():
+    Diagonaliser(True,1,np.zeros((3,3)),np.zeros((3,3)),'foo')
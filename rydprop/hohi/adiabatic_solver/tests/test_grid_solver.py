@@ -0,0 +1,66 @@
+from ..grid_solver import Grid_solver,snake_order,match_states
+import pytest
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+def random_symmetric(size,seed):
+    matrix = np.random.default_rng(seed).standard_normal((size,size))
+    return matrix + matrix.T
+
+def test_snake_order():
+    """
+    every point once, each next to the one before
+    """
+    order = snake_order((3,4))
+    assert len(set(order)) == 12 and order[:5] == [(0,0),(0,1),(0,2),(0,3),(1,3)]
+    assert all(abs(i1-i2) + abs(j1-j2) == 1 for (i1,j1),(i2,j2) in zip(order[:-1],order[1:]))
+
+def test_match_states():
+    vecs = np.eye(3)
+    vals,matched = match_states(vecs[:,[2,0,1]],np.array([1.0,2.0,3.0]),vecs)
+    assert list(vals) == [3.0,1.0,2.0] and np.all(matched == vecs[:,[2,0,1]])
+
+def test_dense_grid():
+    """
+    each point holds the eigenvalues of h0 + x h1 + y h2
+    """
+    h0 = np.diag(np.arange(6.0))
+    h1,h2 = random_symmetric(6,1),random_symmetric(6,2)
+    axes = [np.linspace(0,0.1,3),np.linspace(0,0.2,4)]
+    vals = Grid_solver(h0,[h1,h2],axes).run()
+    assert vals.shape == (3,4,6)
+    for i,x in enumerate(axes[0]):
+        for j,y in enumerate(axes[1]):
+            assert np.allclose(np.sort(vals[i,j]),np.linalg.eigvalsh(h0 + x*h1 + y*h2))
+
+def test_states_followed_through_crossings():
+    """
+    with no coupling each state keeps its index where the energies cross
+    """
+    h0 = np.diag([0.0,1.0,2.0])
+    h1 = np.diag([1.0,-1.0,0.0])
+    h2 = np.diag([0.0,2.0,-2.0])
+    axes = [np.linspace(0,1.5,5),np.linspace(0,1.0,4)]
+    vals,vecs = Grid_solver(h0,[h1,h2,h2],axes,weights=lambda x,y: (x,y,0.0),return_vecs=True).run()
+    x,y = np.meshgrid(*axes,indexing='ij')
+    for k in range(3):
+        assert np.allclose(vals[:,:,k],h0[k,k] + x*h1[k,k] + y*h2[k,k])
+    assert vecs.shape == (5,4,3,3)
+
+def test_sparse_grid():
+    """
+    the sparse routine seeded from the previous point finds the states closest to sigma
+    """
+    h0 = csr_matrix(np.diag(np.arange(30.0)))
+    h1,h2 = csr_matrix(random_symmetric(30,3)),csr_matrix(random_symmetric(30,4))
+    axes = [np.linspace(0,0.01,3),np.linspace(0,0.01,3)]
+    vals = Grid_solver(h0,[h1,h2],axes,sigma=15.2,num_eigs=3,follow=False).run()
+    for i,x in enumerate(axes[0]):
+        for j,y in enumerate(axes[1]):
+            dense = np.linalg.eigvalsh((h0 + x*h1 + y*h2).toarray())
+            assert np.allclose(np.sort(vals[i,j]),np.sort(dense[np.argsort(np.abs(dense - 15.2))[:3]]))
+
+@pytest.mark.xfail(raises=ValueError)
+def test_weights_needed():
+    Grid_solver(np.eye(3),[np.eye(3)],[np.zeros(2),np.zeros(2)])
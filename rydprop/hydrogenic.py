@@ -0,0 +1,78 @@
+"""
+Closed form radial integrals for hydrogenic states (integer n*), using the Gordon formula.
+The terminating hypergeometric series are summed exactly in integer arithmetic, which
+avoids the cancellation that makes a floating point evaluation useless at high n. Signs
+follow the numerov wavefunctions, which are positive at large r, so values can be mixed
+freely with those from numerov.radial_overlap.
+"""
+from math import lgamma,log,exp,sqrt
+from fractions import Fraction
+import functools
+
+def _hyp_exact(a,b,c,P,Q):
+    """
+    terminating hypergeometric series F(-a,-b;c;-P/Q) for non-negative integers a,b and
+    integers c,P,Q, returned as an exact Fraction. Summed by Horner's rule on integer
+    numerator and denominator.
+    """
+    num,den = 1,1
+    for k in range(min(a,b)-1,-1,-1):
+        t_num = (a-k)*(b-k)*(-P)
+        t_den = (c+k)*(k+1)*Q
+        num,den = den*t_den + t_num*num,t_den*den
+    return Fraction(num,den)
+
+@functools.lru_cache(maxsize=2**16)
+def gordon_dipole(n1,l1,n2,l2):
+    """
+    radial integral <n1 l1| r |n2 l2> in atomic units for hydrogenic states with l2 = l1 +/- 1.
+
+    Parameters
+    ----------
+    n1,n2: int
+        principal quantum numbers
+    l1,l2: int
+        orbital angular momenta, must differ by one
+    """
+    n1,l1,n2,l2 = int(n1),int(l1),int(n2),int(l2)
+    if abs(l1-l2) != 1:
+        raise ValueError("Gordon formula requires l to differ by one. provided l1 = "+str(l1)+", l2 = "+str(l2))
+    if l1 >= n1 or l2 >= n2:
+        raise ValueError("l must be less than n.")
+
+    # the integral is symmetric, use <n l| r |n' l-1>
+    if l2 == l1 + 1:
+        n1,l1,n2,l2 = n2,l2,n1,l1
+    n,l,n_p = n1,l1,n2
+
+    #sign change from the laguerre convention to the numerov one, (-1)^(n_r + n'_r)
+    convention = (-1)**((n - l - 1) + (n_p - l))
+
+    if n == n_p:
+        return 1.5 * n * sqrt(n**2 - l**2)
+
+    d = n - n_p
+    s = n + n_p
+    P = 4*n*n_p
+    Q = d*d
+    F1 = _hyp_exact(n - l - 1,n_p - l,2*l,P,Q)
+    F2 = _hyp_exact(n - l + 1,n_p - l,2*l,P,Q)
+    X = Fraction(d)**(s - 2*l - 2) * (F1 - Fraction(Q,s*s)*F2)
+    if X == 0:
+        return 0.0
+
+    #prefactor is far outside floating point range for large n so is combined as a log
+    log_prefactor = -log(4.0) - lgamma(2*l) + (l + 1)*log(P) - s*log(s) \
+                    + 0.5*(lgamma(n + l + 1) + lgamma(n_p + l) - lgamma(n - l) - lgamma(n_p - l + 1))
+    log_X = log(abs(X.numerator)) - log(X.denominator)
+    sign = (-1)**(n_p - l) * (1 if X > 0 else -1) * convention
+    return sign * exp(log_prefactor + log_X)
+
+def radial_overlap_hydrogenic(n1,l1,n2,l2,p=1.0):
+    """
+    radial overlap of two hydrogenic states, same signature as numerov.radial_overlap.
+    only the dipole moment p = 1 between l and l +/- 1 has a closed form here.
+    """
+    if p != 1.0:
+        raise ValueError("hydrogenic radial overlaps only available for p = 1, provided p = "+str(p))
+    return gordon_dipole(n1,l1,n2,l2)
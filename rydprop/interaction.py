@@ -1,9 +1,12 @@
 from .space import Space
-from scipy.sparse import coo_matrix
+from scipy.sparse import coo_matrix,csr_matrix
+from .angular import angular_table,angular_factors,sin_squared_factors
+from .symmetric import Symmetric_matrix,symmetric_matrix
+import numpy as np
 """
 functions which act on space objects to return a matrix in requested format.
 """ 
-def interaction(space,int_type=None,parallel = True):
+def interaction(space,int_type=None,parallel = True,symmetry = None,workers = None,symmetric = False):
     """
     Parameters
     ==========
@@ -12,6 +15,18 @@ def interaction(space,int_type=None,parallel = True):
         'elec' - static electric interaction
         'mag' - static magnetic interaction
         'osc' - oscillating electric interaction, same base matrix as elec. 
+        'dia' - static diamagnetic interaction, r^2 sin^2(theta)
+    symmetry: string or list
+        if given, returns a list of the matrices of each of space.blocks(symmetry) rather than
+        the whole matrix. the symmetry must be conserved by the interaction, see conserved_symmetries.
+    workers: int
+        number of threads sharing the radial integrals of the matrix elements, one l block at a
+        time, see electric_elements. one if not given. only for the electric interactions. the
+        selection of the pairs, the angular factors and the csr assembly are done in this thread,
+        they are not split into row blocks.
+    symmetric: bool
+        if True returns a Symmetric_matrix, or a list of them with symmetry, which holds only the upper
+        triangle, with int32 indices, so takes half the memory of the csr matrix.
     """
     if type(space) != Space:
         raise TypeError("Interactions act on " +str(type(Space)) + "objects." )
@@ -20,72 +35,364 @@ def interaction(space,int_type=None,parallel = True):
         function = interactions[int_type]
     else:
         raise KeyError("couldnt find the interaction asked for. Options are " + str(interactions.keys))
-        
-    return function(space,parallel)
-        
 
-def electric_interaction(space,parallel):
+    arguments = {}
+    if workers is not None:
+        if int_type not in threaded_interactions:
+            raise ValueError(str(int_type) + " interaction does not take workers, only " + str(threaded_interactions))
+        arguments['workers'] = workers
+
+    #the space keeps the matrix and only computes the rows of states appended since it was built
+    if symmetric:
+        #only the upper triangle is kept, and the space stores it in place of the whole matrix
+        key = (int_type,parallel,'upper')
+        matrix = space.cached_matrix(key,lambda space,start: function(space,parallel,start,symmetric=True,**arguments).upper)
+    else:
+        key = (int_type,parallel)
+        matrix = space.cached_matrix(key,lambda space,start: function(space,parallel,start,**arguments))
+    if symmetry is None:
+        return Symmetric_matrix(matrix) if symmetric else matrix
+
+    names = [symmetry] if isinstance(symmetry,str) else list(symmetry)
+    conserved = conserved_symmetries[int_type].get(parallel,())
+    for name in names:
+        if name not in conserved:
+            raise ValueError(str(int_type) + " interaction with parallel = " + str(parallel) + " does not conserve " + str(name))
+    matrices = block_matrices(matrix,space.blocks(symmetry))
+    if symmetric:
+        #each block keeps the order of the space, so its part of the upper triangle is its own
+        return [Symmetric_matrix(block) for block in matrices]
+    return matrices
+
+def block_matrices(matrix,blocks):
+    """
+    the diagonal blocks of a matrix over a space, one for each of the sub-spaces returned by
+    Space.blocks, as csr matrices.
+    """
+    matrix = csr_matrix(matrix)
+    return [matrix[block.parent_index][:,block.parent_index] for block in blocks]
+
+def selection_pairs(ls,mls,dl=1,dmls=(0,),start=0):
+    """
+    every pair of states (i,j) with l_j = l_i + dl and ml_j - ml_i in dmls, generated group by group
+    from the states sharing (l,ml) rather than by testing every pair. with start only the pairs with
+    at least one state from start onwards.
+
+    Parameters
+    ----------
+    ls,mls: array
+        l and ml of each state
+    dl: int
+        difference in l, must be positive so each pair is found once
+    dmls: tuple
+        allowed differences in ml
+
+    Returns
+    -------
+    i,j: array
+        indices of the two states of each pair
+    """
+    ls = np.asarray(ls,dtype=np.int64)
+    mls = np.asarray(mls,dtype=np.int64)
+    if len(ls) == 0:
+        return np.zeros(0,dtype=np.int64),np.zeros(0,dtype=np.int64)
+    labels,inverse = np.unique(np.stack((ls,mls),axis=1),axis=0,return_inverse=True)
+    inverse = inverse.reshape(-1)
+    order = np.argsort(inverse,kind='stable')
+    bounds = np.searchsorted(inverse[order],np.arange(len(labels)+1))
+    groups = {(l,ml):order[bounds[g]:bounds[g+1]] for g,(l,ml) in enumerate(labels.tolist())}
+
+    i_list = []
+    j_list = []
+    for (l,ml),group1 in groups.items():
+        for dml in dmls:
+            group2 = groups.get((l+dl,ml+dml))
+            if group2 is None:
+                continue
+            i = np.repeat(group1,len(group2))
+            j = np.tile(group2,len(group1))
+            if start > 0:
+                new = (i >= start) | (j >= start)
+                i,j = i[new],j[new]
+            i_list.append(i)
+            j_list.append(j)
+    if len(i_list) == 0:
+        return np.zeros(0,dtype=np.int64),np.zeros(0,dtype=np.int64)
+    return np.concatenate(i_list),np.concatenate(j_list)
+
+def electric_elements(space,rows,cols,parallel,workers=None):
     """
-    electric field interaction, in units of ea_0.
+    the electric matrix elements of the pairs of states (rows[k],cols[k]) of the space, in units of ea_0.
+    elements held by the element_cache of the atom are taken from it, as matrix_element does, and
+    the others are computed together and added to it. their radial parts come from radial_overlaps,
+    so only those pairs are integrated, shared between workers threads, and their angular parts are
+    gathered from angular_table.
+    """
+    rows = np.asarray(rows,dtype=np.int64)
+    cols = np.asarray(cols,dtype=np.int64)
+    cache = space.atom.element_cache
+    keys = cache.keys(space.array[rows],space.array[cols])
+    elements,missing = cache.lookup(keys,parallel)
+    if len(missing) == 0:
+        return elements
+
+    rows,cols = rows[missing],cols[missing]
+    ls = space.array['l'].astype(np.int64)
+    mls = space.array['ml'].astype(np.int64)
+    radial = space.atom.radial_overlaps(space.array[rows],space.array[cols],order=1.0,workers=workers)
+    table = angular_table(int(ls.max()) + 1)
+    elements[missing] = angular_factors(table,ls[rows],ls[cols],mls[rows],mls[cols],parallel == True) * radial
+    cache.update(keys[missing],elements[missing],parallel)
+    return elements
+
+def electric_interaction(space,parallel,start=0,workers=None,symmetric=False):
+    """
+    electric field interaction, in units of ea_0. only the pairs allowed by the selection rules
+    are generated, and their radial and angular parts are gathered from a radial table and an
+    angular table in bulk, so the cost goes with the number of non-zero elements. elements already
+    in the element cache of the atom are not computed again, see electric_elements. with start only the
+    rows and columns of the states from start onwards are filled, which extends a matrix built before
+    those states were appended. workers is the number of threads sharing the radial integrals. with
+    symmetric returns a Symmetric_matrix, each pair stored once.
     """
     if parallel == True:
-        selection_rules={'dl':1,'dml':0}
+        selection_rules={'dl':1,'dml':(0,)}
     else:
-        selection_rules={'dl':1,'dml':1}
-        
-    row_list=[]
-    col_list=[]
-    value_list=[]
-    
-    for row in range(len(space)):  #only loops over upper triangle of space as symmetric
-        for col in range(row):
-            state1 = space[row]
-            state2 = space[col]
-            dn = abs(state1.n - state2.n)
-            dl = abs(state1.l - state2.l)
-            dml = abs(state1.ml-state2.ml)
-            if dl == selection_rules['dl'] and dml ==selection_rules['dml']:
-                matrix_element = space.atom.matrix_element(state1,state2,parallel)
-                
-                row_list.append(row)
-                col_list.append(col)
-                value_list.append(matrix_element)
-                
-                col_list.append(row)
-                row_list.append(col)
-                value_list.append(matrix_element)
-                
-                
-    return coo_matrix((value_list,(row_list,col_list)),shape=(len(space), len(space)))
+        selection_rules={'dl':1,'dml':(-1,1)}
+
+    ls = space.array['l'].astype(np.int64)
+    mls = space.array['ml'].astype(np.int64)
+    rows,cols = selection_pairs(ls,mls,selection_rules['dl'],selection_rules['dml'],start)
+    if len(rows) == 0:
+        return symmetric_matrix([],[],[],(len(space), len(space))) if symmetric else csr_matrix((len(space), len(space)))
+
+    elements = electric_elements(space,rows,cols,parallel,workers)
+    if symmetric:
+        return symmetric_matrix(elements,rows,cols,(len(space), len(space)))
+
+    #symmetric, so each pair fills both triangles
+    return csr_matrix((np.concatenate((elements,elements)),(np.concatenate((rows,cols)),np.concatenate((cols,rows)))),
+                      shape=(len(space), len(space)))
             
     
-def magnetic_interaction(space,parallel):
+def magnetic_interaction(space,parallel,start=0,symmetric=False):
     """
     magnetic interaction, currently only works if para if True.
-    returns in atomic units (e*hbar/m_e)
+    returns in atomic units (e*hbar/m_e). start and symmetric as for electric_interaction.
     """
     
     
     if parallel == False:
         raise ValueError("Only parallel magnetic fields supported at present")
         
-    row_list =[]
-    col_list=[]
-    value_list=[]
-    
-    for i,state in enumerate(space):
-        row_list.append(i)
-        col_list.append(i)
-        value_list.append(state.ml * 0.5)
+    indices = np.arange(start,len(space))
+    value_list = space.array['ml'][start:] * 0.5
+    if symmetric:
+        return symmetric_matrix(value_list,indices,indices,(len(space), len(space)))
         
-    return coo_matrix((value_list,(row_list,col_list)),shape=(len(space), len(space)))
+    return coo_matrix((value_list,(indices,indices)),shape=(len(space), len(space)))
+
+def diamagnetic_interaction(space,parallel,start=0,symmetric=False):
+    """
+    diamagnetic interaction r^2 sin^2(theta) of a magnetic field along the quantisation axis, in units of
+    a_0^2, so the hamiltonian is B^2/8 times it in atomic units. couples states of the same ml whose l
+    differs by 0 or 2, with the radial moments p = 2 from RydbergAtom.radial_overlaps and the angular
+    parts from sin_squared_factors. start and symmetric as for electric_interaction.
+    """
+    if parallel == False:
+        raise ValueError("Only parallel magnetic fields supported at present")
+
+    ls = space.array['l'].astype(np.int64)
+    mls = space.array['ml'].astype(np.int64)
+    #within an l both orders of each pair are generated, keep the upper triangle
+    same_rows,same_cols = selection_pairs(ls,mls,0,(0,),start)
+    upper = same_rows <= same_cols
+    two_rows,two_cols = selection_pairs(ls,mls,2,(0,),start)
+    rows = np.concatenate((same_rows[upper],two_rows))
+    cols = np.concatenate((same_cols[upper],two_cols))
+
+    values = sin_squared_factors(ls[rows],ls[cols],mls[rows])
+    if len(rows) > 0:
+        values = values * space.atom.radial_overlaps(space.array[rows],space.array[cols],order=2.0)
+    if symmetric:
+        return symmetric_matrix(values,rows,cols,(len(space), len(space)))
+
+    off_diagonal = rows != cols
+    return csr_matrix((np.concatenate((values,values[off_diagonal])),
+                       (np.concatenate((rows,cols[off_diagonal])),np.concatenate((cols,rows[off_diagonal])))),
+                      shape=(len(space), len(space)))
+
+def field_interactions(space,workers=None):
+    """
+    the matrices of a static electric field at any angle to a static magnetic field along the quantisation
+    axis, in atomic units, each built once and kept by the space, see Space.cached_matrix. returns a
+    dictionary of
+        'parallel' - electric field along the magnetic field, electric_interaction(space,True)
+        'perpendicular' - electric field along x, from the spherical_operators
+        'paramagnetic' - magnetic_interaction, ml/2
+        'diamagnetic' - diamagnetic_interaction, r^2 sin^2(theta)
+    the perpendicular matrix is in the phase convention of the others, so they can be summed, see
+    Field_hamiltonian. workers as for interaction.
+    """
+    arguments = {} if workers is None else {'workers':workers}
+    return {'parallel':interaction(space,'elec',True,**arguments),
+            'perpendicular':csr_matrix(polarisation_operator(spherical_operators(space),[1.0,0.0,0.0])),
+            'paramagnetic':interaction(space,'mag',True),
+            'diamagnetic':interaction(space,'dia',True)}
+
+class Field_hamiltonian:
+    def __init__(self,space,workers=None,energies=True):
+        """
+        H(F,B,theta) = H0 + F cos(theta) z + F sin(theta) x + B L_z/2 + B^2 r^2 sin^2(theta)/8 in atomic
+        units, for an electric field F at angle theta to a magnetic field B along the quantisation axis.
+        the matrices of field_interactions are put on their common sparsity pattern once, so the
+        hamiltonian at each (F,B,theta) is a weighted sum of their values, with no sparse assembly.
+
+        Parameters
+        ----------
+        space: Space
+            the states
+        workers: int
+            number of threads sharing the radial integrals of the electric interaction
+        energies: bool
+            include H0, otherwise only the interactions
+        """
+        pieces = field_interactions(space,workers)
+        if energies:
+            pieces = dict({'H0':space.H0()},**pieces)
+        self.names = tuple(pieces.keys())
+        self.shape = (len(space),len(space))
+
+        size = np.int64(len(space))
+        matrices = [coo_matrix(matrix) for matrix in pieces.values()]
+        keys = [matrix.row.astype(np.int64) * size + matrix.col for matrix in matrices]
+        pattern = np.unique(np.concatenate(keys))
+        #the values of each piece on the pattern, one row per piece
+        self.data = np.zeros((len(matrices),len(pattern)))
+        for k,(matrix,key) in enumerate(zip(matrices,keys)):
+            np.add.at(self.data[k],np.searchsorted(pattern,key),matrix.data)
+        self.indices = (pattern % size).astype(np.int32)
+        self.indptr = np.searchsorted(pattern // size,np.arange(size + 1)).astype(np.int32)
+
+    def weights(self,field,magnetic,theta=0.0):
+        """
+        the weight of each of names at electric field field, magnetic field magnetic and angle theta.
+        """
+        weights = {'H0':1.0,'parallel':field*np.cos(theta),'perpendicular':field*np.sin(theta),
+                   'paramagnetic':magnetic,'diamagnetic':magnetic**2/8.0}
+        return np.array([weights[name] for name in self.names])
+
+    def __call__(self,field,magnetic,theta=0.0):
+        """
+        the hamiltonian as a csr matrix. the index arrays are shared by every matrix returned, so
+        should not be changed in place.
+        """
+        return csr_matrix((self.weights(field,magnetic,theta) @ self.data,self.indices,self.indptr),shape=self.shape)
+
+def radial_moment_matrices(space,powers,dl=1,dml=0):
+    """
+    sparse matrices of the radial overlaps <i| r^p |j> between the states of the space, one for
+    each power in powers, filled in a single pass over the pairs of states whose l differs by dl
+    and ml by dml. in the same units as RydbergAtom.radial_overlap.
+    """
+    radial_index,radial_tables = space.atom.radial_tables(space.states,powers,dl)
+    rows,cols = selection_pairs(space.array['l'],space.array['ml'],dl,(dml,-dml) if dml != 0 else (0,))
+    if dl == 0:
+        #within an l both orders of each pair are generated, keep the lower triangle
+        lower = rows >= cols
+        rows,cols = rows[lower],cols[lower]
+    off_diagonal = rows != cols
+    row_list = np.concatenate((rows,cols[off_diagonal]))
+    col_list = np.concatenate((cols,rows[off_diagonal]))
+
+    matrices = []
+    for table in radial_tables:
+        values = table[radial_index[rows],radial_index[cols]]
+        values = np.concatenate((values,values[off_diagonal]))
+        matrices.append(coo_matrix((values,(row_list,col_list)),shape=(len(space), len(space))))
+    return matrices
+
+def spherical_operators(space,radial=True):
+    """
+    the spherical components q = -1,0,+1 of the dipole operator between the states of the space, as a
+    dictionary of csr matrices whose element [i,j] is <i| r_q |j>, non-zero only for ml_i = ml_j + q.
+    q = 0 is the parallel electric_interaction. the matrices are kept by the space, see
+    Space.cached_matrix, so couplings for any polarisation are sums of them, see polarisation_operator,
+    and only the rows of states appended since are built.
+
+    Parameters
+    ----------
+    space: Space
+        the states
+    radial: bool
+        include the radial overlaps, in units of ea_0, otherwise only the angular factors
+    """
+    return {q:space.cached_matrix(('spherical',q,radial),lambda space,start,q=q: spherical_operator(space,q,radial,start))
+            for q in (-1,0,1)}
+
+def spherical_operator(space,q,radial=True,start=0):
+    """
+    the component q of the dipole operator, see spherical_operators. with start only the rows and
+    columns of the states from start onwards are filled, and only their radial overlaps computed.
+    """
+    ls = space.array['l'].astype(np.int64)
+    mls = space.array['ml'].astype(np.int64)
+    #pairs with the higher l state at ml + q are the element [higher,lower], those at ml - q [lower,higher]
+    lower1,higher1 = selection_pairs(ls,mls,1,(q,),start)
+    lower2,higher2 = selection_pairs(ls,mls,1,(-q,),start)
+    rows = np.concatenate((higher1,lower2))
+    cols = np.concatenate((lower1,higher2))
+    if len(rows) == 0:
+        return csr_matrix((len(space), len(space)))
+
+    table = angular_table(int(ls.max()) + 1)
+    #the parallel factors with dM = +-1 are symmetric in the two states, r_+1 takes the opposite
+    #sign to them so that r_q^dagger = (-1)^q r_-q with the spherical harmonics of get_2d_wf
+    values = angular_factors(table,ls[cols],ls[rows],mls[cols],mls[rows],True) * (-1.0 if q == 1 else 1.0)
+    if radial:
+        values = values * space.atom.radial_overlaps(space.array[rows],space.array[cols],order=1.0)
+    return csr_matrix((values,(rows,cols)),shape=(len(space), len(space)))
+
+def field_vector(theta,phi=0.0):
+    """
+    unit vector (x,y,z) of a field at polar angle theta from z and azimuth phi.
+    """
+    return np.array([np.sin(theta)*np.cos(phi),np.sin(theta)*np.sin(phi),np.cos(theta)])
+
+def polarisation_operator(operators,polarisation):
+    """
+    the coupling e.r for a polarisation or field vector e = (x,y,z), which may be complex for elliptical
+    polarisations, as a sum of the spherical_operators. returns a real matrix when e is real. the
+    x operator is electric_interaction(space,False) after a phase (-1)^(ml(ml+1)/2) on each state,
+    so has the same eigenvalues.
+    """
+    x,y,z = np.asarray(polarisation)
+    coefficients = {0:z,1:-(x - 1j*y)/np.sqrt(2),-1:(x + 1j*y)/np.sqrt(2)}
+    if all(np.imag(c) == 0 for c in coefficients.values()):
+        coefficients = {q:np.real(c) for q,c in coefficients.items()}
+
+    total = None
+    for q,coefficient in coefficients.items():
+        if coefficient == 0:
+            continue
+        term = coefficient * operators[q]
+        total = term if total is None else total + term
+    if total is None:
+        total = 0.0 * operators[0]
+    return total
 
-def oscillating_electric_interaction(space,parallel):
+def oscillating_electric_interaction(space,parallel,start=0,workers=None,symmetric=False):
     """
     same as electric interaction except it has factor of 1/2 to account for time averaging
     """
     
-    return 0.5*electric_interaction(space,parallel)
+    return 0.5*electric_interaction(space,parallel,start,workers,symmetric)
 
-interactions = {'elec':electric_interaction,'mag':magnetic_interaction,'osc':oscillating_electric_interaction}
+interactions = {'elec':electric_interaction,'mag':magnetic_interaction,'osc':oscillating_electric_interaction,
+                'dia':diamagnetic_interaction}
+#interactions whose radial integrals can be shared between threads
+threaded_interactions = ('elec','osc')
+#symmetries of Space.blocks which each interaction conserves, for parallel True and False
+conserved_symmetries = {'elec':{True:('ml',)},'mag':{True:('ml','parity')},'osc':{True:('ml',)},
+                        'dia':{True:('ml','parity')}}
 
@@ -0,0 +1,122 @@
+"""
+Matrix-free Stark Hamiltonian. The electric interaction is never stored: every product with
+a vector walks the pairs of (l,ml) groups allowed by the selection rules and takes each element
+as an angular factor, one per pair of groups, times an entry of the (l,l+1) blocks of the radial
+table of the distinct (n,l) of the space. Only the quantum numbers of the states and those blocks
+are kept, so bases too large for H1, or for the factorisation of a shift-invert solver, can still be
+diagonalised with iterative solvers which only need products.
+"""
+import numpy as np
+from numba import jit
+from scipy.sparse.linalg import LinearOperator
+from .angular import angular_table,angular_factors
+
+@jit(nopython=True, nogil=True, cache=True)
+def _stark_matvec(x, y, order, bounds, positions, blocks, pairs, offsets, widths, factors):
+    """
+    adds the electric interaction times x to y, for x and y of shape (states, vectors). pairs
+    holds the two groups of each pair of groups, whose states are order[bounds[g]:bounds[g+1]],
+    and factors the angular factor of the pair. the radial integral of states i and j of a pair
+    is blocks[offsets[k] + positions[i]*widths[k] + positions[j]], the (l,l+1) blocks of the
+    radial table flattened one after another.
+    """
+    for k in range(len(pairs)):
+        g1 = pairs[k, 0]
+        g2 = pairs[k, 1]
+        factor = factors[k]
+        offset = offsets[k]
+        width = widths[k]
+        for a in range(bounds[g1], bounds[g1 + 1]):
+            i = order[a]
+            row = offset + positions[i] * width
+            for b in range(bounds[g2], bounds[g2 + 1]):
+                j = order[b]
+                value = factor * blocks[row + positions[j]]
+                for c in range(x.shape[1]):
+                    y[i, c] += value * x[j, c]
+                    y[j, c] += value * x[i, c]
+
+class Stark_operator(LinearOperator):
+    def __init__(self,space,parallel=True,field=1.0,energies=True,workers=None):
+        """
+        H0 + field*H1 for the states of a space as a scipy LinearOperator, with H1 the
+        electric_interaction, computed on the fly in each product rather than stored. the
+        operator holds the states of the space when it is made, states appended later are not
+        included.
+
+        Parameters
+        ----------
+        space: Space
+            the states
+        parallel: bool
+            field parallel to the quantisation axis, as electric_interaction
+        field: float
+            the field in atomic units, see with_field
+        energies: bool
+            include H0, otherwise the operator is field*H1 alone, as the h1 of an Adiabatic_solver
+        workers: int
+            number of threads sharing the radial table, see RydbergAtom.radial_table
+        """
+        ls = space.array['l'].astype(np.int64)
+        mls = space.array['ml'].astype(np.int64)
+        self.parallel = parallel
+        self.field = field
+        self.energies = space.atom.energies(space.array) if energies else np.zeros(len(space))
+        self.radial_index,self.table = space.atom.radial_table(space.states,order=1.0,workers=workers)
+        #the blocks of the table one after another, and the position of each state in its block
+        ls_table = sorted(self.table.blocks)
+        self.blocks = np.concatenate([self.table.blocks[l].reshape(-1) for l in ls_table] + [np.zeros(0)])
+        starts = np.cumsum([0] + [self.table.blocks[l].size for l in ls_table])
+        block_offsets = {l:start for l,start in zip(ls_table,starts.tolist())}
+        self.positions = self.table.positions[self.radial_index]
+
+        #the states of each (l,ml) in one run of order
+        labels,inverse = np.unique(np.stack((ls,mls),axis=1),axis=0,return_inverse=True)
+        inverse = inverse.reshape(-1)
+        self.order = np.argsort(inverse,kind='stable')
+        self.bounds = np.searchsorted(inverse[self.order],np.arange(len(labels)+1))
+
+        #the pairs of groups with l + 1 and ml + dml, each found once
+        groups = {(l,ml):g for g,(l,ml) in enumerate(labels.tolist())}
+        dmls = (0,) if parallel == True else (-1,1)
+        pairs = [(g,groups[(l+1,ml+dml)]) for (l,ml),g in groups.items() for dml in dmls if (l+1,ml+dml) in groups]
+        self.pairs = np.array(pairs,dtype=np.int64).reshape(-1,2)
+        pair_ls = labels[self.pairs[:,0],0].tolist()
+        self.offsets = np.array([block_offsets[l] for l in pair_ls],dtype=np.int64)
+        self.widths = np.array([self.table.blocks[l].shape[1] for l in pair_ls],dtype=np.int64)
+        angular = angular_table(int(ls.max()) + 1 if len(ls) > 0 else 1)
+        self.factors = angular_factors(angular,labels[self.pairs[:,0],0],labels[self.pairs[:,1],0],
+                                       labels[self.pairs[:,0],1],labels[self.pairs[:,1],1],parallel == True).astype(float)
+        super().__init__(np.dtype(float),(len(space),len(space)))
+
+    def with_field(self,field):
+        """
+        the operator at another field, sharing the quantum numbers and radial blocks of this one.
+        """
+        operator = LinearOperator.__new__(Stark_operator)
+        operator.__dict__.update(self.__dict__)
+        operator.field = field
+        return operator
+
+    def diagonal(self):
+        """
+        the diagonal, H0, as the electric interaction has none.
+        """
+        return self.energies.copy()
+
+    def _matmat(self,x):
+        x = np.asarray(x,dtype=np.result_type(np.asarray(x).dtype,float))
+        interaction = np.zeros(x.shape,dtype=x.dtype)
+        if self.field != 0.0:
+            _stark_matvec(np.ascontiguousarray(x),interaction,self.order,self.bounds,self.positions,
+                          self.blocks,self.pairs,self.offsets,self.widths,self.factors)
+        return self.energies[:,None] * x + self.field * interaction
+
+    def _matvec(self,x):
+        return self._matmat(np.reshape(x,(-1,1))).reshape(np.shape(x))
+
+    def _adjoint(self):
+        return self
+
+    def _transpose(self):
+        return self
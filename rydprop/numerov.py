@@ -6,6 +6,8 @@ Module written by Adam Deller https://github.com/ad3ller
 """
 
 from math import ceil, log, exp
+from collections import OrderedDict
+import threading
 import numpy as np
 from numba import jit
 
@@ -73,6 +75,221 @@ def wf(n, l, nmax, step=0.005, rmin=0.65):
     yvals = yvals * (np.sum((yvals**2.0) * (rvals**2.0)))**-0.5
     return rvals, yvals
 
+@jit(nopython=True, nogil=True, cache=True)
+def wf_prealloc(n, l, nmax, step=0.005, rmin=0.65):
+    """ Same integration as wf() but without list growth. The number of grid
+        points is known before integrating, so r and y are written into
+        preallocated float64 buffers and views of the filled part are returned.
+    """
+    W1 = -0.5 * n**-2.0
+    W2 = (l + 0.5)**2.0
+    rmax = 2 * nmax * (nmax + 15)
+    r_in = n**2.0 - n * (n**2.0 - l*(l + 1.0))**0.5
+    step_sq = step**2.0
+    # ensure wf arrays will align using nmax
+    if n == nmax:
+        i = 0
+        r_sub2 = rmax
+    else:
+        i = int(ceil(log(rmax / (2 * n * (n + 15))) / step))
+        r_sub2 = rmax * exp(-i*step)
+    # last point stored is the first one inside rmin
+    i_last = int(log(rmax / rmin) / step) + 1
+    size = max(i_last - i + 2, 2)
+    rvals = np.empty(size, dtype=np.float64)
+    yvals = np.empty(size, dtype=np.float64)
+    i += 1
+
+    # initialise
+    r_sub1 = rmax * exp(-i*step)
+    g_sub2 = 2.0 * r_sub2**2.0 * (-1.0 / r_sub2 - W1) + W2
+    g_sub1 = 2.0 * r_sub1**2.0 * (-1.0 / r_sub1 - W1) + W2
+    y_sub2 = 1e-10
+    y_sub1 = y_sub2 * (1.0 + step * g_sub2**0.5)
+    rvals[0] = r_sub2
+    rvals[1] = r_sub1
+    yvals[0] = y_sub2
+    yvals[1] = y_sub1
+    count = 2
+
+    # Numerov method
+    i += 1
+    r = r_sub1
+    while r >= rmin and count < size:
+        ## next step
+        r = rmax * exp(-i*step)
+        g = 2.0 * r**2.0 * (-1.0 / r - W1) + W2
+        y = (y_sub2 * (g_sub2 - (12.0 / step_sq)) + y_sub1 * \
+            (10.0 * g_sub1 + (24.0 / step_sq))) / ((12.0 / step_sq) - g)
+
+        ## check for divergence
+        if r < r_in:
+            dy = abs((y - y_sub1) / y_sub1)
+            dr = (r**(-l-1) - r_sub1**(-l-1)) / r_sub1**(-l-1)
+            if dy > dr:
+                break
+
+        ## store vals
+        rvals[count] = r
+        yvals[count] = y
+        count += 1
+
+        ## next iteration
+        r_sub1 = r
+        g_sub2 = g_sub1
+        g_sub1 = g
+        y_sub2 = y_sub1
+        y_sub1 = y
+        i += 1
+
+    rvals = rvals[:count]
+    yvals = yvals[:count]
+    # normalisation
+    norm = 0.0
+    for k in range(count):
+        norm += (yvals[k]**2.0) * (rvals[k]**2.0)
+    yvals *= norm**-0.5
+    return rvals, yvals
+
+@jit(nopython=True, nogil=True, cache=True)
+def wf_adaptive(n, l, nmax, step=0.005, rmin=0.65, tol=1e-6, refine=2):
+    """ Numerov integration with a step size h chosen from the local
+        wavenumber, k = max(|g|^1/2, |dg/dx|^1/3), keeping (h k)^4 / 384, the
+        error of a step and of the cubic used on refining, below tol. Steps
+        are step / 2^m for m from 0 to refine, and a step is only coarsened
+        on a point of the coarser grid, so every point of the aligned grid of
+        wf() is integrated and the wavefunction is kept only there, without
+        interpolation. Where step is fine enough, the classically forbidden
+        tail included, it runs at step. r is advanced by one multiplication
+        per step. Inside twice the inner turning point the step is held at
+        step so the divergence check behaves as in wf(). Returns the
+        normalised r, y on the aligned grid and the number of points the
+        integration used.
+    """
+    W1 = -0.5 * n**-2.0
+    W2 = (l + 0.5)**2.0
+    rmax = 2 * nmax * (nmax + 15)
+    r_in = n**2.0 - n * (n**2.0 - l*(l + 1.0))**0.5
+    scale = 2**refine
+    h_min = step / scale
+    # ratio of successive r at each level
+    factors = np.empty(refine + 1, dtype=np.float64)
+    for level in range(refine + 1):
+        factors[level] = exp(-h_min * 2**level)
+    # local error of a step, and of the cubic used when refining, scales as (h k)^4
+    eps = (384.0 * tol)**0.25
+    eps_sq = eps**2.0
+    eps_cu = eps**3.0
+
+    if n == nmax:
+        i0 = 0
+    else:
+        i0 = int(ceil(log(rmax / (2 * n * (n + 15))) / step))
+    i_last = int(log(rmax / rmin) / step) + 1
+    size = max(i_last - i0 + 3, 2)
+    yvals = np.empty(size, dtype=np.float64)
+    # the last four points integrated, for coarsening and refining
+    hist_j = np.zeros(4, dtype=np.int64)
+    hist_y = np.zeros(4, dtype=np.float64)
+
+    level = refine
+    j = i0 * scale
+    r_sub2 = rmax * exp(-i0*step)
+    g_sub2 = 2.0 * r_sub2**2.0 * (-1.0 / r_sub2 - W1) + W2
+    y_sub2 = 1e-10
+    y_sub1 = y_sub2 * (1.0 + step * g_sub2**0.5)
+    hist_j[2] = j
+    hist_y[2] = y_sub2
+    j += scale
+    hist_j[3] = j
+    hist_y[3] = y_sub1
+    yvals[0] = y_sub2
+    yvals[1] = y_sub1
+    count = 2
+    points = 2
+    same = 1
+    r_sub1 = rmax * exp(-(i0 + 1)*step)
+    g_sub1 = 2.0 * r_sub1**2.0 * (-1.0 / r_sub1 - W1) + W2
+
+    r = r_sub1
+    while r >= rmin and count < size:
+        ## step size from the local wavenumber, compared without logs or roots
+        h = h_min * 2**level
+        h_sq = h * h
+        dg = abs(-2.0 * r_sub1 - 4.0 * W1 * r_sub1 * r_sub1)
+        too_fine = 4.0 * h_sq * abs(g_sub1) < eps_sq and 8.0 * h_sq * h * dg < eps_cu
+        too_coarse = h_sq * abs(g_sub1) > eps_sq or h_sq * h * dg > eps_cu
+        # keep the fixed step inside the inner turning point for the divergence check
+        if r_sub1 < 2.0 * r_in:
+            too_fine = level < refine
+            too_coarse = False
+
+        if too_fine and level < refine and same >= 2 and points >= 3 and j % 2**(level + 1) == 0:
+            # coarsen: the point two fine steps back becomes the new sub2
+            level += 1
+            same = 0
+            y_sub2 = hist_y[1]
+            r_s2 = rmax * exp(-hist_j[1]*h_min)
+            g_sub2 = 2.0 * r_s2**2.0 * (-1.0 / r_s2 - W1) + W2
+        elif too_coarse and level > 0 and points >= 4:
+            # refine: interpolate y half a step back with a cubic through the last four points
+            level -= 1
+            same = 0
+            x = (j - 2**level) * 1.0
+            y_new = 0.0
+            for a in range(4):
+                w = 1.0
+                for b in range(4):
+                    if b != a:
+                        w *= (x - hist_j[b]) / (hist_j[a] - hist_j[b])
+                y_new += w * hist_y[a]
+            y_sub2 = y_new
+            r_s2 = rmax * exp(-x*h_min)
+            g_sub2 = 2.0 * r_s2**2.0 * (-1.0 / r_s2 - W1) + W2
+
+        h = h_min * 2**level
+        step_sq = h * h
+        j += 2**level
+        r = r_sub1 * factors[level]
+        g = 2.0 * r**2.0 * (-1.0 / r - W1) + W2
+        y = (y_sub2 * (g_sub2 - (12.0 / step_sq)) + y_sub1 * \
+            (10.0 * g_sub1 + (24.0 / step_sq))) / ((12.0 / step_sq) - g)
+
+        ## check for divergence
+        if r < r_in:
+            dy = abs((y - y_sub1) / y_sub1)
+            dr = (r**(-l-1) - r_sub1**(-l-1)) / r_sub1**(-l-1)
+            if dy > dr:
+                break
+
+        ## store vals, only on the aligned grid
+        for a in range(3):
+            hist_j[a] = hist_j[a + 1]
+            hist_y[a] = hist_y[a + 1]
+        hist_j[3] = j
+        hist_y[3] = y
+        points += 1
+        same += 1
+        if j % scale == 0:
+            yvals[count] = y
+            count += 1
+
+        ## next iteration
+        r_sub1 = r
+        g_sub2 = g_sub1
+        g_sub1 = g
+        y_sub2 = y_sub1
+        y_sub1 = y
+
+    # r exactly as in wf() so the arrays compare equal in wf_align
+    rvals = np.empty(count, dtype=np.float64)
+    norm = 0.0
+    for k in range(count):
+        rvals[k] = rmax * exp(-(i0 + k)*step)
+        norm += (yvals[k]**2.0) * (rvals[k]**2.0)
+    yvals = yvals[:count] * norm**-0.5
+    return rvals, yvals, points
+
 @jit
 def find_first(arr, val):
     """ Index of the first occurence of val in arr.
@@ -131,6 +348,17 @@ def wf_overlap(r1, y1, r2, y2, p=1.0):
     r1, y1, r2, y2 = wf_align(r1, y1, r2, y2)
     return np.sum(y1 * y2 * r1**(2.0 + p))
 @jit
+def wf_moments(r1, y1, r2, y2, powers):
+    """ Overlaps sum(y1 * y2 * r^(2 + p)) for every p in powers, aligning the
+        two wavefunctions once.
+    """
+    r1, y1, r2, y2 = wf_align(r1, y1, r2, y2)
+    prod = y1 * y2
+    moments = np.empty(len(powers))
+    for k in range(len(powers)):
+        moments[k] = np.sum(prod * r1**(2.0 + powers[k]))
+    return moments
+@jit
 def radial_overlap(n1, l1, n2, l2, p=1.0):
     """ Radial overlap for state n1, l1 and n2 l2.
     """
@@ -140,3 +368,125 @@ def radial_overlap(n1, l1, n2, l2, p=1.0):
     return wf_overlap(r1, y1, r2, y2, p)
 
 
+
+
+class Wf_cache:
+    def __init__(self, max_entries=4096, max_bytes=512*1024**2):
+        """ Bounded least-recently-used store of Numerov wavefunctions keyed on
+            (n*, l, nmax, step, rmin, tol). The oldest entries are evicted once either
+            the number of entries or the memory held by the arrays exceeds its limit.
+            Safe to share between threads, which integrate outside the lock.
+
+            Parameters
+            ----------
+            max_entries: int
+                maximum number of wavefunctions held.
+            max_bytes: int
+                maximum memory, in bytes, of the stored r and y arrays.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._store = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._store)
+
+    def __call__(self, n, l, nmax, step=0.005, rmin=0.65, tol=None):
+        return self.get(n, l, nmax, step, rmin, tol)
+
+    def get(self, n, l, nmax, step=0.005, rmin=0.65, tol=None):
+        """ Return (rvals, yvals) for state n*, l aligned on nmax, integrating
+            only if it is not already stored. With a tol the adaptive-step
+            integrator is used. Returned arrays are read-only.
+        """
+        key = (float(n), int(l), float(nmax), float(step), float(rmin), tol)
+        with self._lock:
+            try:
+                vals = self._store[key]
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._store.move_to_end(key)
+                return vals
+
+        if tol is None:
+            # copies so the cache does not hold on to the unused part of the buffers
+            rvals, yvals = wf_prealloc(n, l, nmax, step, rmin)
+            rvals, yvals = rvals.copy(), yvals.copy()
+        else:
+            rvals, yvals, _ = wf_adaptive(n, l, nmax, step, rmin, tol)
+        rvals.flags.writeable = False
+        yvals.flags.writeable = False
+        with self._lock:
+            if key not in self._store:
+                self._store[key] = (rvals, yvals)
+                self.nbytes += rvals.nbytes + yvals.nbytes
+                self._evict()
+        return rvals, yvals
+
+    def _evict(self):
+        """ Drop the least recently used entries until within both limits,
+            always keeping the most recent one.
+        """
+        while len(self._store) > 1 and (len(self._store) > self.max_entries or self.nbytes > self.max_bytes):
+            _, (rvals, yvals) = self._store.popitem(last=False)
+            self.nbytes -= rvals.nbytes + yvals.nbytes
+            self.evictions += 1
+
+    def clear(self):
+        """ Empty the cache and reset the counters.
+        """
+        with self._lock:
+            self._store.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def info(self):
+        """ Dictionary of the cache statistics.
+        """
+        return dict({'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                     'entries': len(self._store), 'nbytes': self.nbytes,
+                     'max_entries': self.max_entries, 'max_bytes': self.max_bytes})
+
+wf_cache = Wf_cache()
+
+def cached_wf(n, l, nmax, step=0.005, rmin=0.65, tol=None):
+    """ wf() through the module wavefunction cache.
+    """
+    return wf_cache.get(n, l, nmax, step, rmin, tol)
+
+def cached_radial_overlap(n1, l1, n2, l2, p=1.0, tol=None):
+    """ radial_overlap() using wavefunctions from the module cache, so each
+        (n*, l, nmax) is only integrated once.
+    """
+    nmax = max(n1, n2)
+    r1, y1 = wf_cache.get(n1, l1, nmax, tol=tol)
+    r2, y2 = wf_cache.get(n2, l2, nmax, tol=tol)
+    return wf_overlap(r1, y1, r2, y2, p)
+
+def radial_moments(n1, l1, n2, l2, powers, tol=None):
+    """ Radial overlaps of n1, l1 and n2, l2 for several powers of r at once,
+        using wavefunctions from the module cache.
+    """
+    nmax = max(n1, n2)
+    r1, y1 = wf_cache.get(n1, l1, nmax, tol=tol)
+    r2, y2 = wf_cache.get(n2, l2, nmax, tol=tol)
+    return wf_moments(r1, y1, r2, y2, np.asarray(powers, dtype=np.float64))
+
+def wf_cache_info():
+    """ Hit, miss and eviction statistics of the module wavefunction cache.
+    """
+    return wf_cache.info()
+
+def clear_wf_cache():
+    """ Empty the module wavefunction cache.
+    """
+    wf_cache.clear()
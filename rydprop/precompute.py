@@ -0,0 +1,140 @@
+"""
+Parallel evaluation of numerov radial integrals. The pairs needed by a set of states are
+split into (n, n') blocks, the quantum numbers of every pair are placed in one shared-memory
+array and each block is integrated by a process of a ProcessPoolExecutor, which writes its
+results straight into a shared output array. Pairs in a block share wavefunctions, so every
+worker only integrates the states of its own two n ranges. Workers are started with spawn rather
+than fork: forking a process whose numba thread pool is already running, as it is once any
+parallel kernel has been called, can leave the children deadlocked on the pool's locks.
+"""
+import os
+import numpy as np
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from .numerov import cached_radial_overlap
+
+def pair_key(n1,l1,n2,l2,order):
+    """
+    key of a radial integral, ordered so <a|r^p|b> and <b|r^p|a> share it.
+    """
+    if (n1,l1) > (n2,l2):
+        n1,l1,n2,l2 = n2,l2,n1,l1
+    return (int(n1),int(l1),int(n2),int(l2),float(order))
+
+def radial_pairs(states,dl=1,block_size=4):
+    """
+    distinct pairs of (n,l) in states whose l differs by dl, grouped into blocks of
+    block_size values of n against block_size values of n'. each (n,l) is represented
+    by the first state found with it.
+
+    Parameters
+    ----------
+    states: iterable
+        states with n and l attributes
+    dl: int
+        difference in l of the pairs
+    block_size: int
+        number of values of n in each side of a block
+
+    Returns
+    -------
+    pairs: list
+        (state1,state2) of every pair, with the pairs of a block contiguous
+    bounds: list
+        (start,stop) of each block in pairs
+    """
+    if block_size < 1:
+        raise ValueError("block_size must be at least 1, got " + str(block_size))
+    by_n = {}
+    for state in states:
+        by_n.setdefault(state.n,{}).setdefault(state.l,state)
+    ns = sorted(by_n)
+    groups = [ns[i:i+block_size] for i in range(0,len(ns),block_size)]
+
+    pairs = []
+    bounds = []
+    seen = set()
+    for a,group1 in enumerate(groups):
+        for group2 in groups[a:]:
+            start = len(pairs)
+            for n1 in group1:
+                for n2 in group2:
+                    for l1 in sorted(by_n[n1]):
+                        for l2 in (l1 + dl,l1 - dl):
+                            key = pair_key(n1,l1,n2,l2,0.0)
+                            if l2 in by_n[n2] and key not in seen:
+                                seen.add(key)
+                                pairs.append((by_n[n1][l1],by_n[n2][l2]))
+            if len(pairs) > start:
+                bounds.append((start,len(pairs)))
+    return pairs,bounds
+
+def _compute_block(name_in,name_out,npairs,start,stop,order,tol):
+    """
+    worker: integrates the pairs start:stop of the shared input array into the shared output.
+    """
+    shm_in = shared_memory.SharedMemory(name=name_in)
+    shm_out = shared_memory.SharedMemory(name=name_out)
+    try:
+        quantum = np.ndarray((npairs,4),dtype=np.float64,buffer=shm_in.buf)
+        values = np.ndarray((npairs,),dtype=np.float64,buffer=shm_out.buf)
+        for i in range(start,stop):
+            n1,l1,n2,l2 = quantum[i]
+            values[i] = cached_radial_overlap(n1,int(l1),n2,int(l2),order,tol)
+    finally:
+        del quantum,values
+        shm_in.close()
+        shm_out.close()
+    return stop - start
+
+def compute_pairs(quantum,bounds,order=1.0,tol=None,workers=None):
+    """
+    numerov radial integrals of the rows (n1*,l1,n2*,l2) of quantum, one task per block.
+
+    Parameters
+    ----------
+    quantum: array
+        (pairs x 4) effective quantum numbers of each pair
+    bounds: list
+        (start,stop) of each block of rows
+    order: float
+        power of r in the integral
+    tol: float
+        adaptive numerov tolerance, None for the fixed step
+    workers: int
+        number of processes, defaults to the number of cpus. with 1 the blocks run
+        in this process. workers are spawned, so each imports rydprop afresh.
+    """
+    quantum = np.ascontiguousarray(quantum,dtype=np.float64)
+    npairs = len(quantum)
+    if npairs == 0:
+        return np.zeros(0)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError("workers must be at least 1, got " + str(workers))
+
+    shm_in = shared_memory.SharedMemory(create=True,size=quantum.nbytes)
+    shm_out = shared_memory.SharedMemory(create=True,size=quantum.nbytes//4)
+    try:
+        np.ndarray(quantum.shape,dtype=np.float64,buffer=shm_in.buf)[:] = quantum
+        args = [(shm_in.name,shm_out.name,npairs,start,stop,order,tol) for start,stop in bounds]
+        if workers == 1 or len(bounds) == 1:
+            for arg in args:
+                _compute_block(*arg)
+        else:
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=min(workers,len(bounds)),mp_context=context) as pool:
+                #largest blocks first so no worker is left with a long one at the end
+                queue = sorted(range(len(args)),key=lambda i: args[i][3] - args[i][4])
+                futures = [pool.submit(_compute_block,*args[i]) for i in queue]
+                for future in futures:
+                    future.result()
+        values = np.ndarray((npairs,),dtype=np.float64,buffer=shm_out.buf).copy()
+    finally:
+        shm_in.close()
+        shm_in.unlink()
+        shm_out.close()
+        shm_out.unlink()
+    return values
@@ -0,0 +1,296 @@
+"""
+Batch evaluation of radial integrals. Every wavefunction in a set of states is integrated
+once on a single logarithmic grid r_i = rmax*exp(-i*step), so that all the integrals
+<n l| r^p |n' l'> between two values of l are one weighted matrix product instead of a
+wf_align and sum for every pair. rmax is fixed by grid_nmax rather than by the largest n*
+of the states, so the wavefunction of a state, and every integral, does not depend on
+which other states are on the grid, and wavefunctions are shared through the numerov cache.
+"""
+import numpy as np
+from numba import jit
+from concurrent.futures import ThreadPoolExecutor
+from .numerov import wf_cache
+
+#every grid is aligned on this nmax. a wavefunction starts at the first grid point inside its
+#own 2n*(n*+15), as wf does for n* < nmax, so only the phase of the grid is fixed by it
+grid_nmax = 4096.0
+
+def thread_map(function,items,workers=None):
+    """
+    function applied to each of items, in order, by a pool of workers threads. the numerov
+    integrators and numpy's matrix products release the GIL, so their threads run at once.
+    with workers None or 1 the items are done in this thread.
+    """
+    items = list(items)
+    if workers is None:
+        workers = 1
+    if workers < 1:
+        raise ValueError("workers must be at least 1, got " + str(workers))
+    if workers == 1 or len(items) < 2:
+        return [function(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(workers,len(items))) as pool:
+        return list(pool.map(function,items))
+
+@jit(nopython=True, nogil=True, cache=True)
+def _pair_integrals(stack1, stack2, extents1, extents2, weight, i1, i2):
+    """
+    sum of stack1[i1[k]] * weight * stack2[i2[k]] for each k, over the points where both
+    wavefunctions are non-zero, given by the (start, stop) extents of each row.
+    """
+    values = np.empty(len(i1))
+    for k in range(len(i1)):
+        a = i1[k]
+        b = i2[k]
+        total = 0.0
+        for m in range(max(extents1[a, 0], extents2[b, 0]), min(extents1[a, 1], extents2[b, 1])):
+            total += stack1[a, m] * weight[m] * stack2[b, m]
+        values[k] = total
+    return values
+
+class Radial_grid:
+    def __init__(self,neffs,ls,step=0.005,rmin=0.65,tol=None):
+        """
+        stacks the numerov wavefunctions of a set of states, per l, into dense
+        (states x grid) arrays sharing one global grid. Wavefunctions are integrated
+        the first time an l is needed.
+
+        Parameters
+        ----------
+        neffs: array
+            effective principal quantum numbers n* of the states
+        ls: array
+            orbital angular momentum of the states, same length as neffs
+        step: float
+            logarithmic step of the numerov grid
+        rmin: float
+            inner limit of the numerov integration
+        tol: float
+            if given, integrate with the adaptive-step numerov to this tolerance
+        """
+        neffs = np.asarray(neffs,dtype=float)
+        ls = np.asarray(ls,dtype=int)
+        if neffs.shape != ls.shape:
+            raise ValueError("neffs and ls must be the same length")
+
+        self.step = step
+        self.rmin = rmin
+        self.tol = tol
+        self.nmax = grid_nmax
+        self.rmax = 2 * self.nmax * (self.nmax + 15)
+
+        #each distinct (n*,l) is only integrated once, index maps the inputs onto them
+        self.keys = []
+        lookup = {}
+        self.index = np.empty(len(neffs),dtype=int)
+        for i,key in enumerate(zip(neffs.tolist(),ls.tolist())):
+            if key not in lookup:
+                lookup[key] = len(self.keys)
+                self.keys.append(key)
+            self.index[i] = lookup[key]
+
+        self.neffs = np.array([k[0] for k in self.keys])
+        self.ls = np.array([k[1] for k in self.keys],dtype=int)
+
+        #the grid starts at the first point of the largest state. fixed step wavefunctions stop
+        #at the first point past rmin, adaptive ones keep only points of the same grid and
+        #stop within a base step of it, so the grid never needs to grow
+        largest = float(np.max(neffs))
+        first = int(np.ceil(np.log(self.rmax/(2 * largest * (largest + 15)))/step))
+        last = int(np.ceil(np.log(self.rmax/rmin)/step)) + 3
+        self.r = self.rmax * np.exp(-np.arange(first,last+1)*step)
+        self._stacks = {}
+        self._extents = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _integrate(self,rows,stack,extents):
+        """
+        integrates the wavefunctions of the given rows and places them in the matching rows of
+        stack, on the global grid, with the range of grid points each covers in extents. the
+        wavefunctions come from the numerov cache, so are only integrated once per session.
+        """
+        for i,row in enumerate(rows):
+            r,y = wf_cache.get(self.neffs[row],self.ls[row],self.nmax,self.step,self.rmin,self.tol)
+            offset = int(round(np.log(self.r[0]/r[0])/self.step))
+            stack[i,offset:offset+len(y)] = y
+            extents[i] = (offset,offset+len(y))
+
+    def integrate(self,ls=None,workers=None):
+        """
+        integrates the wavefunctions of every l in ls, all of them if not given, that are not yet
+        stacked. with workers the rows of each l are shared between that many threads.
+        """
+        if ls is None:
+            ls = np.unique(self.ls)
+        tasks = []
+        for l in ls:
+            if l in self._stacks:
+                continue
+            rows = np.flatnonzero(self.ls == l)
+            stack = np.zeros((len(rows),len(self.r)))
+            extents = np.zeros((len(rows),2),dtype=np.int64)
+            self._stacks[l] = (rows,stack)
+            self._extents[l] = extents
+            if len(rows) == 0:
+                continue
+            for part in np.array_split(np.arange(len(rows)),min(len(rows),workers or 1)):
+                tasks.append((rows[part],stack[part[0]:part[-1]+1],extents[part[0]:part[-1]+1]))
+        thread_map(lambda task: self._integrate(*task),tasks,workers)
+
+    def stack(self,l):
+        """
+        returns the rows (indices into keys) with orbital angular momentum l and the dense
+        array of their wavefunctions on the global grid.
+        """
+        if l not in self._stacks:
+            self.integrate([l])
+        return self._stacks[l]
+
+    def block(self,l1,l2,p=1.0):
+        """
+        all radial integrals <n* l1| r^p |n*' l2> in atomic units, as a single weighted
+        matrix product. returns the rows of l1, the rows of l2 and the (rows1 x rows2) block.
+        """
+        rows1,rows2,values = self.block_moments(l1,l2,[p])
+        return rows1,rows2,values[0]
+
+    def block_moments(self,l1,l2,powers):
+        """
+        as block, for several powers of r at once. the weighted l1 stacks of every power are
+        concatenated so all the moments come from one matrix product. returns the rows of l1,
+        the rows of l2 and a (powers x rows1 x rows2) array.
+        """
+        rows1,stack1 = self.stack(l1)
+        rows2,stack2 = self.stack(l2)
+        weighted = np.concatenate([stack1 * self.r**(2.0 + p) for p in powers])
+        values = weighted @ stack2.T
+        return rows1,rows2,values.reshape(len(powers),len(rows1),len(rows2))
+
+    def pairs(self,rows1,rows2,p=1.0,workers=None):
+        """
+        radial integrals <n* l1| r^p |n*' l2> in atomic units of the pairs of rows (rows1[k],rows2[k]),
+        indices into keys, where every row of rows1 has one l and every row of rows2 another. when
+        the pairs fill at least half of the block between their distinct rows they are gathered from
+        one matrix product, otherwise each pair is summed on its own, so a few pairs against many
+        states cost only those pairs. with workers the pairs are shared between that many threads.
+        """
+        rows1 = np.asarray(rows1,dtype=np.int64)
+        rows2 = np.asarray(rows2,dtype=np.int64)
+        if len(rows1) == 0:
+            return np.zeros(0)
+        l1,l2 = int(self.ls[rows1[0]]),int(self.ls[rows2[0]])
+        if np.any(self.ls[rows1] != l1) or np.any(self.ls[rows2] != l2):
+            raise ValueError("rows1 and rows2 must each have a single l")
+        self.integrate([l1,l2],workers)
+        stack_rows1,stack1 = self._stacks[l1]
+        stack_rows2,stack2 = self._stacks[l2]
+        #positions of the rows in their stacks
+        i1 = np.searchsorted(stack_rows1,rows1)
+        i2 = np.searchsorted(stack_rows2,rows2)
+
+        distinct1,inverse1 = np.unique(i1,return_inverse=True)
+        distinct2,inverse2 = np.unique(i2,return_inverse=True)
+        if 2 * len(rows1) >= len(distinct1) * len(distinct2):
+            block = (stack1[distinct1] * self.r**(2.0 + p)) @ stack2[distinct2].T
+            return block[inverse1.reshape(-1),inverse2.reshape(-1)]
+
+        weight = self.r**(2.0 + p)
+        extents1 = self._extents[l1]
+        extents2 = self._extents[l2]
+        parts = np.array_split(np.arange(len(i1)),min(len(i1),workers or 1))
+        values = thread_map(lambda part: _pair_integrals(stack1,stack2,extents1,extents2,weight,i1[part],i2[part]),parts,workers)
+        return np.concatenate(values)
+
+    def matrix(self,p=1.0,dl=1):
+        """
+        Radial_table of the radial integrals between every pair of distinct states whose l
+        differs by dl. other entries are zero.
+        """
+        return self.moments([p],dl)[0]
+
+    def moments(self,powers,dl=1):
+        """
+        list of Radial_tables of the radial integrals between every pair of distinct states whose
+        l differs by dl, one for each power. only the l blocks are stored.
+        """
+        blocks = [{} for p in powers]
+        for l in np.unique(self.ls):
+            if l + dl not in self.ls:
+                continue
+            rows1,rows2,values = self.block_moments(l,l+dl,powers)
+            for k in range(len(powers)):
+                blocks[k][int(l)] = values[k]
+        return [Radial_table(self.ls,block,dl) for block in blocks]
+
+class Radial_table:
+    def __init__(self,ls,blocks,dl=1):
+        """
+        radial integrals between the rows of a Radial_grid whose l differs by dl, kept as one dense
+        block per pair of l, so the memory grows with the number of non-zero entries rather than
+        the square of the number of rows. indexed as the dense (rows x rows) array, table[i,j] with
+        i and j scalars or arrays, giving zero between rows whose l does not differ by dl.
+
+        Parameters
+        ----------
+        ls: array
+            orbital angular momentum of each row
+        blocks: dict
+            blocks[l] the (rows with l x rows with l + dl) array of integrals, the rows of each l in
+            the order they appear in ls
+        dl: int
+            difference in l of the pairs
+        """
+        self.ls = np.asarray(ls,dtype=np.int64)
+        self.blocks = blocks
+        self.dl = dl
+        #position of each row among the rows of its l, the index into the blocks
+        self.positions = np.zeros(len(self.ls),dtype=np.int64)
+        for l in np.unique(self.ls):
+            rows = np.flatnonzero(self.ls == l)
+            self.positions[rows] = np.arange(len(rows))
+        for l,block in blocks.items():
+            shape = (np.count_nonzero(self.ls == l),np.count_nonzero(self.ls == l + dl))
+            if block.shape != shape:
+                raise ValueError("the block of l = " + str(l) + " must have shape " + str(shape) + ", got " + str(block.shape))
+
+    @property
+    def shape(self):
+        return (len(self.ls),len(self.ls))
+
+    @property
+    def nbytes(self):
+        """
+        bytes held by the blocks.
+        """
+        return sum(block.nbytes for block in self.blocks.values())
+
+    def __getitem__(self,key):
+        rows1,rows2 = np.broadcast_arrays(*[np.asarray(k,dtype=np.int64) for k in key])
+        ls1 = self.ls[rows1]
+        ls2 = self.ls[rows2]
+        values = np.zeros(rows1.shape)
+        for l,block in self.blocks.items():
+            forward = (ls1 == l) & (ls2 == l + self.dl)
+            values[forward] = block[self.positions[rows1[forward]],self.positions[rows2[forward]]]
+            if self.dl != 0:
+                backward = (ls1 == l + self.dl) & (ls2 == l)
+                values[backward] = block[self.positions[rows2[backward]],self.positions[rows1[backward]]]
+        if values.ndim == 0:
+            return float(values)
+        return values
+
+    def toarray(self):
+        """
+        the dense (rows x rows) array.
+        """
+        rows = np.arange(len(self.ls))
+        return self[rows[:,None],rows[None,:]]
+
+    def __mul__(self,other):
+        if not np.isscalar(other):
+            raise TypeError("radial tables can only be scaled by numbers")
+        return Radial_table(self.ls,{l:block * other for l,block in self.blocks.items()},self.dl)
+
+    def __rmul__(self,other):
+        return self.__mul__(other)
@@ -1,39 +1,267 @@
-from .state import State_nlm
+from .state import State_nlm,basis_dtypes,basis_options
 from scipy.sparse import coo_matrix,csr_matrix,diags
 import numpy as np
+import os
+import json
+
+def pack_states(numbers):
+    """
+    packs a structured array of quantum numbers into int64 keys, 16 bits per quantum number with the
+    half integer ones doubled first.
+    """
+    key = np.zeros(numbers.shape,dtype=np.int64)
+    for name in numbers.dtype.names:
+        column = numbers[name]
+        if column.dtype.kind == 'f':
+            column = np.round(column*2)
+        key = (key << 16) | (column.astype(np.int64) & 0xffff)
+    return key
+
+def _pack_numbers(numbers,dtype):
+    """
+    pack_states for the quantum_numbers tuple of a single state.
+    """
+    key = 0
+    for value,name in zip(numbers,dtype.names):
+        if dtype[name].kind == 'f':
+            value = round(value*2)
+        key = (key << 16) | (int(value) & 0xffff)
+    return key
+
+def _range(values,default):
+    if values is None:
+        return default
+    if np.isscalar(values):
+        return (int(values),int(values))
+    low,high = values
+    return (int(low),int(high))
+
+def _nlm_grid(n,l=None,ml=None):
+    """
+    structured array of the |n,l,ml> quantum numbers in the ranges of Space.from_ranges.
+    """
+    nmin,nmax = _range(n,None)
+    lmin,lmax = _range(l,(0,nmax))
+    mlmin,mlmax = _range(ml,(-nmax,nmax))
+
+    ns,ls = np.meshgrid(np.arange(nmin,nmax+1),np.arange(max(lmin,0),lmax+1),indexing='ij')
+    keep = (ls < ns) & (ns > 0)
+    ns,ls = ns[keep],ls[keep]
+    low = np.maximum(mlmin,-ls)
+    counts = np.maximum(np.minimum(mlmax,ls) - low + 1,0)
+
+    numbers = np.zeros(counts.sum(),dtype=basis_dtypes[State_nlm])
+    numbers['n'] = np.repeat(ns,counts)
+    numbers['l'] = np.repeat(ls,counts)
+    #position of each state within its (n,l) group
+    starts = np.repeat(np.cumsum(counts) - counts,counts)
+    numbers['ml'] = np.repeat(low,counts) + np.arange(len(numbers)) - starts
+    return numbers
+
+def _json_keys(value):
+    if isinstance(value,dict):
+        return {str(k):_json_keys(v) for k,v in value.items()}
+    return value
+
+def _python_keys(value):
+    if isinstance(value,dict):
+        return {(int(k) if k.lstrip('-').isdigit() else float(k)):_python_keys(v) for k,v in value.items()}
+    return value
+
+def _atom_parameters(atom,basis):
+    """
+    the arguments of RydbergAtom which rebuild atom, in a form json can write.
+    """
+    from .atom import m_atomic
+    return dict({'mass':atom.mass/m_atomic,'defects':_json_keys(atom.defects),'basis':basis,
+                 'additional_states':_json_keys(atom.additional_states),'radial_backend':atom.radial_backend,
+                 'defect_tol':atom.defect_tol,'numerov_tol':atom.numerov_tol,
+                 'element_cache_size':atom.element_cache.max_entries})
+
+def _atom_arguments(parameters):
+    arguments = dict(parameters)
+    arguments['defects'] = _python_keys(arguments['defects'])
+    arguments['additional_states'] = _python_keys(arguments['additional_states'])
+    return arguments
+
+def _h0_builder(space,start):
+    energies = space.atom.energies(space.array['n'][start:],space.array['l'][start:])
+    indices = np.arange(start,len(space))
+    return coo_matrix((energies,(indices,indices)),shape=(len(space),len(space)))
+
+class State_views:
+    def __init__(self,space):
+        """
+        read-only sequence of the states of a Space, creating each state object when it is accessed.
+        """
+        self._space = space
+
+    def __len__(self):
+        return len(self._space)
+
+    def __getitem__(self,key):
+        space = self._space
+        if isinstance(key,slice):
+            return [space.basis_type._view(*numbers) for numbers in space.array[key].tolist()]
+        if key < -len(space) or key >= len(space):
+            raise IndexError("Index "+str(key) +" could not be found in space of dimension " + str(len(space)))
+        return space.basis_type._view(*space.array[key].tolist())
+
+    def __iter__(self):
+        view = self._space.basis_type._view
+        for numbers in self._space.array.tolist():
+            yield view(*numbers)
+
+    def __contains__(self,state):
+        return self._space.index(state) is not None
+
+    def index(self,state):
+        index = self._space.index(state)
+        if index is None:
+            raise ValueError(str(state) + " is not in the space")
+        return index
 
 class Space:
     def __init__(self,atom):
         """
-        wrapper around a python list for use with state objects. A list which can only hold single
-        type of object. Index returns an index if found and None otherwise. Can only add a single
-        instance of a state to the space, ie n=10,l=0,ml=0 can only be added once. 
+        container for state objects of a single type, the basis of the atom. Index returns an index if
+        found and None otherwise. Can only add a single instance of a state to the space, ie n=10,l=0,ml=0
+        can only be added once. The quantum numbers are held in a numpy structured array, see array,
+        and state objects are only created when asked for, through indexing, iteration or states.
+        states are found through a dictionary from their packed quantum numbers to their index.
         """
         self.atom = atom
         self.basis_type = self.atom.basis
-        self.states = []
+        self.dtype = basis_dtypes[self.basis_type]
+        self._data = np.zeros(16,dtype=self.dtype)
+        self._size = 0
+        self._lookup = {}
+        #reads the quantum numbers as they are when accessed, so stays valid as states are appended
+        self._states = State_views(self)
+        #matrices built for this space, with the number of states they cover
+        self._matrices = {}
         
+    @classmethod
+    def from_array(cls,atom,numbers):
+        """
+        builds a space in one allocation from a structured array of quantum numbers with the fields of
+        the basis of the atom, see basis_dtypes.
+        """
+        space = cls(atom)
+        numbers = np.asarray(numbers)
+        if numbers.dtype.names != space.dtype.names:
+            raise TypeError("quantum numbers must have the fields " + str(space.dtype.names) + ", got " + str(numbers.dtype.names))
+        numbers = numbers.astype(space.dtype)
+        keys = pack_states(numbers)
+        if len(np.unique(keys)) != len(keys):
+            raise ValueError("Cannot add duplicate states to space.")
+        space._data = numbers.copy()
+        space._size = len(numbers)
+        space._lookup = dict(zip(keys.tolist(),range(len(keys))))
+        return space
+
+    @classmethod
+    def from_ranges(cls,atom,n,l=None,ml=None):
+        """
+        the space of every |n,l,ml> state with quantum numbers in the given ranges, generated without
+        building any state objects. states are ordered by n, then l, then ml.
+
+        Parameters
+        ----------
+        atom: RydbergAtom
+            atom with the nlm basis
+        n: tuple
+            (nmin,nmax), inclusive, or a single n
+        l: tuple
+            (lmin,lmax), inclusive, or a single l. all l < n if not given
+        ml: tuple
+            (mlmin,mlmax), inclusive, or a single ml. all |ml| <= l if not given
+        """
+        if atom.basis != State_nlm:
+            raise TypeError("from_ranges builds spaces in the nlm basis, atom has basis " + str(atom.basis))
+        return cls.from_array(atom,_nlm_grid(n,l,ml))
+
+    @classmethod
+    def from_energy_window(cls,atom,Emin,Emax,l=None,ml=None):
+        """
+        the space of every |n,l,ml> state whose energy, RydbergAtom.energy, lies between Emin and Emax.
+
+        Parameters
+        ----------
+        atom: RydbergAtom
+            atom with the nlm basis
+        Emin,Emax: float
+            the energy window in units of H'_e, both below the ionisation limit
+        l: tuple
+            (lmin,lmax), inclusive, or a single l. all l < n if not given
+        ml: tuple
+            (mlmin,mlmax), inclusive, or a single ml. all |ml| <= l if not given
+        """
+        if not Emin < Emax < 0:
+            raise ValueError("energy window must satisfy Emin < Emax < 0, got " + str((Emin,Emax)))
+        #every state in the window has n* between these. n = n* + defect, with defects of either sign,
+        #so the range of n is widened until, for each l, the full Ritz defects put n* outside the
+        #window at both ends. n* increases with n for each l, so no state beyond them is in it
+        nsmin = np.sqrt(-atom.scalefactor/(2*Emin))
+        nsmax = np.sqrt(-atom.scalefactor/(2*Emax))
+        margin = int(np.ceil(np.abs(atom.defect_coeffs[:,0]).max())) + 1
+        while True:
+            nmin = max(1,int(np.floor(nsmin)) - margin)
+            nmax = int(np.ceil(nsmax)) + margin
+            numbers = _nlm_grid((nmin,nmax),l,ml)
+            neffs = atom.n_effs(numbers)
+            #states at nmin with a lower n of the same l below them, and the states at nmax
+            lower = (numbers['n'] == nmin) & (numbers['l'] < nmin - 1)
+            upper = numbers['n'] == nmax
+            if np.all(neffs[lower] < nsmin) and np.all(neffs[upper] > nsmax):
+                break
+            if margin > 1024:
+                raise ValueError("could not bound the n of the energy window " + str((Emin,Emax)))
+            margin = 2 * margin
+        energies = atom.energies(numbers)
+        return cls.from_array(atom,numbers[(energies >= Emin) & (energies <= Emax)])
+
     def __len__(self):
-        return len(self.states)
-    
+        return self._size
+
+    @property
+    def array(self):
+        """
+        read-only structured array of the quantum numbers of the states, one field per quantum number,
+        so that space.array['l'] is the l of every state.
+        """
+        array = self._data[:self._size]
+        array.flags.writeable = False
+        return array
+
+    @property
+    def states(self):
+        """
+        sequence of the states in the space.
+        """
+        return self._states
     
     def __getitem__(self,key):
-        try:
-            return self.states[key]
-        except:
-            raise IndexError("Index "+str(key) +" could not be found in space of dimension" + len(self))
+        return self.states[key]
             
     def __iter__(self):
         return self.states.__iter__()
     
     def append(self,state):
         """
-        try to add to list, checks that the 
+        add a state to the end of the space, the state must be of the basis of the atom and not
+        already in the space.
         """
 
         if type(state) == self.basis_type:
-            if self.index(state) == None:
-                self.states.append(state)
+            numbers = state.quantum_numbers
+            key = _pack_numbers(numbers,self.dtype)
+            if key not in self._lookup:
+                if self._size == len(self._data):
+                    self._data = np.concatenate((self._data,np.zeros(len(self._data),dtype=self.dtype)))
+                self._data[self._size] = numbers
+                self._lookup[key] = self._size
+                self._size += 1
             else:
                 raise ValueError("Cannot add duplicate states to space.")
         else:
@@ -41,23 +269,154 @@ class Space:
         
     def index(self,test_state):
         """
-        locate the index of a state in the list. loops through the states and checks if the state has a match
+        locate the index of a state in the list. returns None if the state is not in the space.
         """
-        try:
-            return self.states.index(test_state)
-        except:
+        if type(test_state) != self.basis_type:
             return None
+        return self._lookup.get(_pack_numbers(test_state.quantum_numbers,self.dtype))
+
+    def __contains__(self,test_state):
+        return self.index(test_state) is not None
         
-    def H0(self):
+    def blocks(self,symmetry='ml'):
         """
-        returns the field-free hamiltonian for the space.
+        splits the space into the sub-spaces of states sharing the quantum numbers of a symmetry.
+
+        Parameters
+        ----------
+        symmetry: string or list
+            one of block_symmetries, or a list of them to split by all at once
+            'ml' - states of equal ml, conserved by parallel electric and magnetic fields
+            'parity' - states of equal (-1)^l, conserved by magnetic fields
+
+        Returns
+        -------
+        list of Space, in order of the symmetry labels. each has parent_index, the indices of its
+        states in this space, and label, a dictionary of the shared quantum numbers.
         """
-        energies = []
-        for state in self.states:
-            energies.append(self.atom.energy(state))
-        
-        return diags(energies,format='coo')
+        names = [symmetry] if isinstance(symmetry,str) else list(symmetry)
+        for name in names:
+            if name not in block_symmetries:
+                raise KeyError("couldnt find the symmetry asked for. Options are " + str(block_symmetries))
+        columns = [block_symmetries[name](self.array) for name in names]
+        labels,inverse = np.unique(np.stack(columns,axis=1),axis=0,return_inverse=True)
+        inverse = inverse.reshape(-1)
 
-            
-            
-            
\ No newline at end of file
+        #a stable sort keeps the order of the parent within each block
+        order = np.argsort(inverse,kind='stable')
+        bounds = np.searchsorted(inverse[order],np.arange(len(labels)+1))
+        blocks = []
+        for i,label in enumerate(labels.tolist()):
+            parent_index = order[bounds[i]:bounds[i+1]]
+            block = Space.from_array(self.atom,self.array[parent_index])
+            block.parent_index = parent_index
+            block.label = dict(zip(names,label))
+            blocks.append(block)
+        return blocks
+
+    def cached_matrix(self,key,builder):
+        """
+        returns the csr matrix stored under key, building it the first time with builder(space,0). when
+        states have been appended since, only their rows and columns are built, by builder(space,start)
+        with start the number of states the stored matrix covers, and added to it.
+
+        Parameters
+        ----------
+        key: hashable
+            name of the matrix, such as ('elec',True)
+        builder: function
+            builder(space,start) returns a sparse matrix of the size of the space holding the elements
+            in the rows and columns of the states from start onwards
+        """
+        cached = self._matrices.get(key)
+        if cached is not None and cached[0] == len(self):
+            #matrices memory-mapped by load are read-only, so are handed out without a copy
+            return cached[1] if not cached[1].data.flags.writeable else cached[1].copy()
+        if cached is None:
+            matrix = csr_matrix(builder(self,0))
+        else:
+            size,old = cached
+            old = csr_matrix(old,copy=True)
+            old.resize((len(self),len(self)))
+            matrix = csr_matrix(old + builder(self,size))
+        self._matrices[key] = (len(self),matrix)
+        return matrix.copy()
+
+    def save(self,path):
+        """
+        writes the space, the parameters of its atom and every matrix built for it (H0 and the
+        interactions) to the directory path. the quantum numbers and the data, indices and indptr
+        of each matrix in csr form are separate .npy files, so load can memory-map them.
+        """
+        os.makedirs(path,exist_ok=True)
+        np.save(os.path.join(path,'states.npy'),self.array)
+        matrices = {}
+        for i,(key,(size,matrix)) in enumerate(self._matrices.items()):
+            matrix = csr_matrix(matrix)
+            matrix.sort_indices()
+            name = 'matrix_{:03d}'.format(i)
+            for part in ('data','indices','indptr'):
+                np.save(os.path.join(path,name + '_' + part + '.npy'),getattr(matrix,part))
+            matrices[name] = dict({'key':key,'size':size,'shape':list(matrix.shape)})
+
+        basis = [name for name,basis_type in basis_options.items() if basis_type == self.basis_type][0]
+        description = dict({'atom':_atom_parameters(self.atom,basis),'matrices':matrices})
+        with open(os.path.join(path,'space.json'),'w') as f:
+            json.dump(description,f,indent=1)
+
+    @classmethod
+    def load(cls,path,mmap=True,atom=None):
+        """
+        reads a space written by save. with mmap the quantum numbers and matrices are memory-mapped
+        read-only, so processes loading the same path share one copy of the hamiltonian.
+
+        Parameters
+        ----------
+        path: string
+            directory written by save
+        mmap: bool
+            memory-map the arrays rather than reading them
+        atom: RydbergAtom
+            atom to attach to the space, rebuilt from the saved parameters if not given
+        """
+        with open(os.path.join(path,'space.json')) as f:
+            description = json.load(f)
+        if atom is None:
+            from .atom import RydbergAtom
+            atom = RydbergAtom(**_atom_arguments(description['atom']))
+        mode = 'r' if mmap else None
+
+        space = cls(atom)
+        numbers = np.load(os.path.join(path,'states.npy'),mmap_mode=mode)
+        keys = pack_states(numbers)
+        space._data = numbers
+        space._size = len(numbers)
+        space._lookup = dict(zip(keys.tolist(),range(len(keys))))
+        for name,matrix in description['matrices'].items():
+            parts = [np.load(os.path.join(path,name + '_' + part + '.npy'),mmap_mode=mode) for part in ('data','indices','indptr')]
+            key = matrix['key'] if isinstance(matrix['key'],str) else tuple(matrix['key'])
+            space._matrices[key] = (matrix['size'],csr_matrix(tuple(parts),shape=tuple(matrix['shape']),copy=False))
+        return space
+
+    def clear_matrices(self):
+        """
+        forget the matrices built for this space.
+        """
+        self._matrices.clear()
+
+    def H0(self,symmetry=None):
+        """
+        returns the field-free hamiltonian for the space. with a symmetry returns a list of the
+        hamiltonians of each of blocks(symmetry) instead. the diagonal is kept and only the energies
+        of states appended since the last call are computed.
+        """
+        h0 = self.cached_matrix('H0',_h0_builder)
+        if symmetry is not None:
+            energies = h0.diagonal()
+            return [diags(energies[block.parent_index],format='csr') for block in self.blocks(symmetry)]
+        return h0
+
+
+#functions returning the quantum number of each state which labels its block
+block_symmetries = dict({'ml':lambda array: array['ml'],
+                         'parity':lambda array: (-1)**(array['l'] % 2)})
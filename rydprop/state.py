@@ -1,23 +1,45 @@
-from numba import jit
+import numpy as np
 default_basis = 'nlm'
 
 class State_nlm:
-    @jit
+    __slots__ = ('_n','_l','_ml')
+
     def __init__(self,n,l,ml):
         """
-        class which holds quantum numbers in the |n,l,ml> basis.
+        class which holds quantum numbers in the |n,l,ml> basis. states are immutable and hashable,
+        so can be used as dictionary keys.
         """
-        self._n = n
+        object.__setattr__(self,'_n',n)
         
         if l >= 0 and l < n:
-            self._l = l
+            object.__setattr__(self,'_l',l)
         else:
             raise ValueError("l must be between 0 and n. l provided l = " +str(l)+", provided n = "+str(n))
             
         if abs(ml) <= l:    
-            self._ml = ml
+            object.__setattr__(self,'_ml',ml)
         else:
             raise ValueError("ml must be between -l and l. provided ml = "+str(ml)+", provided l = " + str(l))
+
+    @classmethod
+    def _view(cls,n,l,ml):
+        """
+        builds a state without checking the quantum numbers, for those already held by a Space.
+        """
+        state = object.__new__(cls)
+        object.__setattr__(state,'_n',n)
+        object.__setattr__(state,'_l',l)
+        object.__setattr__(state,'_ml',ml)
+        return state
+
+    def __setattr__(self,name,value):
+        raise AttributeError("states are immutable, cannot set " + str(name))
+
+    def __delattr__(self,name):
+        raise AttributeError("states are immutable, cannot delete " + str(name))
+
+    def __reduce__(self):
+        return (type(self),self.__members())
             
     @property
     def n(self):
@@ -31,8 +53,18 @@ class State_nlm:
     def ml(self):
         return self._ml
     
+    @property
+    def quantum_numbers(self):
+        """
+        tuple of the quantum numbers (n,l,ml).
+        """
+        return self.__members()
+
     def __members(self):
         return (self._n,self._l,self._ml)
+
+    def __hash__(self):
+        return hash(self.__members())
         
     def __eq__(self,other_state):
         """
@@ -46,26 +78,50 @@ class State_nlm:
 
         
 class State_nlj:
+    __slots__ = ('_n','_l','_j','_mj')
+
     def __init__(self,n,l,j,mj):
         """
-        class which holds quantum numbers in the |n,l,ml> basis.
+        class which holds quantum numbers in the |n,l,j,mj> basis. states are immutable and hashable,
+        so can be used as dictionary keys.
         """
-        self._n = n
+        object.__setattr__(self,'_n',n)
         
         if l >= 0 and l < n:
-            self._l = l
+            object.__setattr__(self,'_l',l)
         else:
             raise ValueError("l must be between 0 and n. l provided l = " +str(l)+", provided n = "+str(n))
             
         if j in [l-0.5,l+0.5]:
-            self._j = j
+            object.__setattr__(self,'_j',j)
         else:
             raise ValueError("j must be either l-0.5 or l+0.5. provided j = "+str(j)+", provided l = " + str(l))
             
-        if abs(ml) <=j:
-            self._mj = mj
+        if abs(mj) <=j:
+            object.__setattr__(self,'_mj',mj)
         else:
             raise ValueError("mj must be between -j and j. provided j = "+str(j)+", provided mj = " + str(mj))
+
+    @classmethod
+    def _view(cls,n,l,j,mj):
+        """
+        builds a state without checking the quantum numbers, for those already held by a Space.
+        """
+        state = object.__new__(cls)
+        object.__setattr__(state,'_n',n)
+        object.__setattr__(state,'_l',l)
+        object.__setattr__(state,'_j',j)
+        object.__setattr__(state,'_mj',mj)
+        return state
+
+    def __setattr__(self,name,value):
+        raise AttributeError("states are immutable, cannot set " + str(name))
+
+    def __delattr__(self,name):
+        raise AttributeError("states are immutable, cannot delete " + str(name))
+
+    def __reduce__(self):
+        return (type(self),self.__members())
             
     @property
     def n(self):
@@ -83,8 +139,18 @@ class State_nlj:
     def mj(self):
         return self._mj
     
+    @property
+    def quantum_numbers(self):
+        """
+        tuple of the quantum numbers (n,l,j,mj).
+        """
+        return self.__members()
+
     def __members(self):
-        return (self._n,self._l,self._j,self.mj)
+        return (self._n,self._l,self._j,self._mj)
+
+    def __hash__(self):
+        return hash(self.__members())
         
     def __eq__(self,other_state):
         """
@@ -99,3 +165,7 @@ class State_nlj:
         
 basis_options = dict({'nlm':State_nlm,'nlj':State_nlj})
 
+#quantum numbers of each basis as stored by a Space, j and mj are half integers so exact as float32
+basis_dtypes = dict({State_nlm:np.dtype([('n','i2'),('l','i2'),('ml','i2')]),
+                     State_nlj:np.dtype([('n','i2'),('l','i2'),('j','f4'),('mj','f4')])})
+
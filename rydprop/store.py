@@ -0,0 +1,209 @@
+"""
+Persistent on-disk store of radial integrals <n l| r^p |n' l'>. One directory per atom,
+named by a hash of everything which changes the integrals (mass, defect table, radial
+backend and the numerov step, rmin and tolerance). Integrals are written in sorted, append-only
+.npy chunks which are memory-mapped on reading, so nothing is loaded until looked up and
+the store grows as new pairs are requested without rewriting what is already on disk.
+Integrals from each numerov grid are kept apart, see grids, and the chunks of a grid are
+merged once there are more than max_chunks of them.
+"""
+import os
+import glob
+import json
+import atexit
+import weakref
+import hashlib
+import numpy as np
+from .radial import grid_nmax
+
+default_directory = os.path.join(os.path.expanduser('~'),'.rydprop','radial')
+record_dtype = np.dtype([('key','<u8'),('value','<f8')])
+#numerov grids the integrals were computed on, which give values differing by about 1e-6
+#'pair' - the grid of the two states, nmax = max(n1*,n2*), as radial_overlap
+#'grid' - the shared grid of Radial_grid, aligned on grid_nmax
+grids = ('pair','grid')
+
+def atom_hash(atom,step=0.005,rmin=0.65):
+    """
+    hash identifying the radial integrals of an atom.
+    """
+    defects = {str(l):{str(j):list(map(float,coeffs)) for j,coeffs in js.items()} for l,js in atom.defects.items()}
+    description = dict({'mass':float(atom.mass),'defects':defects,'step':float(step),'rmin':float(rmin),
+                        'radial_backend':atom.radial_backend,'defect_tol':float(atom.defect_tol),
+                        'numerov_tol':atom.numerov_tol,'grid_nmax':grid_nmax})
+    text = json.dumps(description,sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16],description
+
+def pack_keys(n1,l1,n2,l2,p):
+    """
+    packs quantum numbers and power into a single uint64 key, 12 bits per quantum number and
+    16 bits for the power in steps of 1/16. the pair is ordered so <a|r^p|b> and <b|r^p|a>
+    share a key.
+    """
+    n1,l1,n2,l2 = [np.asarray(x,dtype=np.int64) for x in (n1,l1,n2,l2)]
+    p16 = np.asarray(np.round(np.asarray(p,dtype=float)*16),dtype=np.int64)
+    if np.any(np.abs(np.asarray(p,dtype=float)*16 - p16) > 1e-9):
+        raise ValueError("powers must be multiples of 1/16 to be stored")
+    if np.any((n1 >= 4096) | (n2 >= 4096) | (n1 < 0) | (n2 < 0) | (l1 < 0) | (l2 < 0)):
+        raise ValueError("quantum numbers must be between 0 and 4095 to be stored")
+    swap = (n1 > n2) | ((n1 == n2) & (l1 > l2))
+    a_n,a_l = np.where(swap,n2,n1),np.where(swap,l2,l1)
+    b_n,b_l = np.where(swap,n1,n2),np.where(swap,l1,l2)
+    key = (a_n.astype(np.uint64) << np.uint64(52)) | (a_l.astype(np.uint64) << np.uint64(40)) \
+        | (b_n.astype(np.uint64) << np.uint64(28)) | (b_l.astype(np.uint64) << np.uint64(16)) \
+        | (p16 + 32768).astype(np.uint64)
+    return key
+
+def _flush_at_exit(reference):
+    store = reference()
+    if store is not None:
+        store.flush()
+
+class Radial_store:
+    def __init__(self,atom,directory=None,step=0.005,rmin=0.65,chunk_size=100000,max_chunks=8):
+        """
+        store of the radial integrals of a single atom on disk.
+
+        Parameters
+        ----------
+        atom: RydbergAtom
+            the atom whose integrals are stored
+        directory: string
+            parent directory of the per-atom stores, default ~/.rydprop/radial
+        step,rmin: float
+            numerov parameters the integrals were computed with
+        chunk_size: int
+            number of pending integrals held in memory before they are written out. anything
+            still pending is written when the interpreter exits.
+        max_chunks: int
+            number of chunks of a grid above which flush merges them into one
+        """
+        if directory is None:
+            directory = default_directory
+        self.key,description = atom_hash(atom,step,rmin)
+        self.path = os.path.join(directory,self.key)
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        os.makedirs(self.path,exist_ok=True)
+
+        meta_path = os.path.join(self.path,'meta.json')
+        if not os.path.exists(meta_path):
+            with open(meta_path,'w') as f:
+                json.dump(description,f,sort_keys=True,indent=1)
+
+        self._chunks = {grid:[np.load(name,mmap_mode='r') for name in self._names(grid)] for grid in grids}
+        self._pending = {grid:{} for grid in grids}
+        atexit.register(_flush_at_exit,weakref.ref(self))
+
+    def __len__(self):
+        return sum([len(chunk) for chunks in self._chunks.values() for chunk in chunks]) \
+            + sum([len(pending) for pending in self._pending.values()])
+
+    def _names(self,grid):
+        return sorted(glob.glob(os.path.join(self.path,'chunk_' + grid + '_*.npy')))
+
+    def _check_grid(self,grid):
+        if grid not in grids:
+            raise KeyError("couldnt find the grid asked for. Options are " + str(grids))
+
+    def lookup(self,n1,l1,n2,l2,p=1.0,grid='pair'):
+        """
+        vectorised lookup of integrals computed on grid. returns an array of values, nan where
+        the integral has not been stored.
+        """
+        self._check_grid(grid)
+        keys = np.atleast_1d(pack_keys(n1,l1,n2,l2,p))
+        values = np.full(keys.shape,np.nan)
+        for chunk in self._chunks[grid]:
+            idx = np.searchsorted(chunk['key'],keys)
+            idx[idx == len(chunk)] = 0
+            found = chunk['key'][idx] == keys
+            values[found] = chunk['value'][idx[found]]
+        pending = self._pending[grid]
+        if len(pending) > 0:
+            for i,k in enumerate(keys.tolist()):
+                if k in pending:
+                    values[i] = pending[k]
+        return values
+
+    def get(self,n1,l1,n2,l2,p=1.0,grid='pair'):
+        """
+        single integral, or None if it has not been stored.
+        """
+        value = self.lookup(n1,l1,n2,l2,p,grid)[0]
+        if np.isnan(value):
+            return None
+        return float(value)
+
+    def add(self,n1,l1,n2,l2,p,values,grid='pair'):
+        """
+        adds integrals computed on grid, scalars or arrays, to the store. written to disk once
+        chunk_size are pending or on flush.
+        """
+        self._check_grid(grid)
+        keys = np.atleast_1d(pack_keys(n1,l1,n2,l2,p))
+        values = np.broadcast_to(np.asarray(values,dtype=float),keys.shape)
+        self._pending[grid].update(zip(keys.tolist(),values.tolist()))
+        if sum([len(pending) for pending in self._pending.values()]) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """
+        writes the pending integrals of each grid as a new sorted chunk, merging the chunks of
+        a grid once there are more than max_chunks.
+        """
+        for grid,pending in self._pending.items():
+            if len(pending) == 0:
+                continue
+            records = np.empty(len(pending),dtype=record_dtype)
+            records['key'] = np.fromiter(pending.keys(),dtype=np.uint64,count=len(pending))
+            records['value'] = np.fromiter(pending.values(),dtype=float,count=len(pending))
+            records.sort(order='key')
+
+            name = self._chunk_name(grid)
+            tmp_name = name + '.tmp'
+            with open(tmp_name,'wb') as f:
+                np.save(f,records)
+            os.replace(tmp_name,name)
+            self._chunks[grid].append(np.load(name,mmap_mode='r'))
+            self._pending[grid] = {}
+            if len(self._chunks[grid]) > self.max_chunks:
+                self._compact(grid)
+
+    def compact(self):
+        """
+        merges every chunk of each grid into one, keeping the most recent value of duplicated keys.
+        """
+        self.flush()
+        for grid in grids:
+            self._compact(grid)
+
+    def _compact(self,grid):
+        if len(self._chunks[grid]) < 2:
+            return
+        records = np.concatenate([np.asarray(chunk) for chunk in self._chunks[grid][::-1]])
+        keys,first = np.unique(records['key'],return_index=True)
+        records = records[first]
+        old_names = self._names(grid)
+        name = self._chunk_name(grid)
+        with open(name + '.tmp','wb') as f:
+            np.save(f,records)
+        os.replace(name + '.tmp',name)
+        self._chunks[grid] = [np.load(name,mmap_mode='r')]
+        for old in old_names:
+            os.remove(old)
+
+    def clear(self):
+        """
+        deletes every stored integral of this atom.
+        """
+        for grid in grids:
+            self._pending[grid] = {}
+            self._chunks[grid] = []
+            for old in self._names(grid):
+                os.remove(old)
+
+    def _chunk_name(self,grid):
+        names = self._names(grid)
+        number = 0 if len(names) == 0 else max([int(os.path.basename(name)[-9:-4]) for name in names]) + 1
+        return os.path.join(self.path,'chunk_' + grid + '_{:05d}.npy'.format(number))
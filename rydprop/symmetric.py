@@ -0,0 +1,109 @@
+"""
+Real symmetric matrices held as their upper triangle only. The interaction matrices are
+symmetric, so keeping both triangles doubles their memory for no information. The product
+with a vector is the upper triangle, its transpose and the diagonal, all sparse products on
+the one csr array, so nothing is expanded.
+"""
+import numpy as np
+from scipy.sparse import csr_matrix,coo_matrix,triu,isspmatrix
+from scipy.sparse.linalg import LinearOperator
+
+class Symmetric_matrix(LinearOperator):
+    def __init__(self,upper):
+        """
+        a real symmetric matrix from its upper triangle, diagonal included. acts as a scipy
+        LinearOperator, and sums and scalar multiples of them stay in this form.
+
+        Parameters
+        ----------
+        upper: sparse matrix
+            the elements [i,j] with i <= j. the indices are kept as int32.
+        """
+        upper = csr_matrix(upper)
+        if upper.shape[0] != upper.shape[1]:
+            raise ValueError("symmetric matrices must be square, got shape " + str(upper.shape))
+        if np.iscomplexobj(upper.data):
+            raise TypeError("symmetric matrices must be real")
+        coo = upper.tocoo()
+        if np.any(coo.row > coo.col):
+            raise ValueError("upper must hold no elements below the diagonal")
+        upper.sum_duplicates()
+        upper.indices = upper.indices.astype(np.int32)
+        upper.indptr = upper.indptr.astype(np.int32)
+        self.upper = upper
+        self._diagonal = upper.diagonal()
+        super().__init__(upper.dtype,upper.shape)
+
+    @property
+    def nnz(self):
+        """
+        number of stored elements, those of the upper triangle.
+        """
+        return self.upper.nnz
+
+    def _matvec(self,x):
+        return self.upper @ x + self.upper.T @ x - self._diagonal * x
+
+    def _matmat(self,x):
+        return self.upper @ x + self.upper.T @ x - self._diagonal[:,None] * x
+
+    def _adjoint(self):
+        return self
+
+    def _transpose(self):
+        return self
+
+    def diagonal(self):
+        return self._diagonal.copy()
+
+    def tocsr(self):
+        """
+        the whole matrix as a csr matrix, with both triangles.
+        """
+        return csr_matrix(self.upper + triu(self.upper,k=1,format='csr').T)
+
+    def toarray(self):
+        return self.tocsr().toarray()
+
+    def __mul__(self,other):
+        if np.isscalar(other):
+            if np.iscomplexobj(other):
+                raise TypeError("symmetric matrices can only be scaled by real numbers")
+            return Symmetric_matrix(self.upper * other)
+        return super().__mul__(other)
+
+    def __rmul__(self,other):
+        if np.isscalar(other):
+            return self.__mul__(other)
+        return super().__rmul__(other)
+
+    def __neg__(self):
+        return self * -1.0
+
+    def __add__(self,other):
+        if isinstance(other,Symmetric_matrix):
+            return Symmetric_matrix(self.upper + other.upper)
+        if isspmatrix(other):
+            #a sparse symmetric matrix, only its upper triangle is used
+            return Symmetric_matrix(self.upper + triu(other,format='csr'))
+        return super().__add__(other)
+
+    def __radd__(self,other):
+        return self.__add__(other)
+
+    def __sub__(self,other):
+        return self + (-1.0) * other
+
+    def __rsub__(self,other):
+        return (-1.0) * self + other
+
+def symmetric_matrix(values,rows,cols,shape):
+    """
+    a Symmetric_matrix from the elements values at (rows[k],cols[k]), each pair given once from
+    either triangle. pairs given more than once are summed, as for coo_matrix.
+    """
+    rows = np.asarray(rows,dtype=np.int32)
+    cols = np.asarray(cols,dtype=np.int32)
+    upper_rows = np.minimum(rows,cols)
+    upper_cols = np.maximum(rows,cols)
+    return Symmetric_matrix(coo_matrix((values,(upper_rows,upper_cols)),shape=shape))
@@ -0,0 +1,49 @@
+from ..angular import angular_overlap_analytical,angular_table,angular_factor,angular_factors
+from numba import jit
+import pytest
+import numpy as np
+
+
+def quantum_numbers(lmax):
+    return np.array([(l1,l2,m1,m2) for l1 in range(lmax) for l2 in range(max(0,l1-2),l1+3)
+                     for m1 in range(-l1,l1+1) for m2 in range(m1-2,m1+3) if abs(m2) <= l2])
+
+@pytest.mark.parametrize("para",[True,False])
+def test_table_matches_analytical(para):
+    table = angular_table(9)
+    q = quantum_numbers(9)
+    expected = [angular_overlap_analytical(l1,l2,m1,m2,para) for l1,l2,m1,m2 in q]
+    assert np.all(angular_factors(table,q[:,0],q[:,1],q[:,2],q[:,3],para) == expected)
+    assert all(angular_factor(table,l1,l2,m1,m2,para) == e for (l1,l2,m1,m2),e in zip(q,expected))
+
+def test_nopython():
+    """
+    the table can be read from compiled code
+    """
+    @jit(nopython=True)
+    def total(table,lmax):
+        s = 0.0
+        for l in range(lmax-1):
+            for m in range(-l,l+1):
+                s += angular_factor(table,l,l+1,m,m,True)**2
+        return s
+    table = angular_table(6)
+    expected = sum(angular_overlap_analytical(l,l+1,m,m,True)**2 for l in range(5) for m in range(-l,l+1))
+    assert total(table,6) == pytest.approx(expected)
+
+def test_table_shared_and_read_only():
+    assert angular_table(5) is angular_table(5)
+    with pytest.raises(ValueError):
+        angular_table(5)[0,0,4,1,1] = 1.0
+    assert angular_factors(angular_table(5),[7],[8],[0],[0],True)[0] == 0.0
+
+def test_sin_squared_factors():
+    """
+    the factors are the integrals of sin^2 between spherical harmonics
+    """
+    from ..angular import sin_squared_factors
+    from ..atom import _sph_harm
+    from scipy.integrate import quad
+    for l1,l2,m in [(0,0,0),(1,1,1),(2,0,0),(1,3,-1),(3,3,2),(2,4,2),(1,2,0)]:
+        integrand = lambda polar: 2*np.pi*np.sin(polar)**3 * np.real(np.conj(_sph_harm(m,l1,0.0,polar))*_sph_harm(m,l2,0.0,polar))
+        assert sin_squared_factors(l1,l2,m) == pytest.approx(quad(integrand,0,np.pi)[0],abs=1e-12)
@@ -0,0 +1,198 @@
+from ..atom import RydbergAtom,defect_matrix
+from ..elements import TripletHelium
+from ..state import State_nlm
+from ..space import Space
+import pytest
+import numpy as np
+
+
+def test_energies_match_energy():
+    """
+    the vectorised Ritz expansion agrees with the state by state one
+    """
+    atom = TripletHelium()
+    states = [State_nlm(n,l,0) for n in range(5,40,3) for l in range(min(n,8))]
+    n = np.array([s.n for s in states])
+    l = np.array([s.l for s in states])
+    energies = atom.energies(n,l)
+    assert energies == pytest.approx([atom.energy(s) for s in states],rel=1e-14)
+
+def test_energies_structured():
+    atom = TripletHelium()
+    states = np.array([(30,0),(30,1),(31,7)],dtype=[('n','i4'),('l','i4')])
+    assert atom.energies(states) == pytest.approx(atom.energies([30,30,31],[0,1,7]),rel=1e-15)
+
+def test_defect_matrix_padding():
+    coeffs = defect_matrix({0:{1:[0.3,0.1,0.02]},2:{3:[0.003]}})
+    assert coeffs.shape == (3,3)
+    assert np.all(coeffs[1] == 0.0) and coeffs[2,0] == 0.003
+
+def test_H0():
+    atom = TripletHelium()
+    space = Space(atom)
+    for n in range(20,23):
+        for l in range(3):
+            space.append(State_nlm(n,l,0))
+    assert space.H0().diagonal() == pytest.approx([atom.energy(s) for s in space],rel=1e-14)
+
+def test_sph_harm():
+    from ..atom import _sph_harm
+    from scipy import special
+    if not hasattr(special,'sph_harm_y'):
+        pytest.skip("needs scipy.special.sph_harm_y")
+    theta,phi = np.meshgrid(np.linspace(0,2*np.pi,7),np.linspace(0,np.pi,5))
+    for l,m in [(0,0),(3,2),(3,-2),(12,-7)]:
+        assert _sph_harm(m,l,theta,phi) == pytest.approx(special.sph_harm_y(l,m,phi,theta),abs=1e-12)
+
+def test_2d_wf_radial():
+    """
+    the interpolated radial part takes the numerov values on the grid points
+    """
+    atom = RydbergAtom()
+    state = State_nlm(10,2,1)
+    r,y = atom.get_radial_wf(state)
+    from ..atom import _interp_radial
+    assert _interp_radial(r[::7],r,y) == pytest.approx(y[::7],rel=1e-12)
+    _y,_z,radial,angular,r_grid = atom.get_2d_wf(state,num_points=21)
+    assert radial.shape == (21,21) and angular.shape == (21,21)
+
+def test_3d_wf_chunks():
+    """
+    the cube does not depend on the chunk size and is written into the given buffer
+    """
+    atom = RydbergAtom()
+    state = State_nlm(8,3,-1)
+    grid,whole = atom.get_3d_wf(state,num_points=16,density=False)
+    out = np.zeros((16,16,16),dtype=complex)
+    _,chunked = atom.get_3d_wf(state,num_points=16,density=False,out=out,chunk_size=100)
+    assert chunked is out and np.allclose(whole,chunked,rtol=0,atol=0)
+    _,density = atom.get_3d_wf(state,num_points=16)
+    assert density == pytest.approx(np.abs(whole)**2)
+    with pytest.raises(ValueError):
+        atom.get_3d_wf(state,num_points=16,out=out)
+
+@pytest.mark.parametrize("ml",[-2,0,3])
+def test_3d_wf_values(ml):
+    """
+    the compiled cube agrees with the radial interpolation times the spherical harmonic
+    """
+    from ..atom import _interp_radial,_sph_harm,_cart2sph
+    atom = RydbergAtom()
+    state = State_nlm(9,4,ml)
+    grid,cube = atom.get_3d_wf(state,num_points=11,density=False)
+    r,y = atom.get_radial_wf(state)
+    x,_y,z = np.meshgrid(grid,grid,grid,indexing='ij')
+    theta,phi,radius = _cart2sph(x,_y,z)
+    expected = _interp_radial(radius,r,y) * _sph_harm(ml,4,theta,phi)
+    assert np.allclose(cube,expected,rtol=1e-10,atol=1e-14)
+
+def test_element_cache_symmetric():
+    """
+    <a|r|b> and <b|r|a> are computed once and share an entry
+    """
+    atom = TripletHelium()
+    a,b = State_nlm(20,2,1),State_nlm(21,3,1)
+    value = atom.matrix_element(a,b,True)
+    assert atom.matrix_element(b,a,True) == value
+    assert atom.element_cache_info()['hits'] == 1 and len(atom.element_cache) == 1
+    assert atom.matrix_element(a,b,False) != value
+    atom.clear_element_cache()
+    assert atom.element_cache_info()['entries'] == 0
+
+def test_element_cache_limit():
+    atom = RydbergAtom(element_cache_size=2)
+    states = [State_nlm(10,l,0) for l in range(5)]
+    for s1,s2 in zip(states[:-1],states[1:]):
+        atom.matrix_element(s1,s2,True)
+    assert atom.element_cache_info()['evictions'] == 2 and len(atom.element_cache) == 2
+    off = RydbergAtom(element_cache_size=0)
+    off.matrix_element(states[0],states[1],True)
+    assert len(off.element_cache) == 0
+
+def test_stark_reuses_elements():
+    """
+    a second electric interaction on the same atom is built from the cache
+    """
+    from ..interaction import electric_interaction
+    atom = TripletHelium()
+    space = Space(atom)
+    for n in range(20,22):
+        for l in range(4):
+            space.append(State_nlm(n,l,0))
+    first = electric_interaction(space,True)
+    misses = atom.element_cache_info()['misses']
+    second = electric_interaction(space,True)
+    assert atom.element_cache_info()['misses'] == misses
+    assert np.all(first.toarray() == second.toarray())
+    assert atom.matrix_element(space[1],space[0],True) == first.toarray()[1,0]
+
+def test_stark_matches_matrix_element():
+    """
+    the bulk electric interaction agrees with the pair by pair matrix elements
+    """
+    from ..interaction import electric_interaction
+    atom = TripletHelium()
+    space = Space(atom)
+    for n in range(20,22):
+        for l in range(4):
+            for ml in range(-1,2):
+                if abs(ml) <= l:
+                    space.append(State_nlm(n,l,ml))
+    pairwise = TripletHelium()
+    for parallel,dml in ((True,0),(False,1)):
+        matrix = electric_interaction(space,parallel).toarray()
+        expected = [[pairwise.matrix_element(s1,s2,parallel) if abs(s1.l-s2.l) == 1 and abs(s1.ml-s2.ml) == dml else 0.0
+                     for s2 in space] for s1 in space]
+        assert np.allclose(matrix,expected,rtol=1e-4,atol=1e-8)
+
+def test_element_cache_lookup():
+    """
+    the bulk lookup and update count and evict as get and add
+    """
+    from ..atom import Element_cache
+    cache = Element_cache(max_entries=3)
+    numbers = np.array([(10,0,0),(10,1,0),(11,0,0),(11,1,0)],dtype=[('n','i2'),('l','i2'),('ml','i2')])
+    keys = cache.keys(numbers[[1,0,3]],numbers[[0,3,2]])
+    assert keys.dtype == np.uint64
+    assert (True,1.0,int(keys[0])) == Element_cache.key(State_nlm(10,0,0),State_nlm(10,1,0),True)
+    cache.update(keys[:2],[1.0,2.0],True)
+    values,missing = cache.lookup(keys,True)
+    assert values[:2].tolist() == [1.0,2.0] and list(missing) == [2]
+    assert cache.info()['hits'] == 2 and cache.info()['misses'] == 1
+    assert np.all(np.isnan(cache.lookup(keys,False)[0]))
+    cache.update(keys[2:],[3.0],True)
+    cache.add(Element_cache.key(State_nlm(12,0,0),State_nlm(12,1,0),True),4.0)
+    assert len(cache) == 3 and cache.evictions == 1 and cache.get((True,1.0,int(keys[0]))) is None
+    assert cache.get((True,1.0,int(keys[1]))) == 2.0
+    #a batch larger than the cache is not added, rather than evicting everything
+    cache.update(cache.keys(numbers[[0,1,2,3]],numbers[[1,2,3,0]]),[5.0,6.0,7.0,8.0],False)
+    assert len(cache) == 3 and cache.evictions == 1
+
+def test_radial_overlaps_match_table():
+    """
+    the overlaps of a few pairs are the entries of the table of all the states
+    """
+    atom = TripletHelium()
+    space = Space.from_ranges(atom,n=(20,22),l=(0,3),ml=0)
+    index,table = atom.radial_table(space.states)
+    rows = np.array([0,1,5,9,2])
+    cols = np.array([1,2,4,10,1])
+    overlaps = TripletHelium().radial_overlaps(space.array[rows],space.array[cols])
+    assert np.allclose(overlaps,table[index[rows],index[cols]],rtol=1e-12,atol=0)
+
+def test_radial_moments_mass_scaling():
+    """
+    each power of r is scaled by the reduced mass to that power, checked against the hydrogen
+    closed form <n l|r^2|n l> = n^2 (5n^2 + 1 - 3l(l+1)) / 2 for a light core
+    """
+    from ..atom import m_e,m_atomic
+    atom = RydbergAtom(mass=2*m_e/m_atomic)
+    assert atom.scalefactor == pytest.approx(0.5)
+    n,l = 20,3
+    state = State_nlm(n,l,0)
+    exact = n**2 * (5*n**2 + 1 - 3*l*(l + 1)) / 2.0
+    moments = atom.radial_moments(state,state,[1.0,2.0])
+    assert moments[1] == pytest.approx(exact * atom.scalefactor**2,rel=1e-3)
+    assert atom.radial_overlap(state,state,2.0) == pytest.approx(moments[1],rel=1e-12)
+    index,tables = atom.radial_tables([state],[2.0],dl=0)
+    assert tables[0][index[0],index[0]] == pytest.approx(moments[1],rel=1e-12)
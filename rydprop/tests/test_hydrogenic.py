@@ -0,0 +1,36 @@
+from ..hydrogenic import gordon_dipole,radial_overlap_hydrogenic
+from ..numerov import radial_overlap
+import pytest
+import numpy as np
+
+
+def test_2p_1s():
+    """
+    <2p|r|1s> = 2^7 sqrt(6) / 3^5, the magnitude is independent of sign convention
+    """
+    assert abs(gordon_dipole(2,1,1,0)) == pytest.approx(2**7*np.sqrt(6)/3**5,rel=1e-12)
+
+def test_same_n():
+    """
+    <n l|r|n l-1> = 3/2 n sqrt(n^2 - l^2)
+    """
+    assert gordon_dipole(30,5,30,4) == pytest.approx(1.5*30*np.sqrt(30**2-5**2))
+
+def test_symmetric():
+    assert gordon_dipole(12,3,15,4) == gordon_dipole(15,4,12,3)
+
+@pytest.mark.parametrize("n1,l1,n2,l2", [(10,3,12,2),(30,5,31,6),(50,10,60,11),(40,39,41,38)])
+def test_matches_numerov(n1,l1,n2,l2):
+    """
+    closed form agrees with the numerov integration, including the sign
+    """
+    numerov = radial_overlap(float(n1),l1,float(n2),l2,1.0)
+    assert gordon_dipole(n1,l1,n2,l2) == pytest.approx(numerov,rel=1e-4)
+
+@pytest.mark.xfail(raises=ValueError)
+def test_delta_l():
+    gordon_dipole(10,3,12,5)
+
+@pytest.mark.xfail(raises=ValueError)
+def test_order():
+    radial_overlap_hydrogenic(10,3,12,2,p=2.0)
@@ -0,0 +1,238 @@
+from ..interaction import electric_interaction,spherical_operators,polarisation_operator,field_vector
+from ..elements import TripletHelium
+from ..state import State_nlm
+from ..space import Space
+import pytest
+import numpy as np
+
+
+def make_space(ns=range(10,12)):
+    space = Space(TripletHelium())
+    for n in ns:
+        for l in range(4):
+            for ml in range(-l,l+1):
+                space.append(State_nlm(n,l,ml))
+    return space
+
+def test_z_is_parallel():
+    space = make_space()
+    operators = spherical_operators(space)
+    z = polarisation_operator(operators,field_vector(0.0))
+    assert np.allclose(z.toarray(),electric_interaction(space,True).toarray(),rtol=1e-12,atol=0)
+
+def test_x_matches_perpendicular_spectrum():
+    """
+    the x operator is the perpendicular interaction up to a phase on each state
+    """
+    space = make_space()
+    x = polarisation_operator(spherical_operators(space),[1.0,0.0,0.0])
+    perp = electric_interaction(space,False).toarray()
+    ml = np.array([state.ml for state in space])
+    phase = np.diag((-1.0)**(ml*(ml+1)//2))
+    assert np.allclose(phase @ x.toarray() @ phase,perp,rtol=1e-12,atol=1e-12)
+    assert np.allclose(np.linalg.eigvalsh(x.toarray()),np.linalg.eigvalsh(perp),atol=1e-9)
+
+def test_adjoint():
+    operators = spherical_operators(make_space())
+    assert np.allclose(operators[-1].toarray(),-operators[1].toarray().T)
+
+def test_y_hermitian():
+    space = make_space()
+    dense = polarisation_operator(spherical_operators(space),[0.0,1.0,0.0]).toarray()
+    assert np.iscomplexobj(dense) and np.allclose(dense,dense.conj().T)
+
+def test_linear_in_polarisation():
+    """
+    tilted and elliptical couplings are the sums of the cartesian ones
+    """
+    operators = spherical_operators(make_space())
+    x,y,z = [polarisation_operator(operators,e).toarray() for e in np.eye(3)]
+    tilted = polarisation_operator(operators,field_vector(0.3,1.1)).toarray()
+    assert np.allclose(tilted,np.sin(0.3)*np.cos(1.1)*x + np.sin(0.3)*np.sin(1.1)*y + np.cos(0.3)*z)
+    elliptical = polarisation_operator(operators,[1.0,0.5j,0.0]).toarray()
+    assert np.allclose(elliptical,x + 0.5j*y)
+
+def test_operators_built_once():
+    """
+    the operators are kept by the space, and extended to appended states
+    """
+    space = make_space(range(10,11))
+    operators = spherical_operators(space)
+    assert all(('spherical',q,True) in space._matrices for q in (-1,0,1))
+    assert all((spherical_operators(space)[q] != operators[q]).nnz == 0 for q in (-1,0,1))
+    for l in range(4):
+        for ml in range(-l,l+1):
+            space.append(State_nlm(11,l,ml))
+    grown = spherical_operators(space)
+    fresh = spherical_operators(make_space(range(10,12)))
+    for q in (-1,0,1):
+        assert grown[q].shape == (len(space),len(space))
+        assert np.allclose(grown[q].toarray(),fresh[q].toarray(),rtol=1e-12,atol=0)
+
+@pytest.mark.parametrize("dl,dml",[(1,0),(0,0),(2,1)])
+def test_radial_moment_matrices_selection(dl,dml):
+    from ..interaction import radial_moment_matrices
+    space = make_space()
+    index,tables = space.atom.radial_tables(space.states,[1.0,2.0],dl)
+    matrices = radial_moment_matrices(space,[1.0,2.0],dl,dml)
+    for table,matrix in zip(tables,matrices):
+        #each pair is taken from the lower triangle of the table and mirrored
+        expected = [[table[index[max(i,j)],index[min(i,j)]] if abs(s1.l-s2.l) == dl and abs(s1.ml-s2.ml) == dml else 0.0
+                     for j,s2 in enumerate(space)] for i,s1 in enumerate(space)]
+        assert np.all(matrix.toarray() == expected)
+
+def test_selection_pairs_start():
+    from ..interaction import selection_pairs
+    space = make_space()
+    ls,mls = space.array['l'],space.array['ml']
+    i,j = selection_pairs(ls,mls,1,(0,))
+    i5,j5 = selection_pairs(ls,mls,1,(0,),start=20)
+    assert len(set(zip(i.tolist(),j.tolist()))) == len(i)
+    assert set(zip(i5.tolist(),j5.tolist())) == set((a,b) for a,b in zip(i.tolist(),j.tolist()) if max(a,b) >= 20)
+
+@pytest.mark.parametrize("parallel",[True,False])
+def test_workers_match_serial(parallel):
+    from ..interaction import interaction
+    serial = electric_interaction(make_space(),parallel)
+    threaded = interaction(make_space(),'elec',parallel,workers=3)
+    assert (serial != threaded).nnz == 0
+
+def test_radial_table_workers():
+    """
+    sharing the integration and the l blocks between threads gives the serial table
+    """
+    space = make_space()
+    index,table = space.atom.radial_table(space.states)
+    threaded_index,threaded = TripletHelium().radial_table(space.states,workers=4)
+    assert np.all(index == threaded_index) and np.all(table.toarray() == threaded.toarray())
+
+def test_workers_only_threaded():
+    from ..interaction import interaction
+    with pytest.raises(ValueError):
+        interaction(make_space(),'mag',True,workers=2)
+
+def test_dipole_coupling_matrix():
+    """
+    the coupling matrix of two adiabatic states on one space is the electric interaction
+    """
+    from ..adiabatic import Adiabatic,get_dipole_coupling_matrix
+    space = make_space()
+    parameters = np.linspace(0.0,1.0,3)
+    vecs = np.tile(np.eye(len(space))[0],(3,1))
+    state1 = Adiabatic(space,np.zeros(3),vecs,parameters)
+    state2 = Adiabatic(space,np.ones(3),vecs,parameters)
+    coupling = get_dipole_coupling_matrix(state1,state2,True,workers=2)
+    assert np.all(coupling.toarray() == electric_interaction(space,True).toarray())
+
+@pytest.mark.parametrize("int_type,parallel",[('elec',True),('elec',False),('mag',True),('osc',True)])
+def test_symmetric_interaction(int_type,parallel):
+    """
+    the upper triangle container holds the interaction matrix, also block by block
+    """
+    from ..interaction import interaction
+    from ..symmetric import Symmetric_matrix
+    space = make_space()
+    symmetric = interaction(space,int_type,parallel,symmetric=True)
+    matrix = interaction(space,int_type,parallel)
+    assert isinstance(symmetric,Symmetric_matrix)
+    assert np.all(symmetric.toarray() == matrix.toarray())
+    if parallel:
+        blocks = interaction(space,int_type,parallel,symmetry='ml',symmetric=True)
+        expected = interaction(space,int_type,parallel,symmetry='ml')
+        assert all(np.all(b.toarray() == e.toarray()) for b,e in zip(blocks,expected))
+
+def test_symmetric_diagonaliser(monkeypatch):
+    """
+    the hohi diagonaliser takes the symmetric interaction, without expanding it, and finds the eigenvalues
+    of the whole matrix
+    """
+    from ..interaction import interaction
+    from ..hohi.adiabatic_solver.plugins.diag_engine import Diagonaliser
+    space = make_space()
+    h0 = space.H0()
+    h1 = interaction(space,'elec',True,symmetric=True)
+    sparse = Diagonaliser(True,4,h0,h1)
+    assert sparse.h1 is h1
+    def expand(self):
+        raise AssertionError("the symmetric matrix was expanded")
+    monkeypatch.setattr(type(h1),'tocsr',expand)
+    vals,vecs = sparse(1e-6,np.mean(h0.diagonal()))
+    dense = np.linalg.eigvalsh(h0.toarray() + 1e-6*interaction(space,'elec',True).toarray())
+    assert all(np.min(np.abs(dense - val)) < 1e-12 for val in np.real(vals))
+
+def test_diamagnetic_interaction():
+    """
+    the matrix is the radial p = 2 moments times the sin^2 factors, extended to appended states
+    """
+    from ..interaction import interaction
+    from ..angular import sin_squared_factors
+    space = make_space(range(10,11))
+    assert interaction(space,'dia',True).shape == (len(space),len(space))
+    for l in range(4):
+        for ml in range(-l,l+1):
+            space.append(State_nlm(11,l,ml))
+    matrix = interaction(space,'dia',True).toarray()
+    atom = TripletHelium()
+    expected = [[sin_squared_factors(s1.l,s2.l,s1.ml)*atom.radial_overlap(s1,s2,2.0) if s1.ml == s2.ml else 0.0
+                 for s2 in space] for s1 in space]
+    assert np.allclose(matrix,expected,rtol=1e-5,atol=0)
+    assert np.all(matrix == matrix.T)
+    assert np.allclose(interaction(space,'dia',True,symmetric=True).toarray(),matrix,rtol=1e-12,atol=0)
+
+def test_field_hamiltonian():
+    """
+    the hamiltonian at any fields is the weighted sum of the pieces
+    """
+    from ..interaction import Field_hamiltonian,field_interactions
+    space = make_space()
+    hamiltonian = Field_hamiltonian(space)
+    pieces = field_interactions(space)
+    field,magnetic,theta = 2e-7,1e-5,0.4
+    expected = space.H0() + field*np.cos(theta)*pieces['parallel'] + field*np.sin(theta)*pieces['perpendicular'] \
+        + magnetic*pieces['paramagnetic'] + magnetic**2/8*pieces['diamagnetic']
+    matrix = hamiltonian(field,magnetic,theta)
+    assert np.allclose(matrix.toarray(),expected.toarray(),rtol=1e-14,atol=0)
+    assert (matrix != matrix.T).nnz == 0
+    #the perpendicular piece is the x coupling of the tilted field
+    tilted = polarisation_operator(spherical_operators(space),field_vector(theta)).toarray()
+    assert np.allclose(np.cos(theta)*pieces['parallel'].toarray() + np.sin(theta)*pieces['perpendicular'].toarray(),tilted)
+    assert np.all(Field_hamiltonian(space,energies=False)(0.0,0.0).toarray() == 0.0)
+
+def test_field_grid_sweep():
+    """
+    a hohi grid sweep over (F,B) with the field pieces gives the spectra of Field_hamiltonian
+    """
+    from ..interaction import Field_hamiltonian,field_interactions
+    from ..hohi.adiabatic_solver.grid_solver import Grid_solver
+    space = make_space(range(10,11))
+    pieces = field_interactions(space)
+    axes = [np.linspace(0,1e-6,2),np.linspace(0,1e-4,3)]
+    h1s = [pieces['parallel'].toarray(),pieces['paramagnetic'].toarray(),pieces['diamagnetic'].toarray()]
+    vals = Grid_solver(space.H0().toarray(),h1s,axes,weights=lambda field,magnetic: (field,magnetic,magnetic**2/8)).run()
+    hamiltonian = Field_hamiltonian(space)
+    for i,field in enumerate(axes[0]):
+        for j,magnetic in enumerate(axes[1]):
+            assert np.allclose(np.sort(vals[i,j]),np.linalg.eigvalsh(hamiltonian(field,magnetic).toarray()),rtol=1e-12,atol=0)
+
+def test_field_grid_crossing():
+    """
+    the sparse seeded grid sweep follows the ml = +1 and -1 states of n = 10, l = 3 through their
+    crossing at B = 0, where sorting by energy would swap them
+    """
+    from ..interaction import field_interactions
+    from ..hohi.adiabatic_solver.grid_solver import Grid_solver
+    space = make_space(range(10,12))
+    pieces = field_interactions(space)
+    h1s = [pieces['parallel'],pieces['paramagnetic'],pieces['diamagnetic']]
+    axes = [np.linspace(1e-9,2e-9,2),np.linspace(-6e-7,6e-7,4)]
+    sigma = space.atom.energy(State_nlm(10,3,0)) + 1e-8
+    solver = Grid_solver(space.H0(),h1s,axes,weights=lambda field,magnetic: (field,magnetic,magnetic**2/8),
+                         sigma=sigma,num_eigs=3,return_vecs=True,follow=False)
+    vals,vecs = solver.run()
+    assert np.isrealobj(vecs)
+    ml = space.array['ml']
+    mls = np.einsum('ijnk,n->ijk',np.abs(vecs)**2,ml)
+    assert np.allclose(mls,mls[0,0],rtol=0,atol=1e-8)
+    assert sorted(np.round(mls[0,0]).tolist()) == [-1.0,0.0,1.0]
+    plus,minus = np.argmax(mls[0,0]),np.argmin(mls[0,0])
+    assert np.all(vals[:,0,plus] < vals[:,0,minus]) and np.all(vals[:,-1,plus] > vals[:,-1,minus])
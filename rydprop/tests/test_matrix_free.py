@@ -0,0 +1,72 @@
+from ..matrix_free import Stark_operator
+from ..interaction import electric_interaction
+from ..elements import TripletHelium
+from ..state import State_nlm
+from ..space import Space
+import pytest
+import numpy as np
+
+
+def make_space(ns=range(10,12)):
+    space = Space(TripletHelium())
+    for n in ns:
+        for l in range(4):
+            for ml in range(-l,l+1):
+                space.append(State_nlm(n,l,ml))
+    return space
+
+@pytest.mark.parametrize("parallel",[True,False])
+def test_matches_matrices(parallel):
+    """
+    products with vectors, blocks and complex vectors are those of H0 + F*H1
+    """
+    space = make_space()
+    operator = Stark_operator(space,parallel,field=2.0)
+    matrix = (space.H0() + 2.0*electric_interaction(space,parallel)).toarray()
+    x = np.random.rand(len(space))
+    assert np.allclose(operator @ x,matrix @ x,rtol=1e-12,atol=0)
+    block = np.random.rand(len(space),3) + 1j*np.random.rand(len(space),3)
+    assert np.allclose(operator @ block,matrix @ block,rtol=1e-12,atol=0)
+
+def test_with_field():
+    """
+    the operator at another field shares the table, and without energies is the interaction alone
+    """
+    space = make_space()
+    operator = Stark_operator(space,energies=False)
+    other = operator.with_field(0.5)
+    assert other.table is operator.table and operator.field == 1.0
+    x = np.random.rand(len(space))
+    assert np.allclose(other @ x,0.5*(electric_interaction(space,True) @ x),rtol=1e-12,atol=0)
+    assert np.all(Stark_operator(space,field=0.0) @ x == space.H0().diagonal() * x)
+
+def test_radial_memory():
+    """
+    at ml = 0 the radial blocks kept are no larger than the elements of H1, not the square of the
+    number of distinct (n,l)
+    """
+    space = Space.from_ranges(TripletHelium(),n=(20,30),ml=0)
+    operator = Stark_operator(space)
+    matrix = electric_interaction(space,True)
+    distinct = len(np.unique(operator.radial_index))
+    assert operator.blocks.nbytes == operator.table.nbytes <= matrix.data.nbytes
+    assert operator.blocks.nbytes < distinct**2 * 8 / 4
+    x = np.random.rand(len(space))
+    assert np.allclose(operator @ x,space.H0() @ x + matrix @ x,rtol=1e-12,atol=0)
+
+@pytest.mark.parametrize("iterative",['eigsh','lobpcg'])
+def test_adiabatic_solver_sparse_path(iterative):
+    """
+    the hohi diagonaliser finds the eigenvalues closest to sigma with only products
+    """
+    from ..hohi.adiabatic_solver.plugins.diag_engine import Diagonaliser
+    space = make_space()
+    h0 = space.H0()
+    h1 = Stark_operator(space,energies=False)
+    diagonaliser = Diagonaliser(True,4,h0,h1,iterative)
+    sigma = np.mean(h0.diagonal())
+    vals,vecs = diagonaliser(1e-6,sigma)
+    dense = np.linalg.eigvalsh(h0.toarray() + 1e-6*electric_interaction(space,True).toarray())
+    closest = np.sort(dense[np.argsort(np.abs(dense - sigma))[:4]])
+    assert np.allclose(np.sort(vals),closest,rtol=1e-10,atol=0)
+    assert vecs.shape == (len(space),4)
@@ -0,0 +1,102 @@
+from ..numerov import *
+import pytest
+import numpy as np
+
+
+def test_cached_overlap_matches_direct():
+    """
+    the cached overlap gives the same value as the uncached numba routine
+    """
+    clear_wf_cache()
+    direct = radial_overlap(20.3, 2, 21.1, 3, 1.0)
+    cached = cached_radial_overlap(20.3, 2, 21.1, 3, 1.0)
+    assert cached == pytest.approx(direct)
+
+def test_cache_hits():
+    """
+    second request for the same pair is served from the cache
+    """
+    clear_wf_cache()
+    cached_radial_overlap(15.2, 1, 16.2, 2)
+    cached_radial_overlap(15.2, 1, 16.2, 2)
+    info = wf_cache_info()
+    assert info['misses'] == 2 and info['hits'] == 2
+
+def test_cache_evicts_on_entries():
+    """
+    cache never holds more than max_entries wavefunctions
+    """
+    cache = Wf_cache(max_entries=2)
+    for n in [10.0, 11.0, 12.0]:
+        cache.get(n, 0, 12.0)
+    assert len(cache) == 2 and cache.evictions == 1
+
+def test_cache_evicts_on_memory():
+    """
+    cache keeps its memory below max_bytes
+    """
+    cache = Wf_cache(max_bytes=1)
+    cache.get(10.0, 0, 12.0)
+    cache.get(11.0, 0, 12.0)
+    assert len(cache) == 1
+
+def test_cache_clear():
+    cache = Wf_cache()
+    cache.get(10.0, 0, 10.0)
+    cache.clear()
+    assert len(cache) == 0 and cache.nbytes == 0 and cache.misses == 0
+
+def test_cached_arrays_readonly():
+    cache = Wf_cache()
+    r, y = cache.get(10.0, 0, 10.0)
+    assert r.flags.writeable == False and y.flags.writeable == False
+
+@pytest.mark.parametrize("n,l,nmax", [(10.0,0,10.0),(30.3,2,35.0),(99.9,5,120.0)])
+def test_prealloc_matches_wf(n,l,nmax):
+    """
+    the preallocated integrator reproduces wf exactly
+    """
+    r1,y1 = wf(n,l,nmax)
+    r2,y2 = wf_prealloc(n,l,nmax)
+    assert np.array_equal(r1,r2) and np.allclose(y1,y2,rtol=1e-12,atol=0.0)
+
+def test_moments_match_overlap():
+    """
+    every moment from one alignment equals the separate overlap
+    """
+    powers = [-3.0,1.0,2.0]
+    moments = radial_moments(20.3,2,21.1,3,powers)
+    for p,m in zip(powers,moments):
+        assert m == pytest.approx(radial_overlap(20.3,2,21.1,3,p))
+
+def test_adaptive_on_aligned_grid():
+    """
+    adaptive wavefunctions can be overlapped with fixed step ones
+    """
+    r1,y1 = wf(60.0,3,61.0)
+    r2,y2,points = wf_adaptive(61.0,4,61.0,tol=1e-7)
+    assert r1[0] in r2
+    assert wf_overlap(r1,y1,r2,y2,1.0) == pytest.approx(radial_overlap(60.0,3,61.0,4,1.0),rel=1e-3)
+
+def test_adaptive_accuracy_high_n():
+    """
+    at n = 120 the adaptive step beats the fixed step against the exact hydrogen value
+    """
+    from ..hydrogenic import gordon_dipole
+    exact = gordon_dipole(120,3,121,4)
+    r1,y1,_ = wf_adaptive(120.0,3,121.0,tol=1e-7)
+    r2,y2,_ = wf_adaptive(121.0,4,121.0,tol=1e-7)
+    adaptive = wf_overlap(r1,y1,r2,y2,1.0)
+    fixed = radial_overlap(120.0,3,121.0,4,1.0)
+    assert abs(adaptive/exact - 1) < 1e-4 and abs(adaptive/exact - 1) < abs(fixed/exact - 1)
+
+def test_adaptive_reports_points():
+    """
+    the wavefunction is kept on the points of the fixed step grid, all of which are integrated
+    """
+    r,y,points = wf_adaptive(100.0,3,100.0,tol=1e-6)
+    r_fixed,y_fixed = wf_prealloc(100.0,3,100.0)
+    n = min(len(r),len(r_fixed))
+    assert np.array_equal(r[:n],r_fixed[:n])
+    assert points >= len(r)
+    assert np.sum(y**2 * r**2) == pytest.approx(1.0)
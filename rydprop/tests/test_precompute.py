@@ -0,0 +1,74 @@
+from ..precompute import radial_pairs,pair_key
+from ..atom import RydbergAtom
+from ..state import State_nlm
+import pytest
+import numpy as np
+
+defects = {0:{1:[0.29665486,0.0]},1:{2:[0.06835886,0.0]},2:{3:[0.00289043,0.0]}}
+
+def states(ns,lmax=4):
+    return [State_nlm(n,l,0) for n in ns for l in range(min(n,lmax+1))]
+
+def test_pairs_cover_dipole_pairs():
+    """
+    every pair with |dl| = 1 appears in exactly one block, once
+    """
+    basis = states(range(20,31))
+    pairs,bounds = radial_pairs(basis,dl=1,block_size=3)
+    keys = [pair_key(s1.n,s1.l,s2.n,s2.l,1.0) for s1,s2 in pairs]
+    expected = set(pair_key(s1.n,s1.l,s2.n,s2.l,1.0) for s1 in basis for s2 in basis if abs(s1.l - s2.l) == 1)
+    assert len(keys) == len(set(keys)) and set(keys) == expected
+    assert bounds[0][0] == 0 and bounds[-1][1] == len(pairs)
+    assert all(b1[1] == b2[0] for b1,b2 in zip(bounds[:-1],bounds[1:]))
+
+@pytest.mark.parametrize("workers",[1,2])
+def test_precompute_matches_serial(workers):
+    """
+    the pooled integrals are the ones radial_overlap computes on its own
+    """
+    basis = states(range(25,29))
+    atom = RydbergAtom(defects=defects)
+    assert atom.precompute_radial(basis,workers=workers,block_size=2) == len(radial_pairs(basis)[0])
+    serial = RydbergAtom(defects=defects)
+    for s1,s2 in [(basis[0],basis[6]),(basis[3],basis[12]),(basis[7],basis[17])]:
+        assert atom.radial_overlap(s1,s2) == serial.radial_overlap(s1,s2)
+    assert atom.precompute_radial(basis,workers=workers) == 0
+
+def test_precompute_fills_store(tmp_path):
+    basis = states(range(25,27))
+    atom = RydbergAtom(defects=defects)
+    atom.use_radial_store(str(tmp_path))
+    atom.precompute_radial(basis,workers=1)
+    atom.radial_store.flush()
+    other = RydbergAtom(defects=defects)
+    other.use_radial_store(str(tmp_path))
+    assert other.precompute_radial(basis,workers=1) == 0
+    assert other.radial_overlap(basis[1],basis[7]) == atom.radial_overlap(basis[1],basis[7])
+
+def test_pool_after_parallel_kernel():
+    """
+    the pool still runs once numba's thread pool has been started by an interaction
+    """
+    from ..interaction import interaction
+    from ..space import Space
+    atom = RydbergAtom(defects=defects)
+    space = Space(atom)
+    for state in states(range(25,27)):
+        space.append(state)
+    interaction(space,'elec',True,workers=2)
+    assert atom.precompute_radial(space,workers=2,block_size=1) > 0
+    atom.clear_radial_cache()
+    assert all(len(cache) == 0 for cache in atom.radial_cache.values())
+
+def test_precompute_kept_apart_from_grid():
+    """
+    the precomputed pair grid values are not used for the shared grid of radial_overlaps
+    """
+    basis = states(range(25,27))
+    atom = RydbergAtom(defects=defects)
+    atom.precompute_radial(basis,workers=1)
+    assert len(atom.radial_cache['pair']) > 0 and len(atom.radial_cache['grid']) == 0
+    numbers = np.array([(s.n,s.l) for s in basis],dtype=[('n','i4'),('l','i4')])
+    rows,cols = np.array([1,3]),np.array([7,7])
+    fresh = RydbergAtom(defects=defects).radial_overlaps(numbers[rows],numbers[cols])
+    assert np.all(atom.radial_overlaps(numbers[rows],numbers[cols]) == fresh)
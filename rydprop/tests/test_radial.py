@@ -0,0 +1,86 @@
+from ..radial import Radial_grid
+from ..numerov import radial_overlap
+import pytest
+import numpy as np
+
+
+def test_unique_states():
+    """
+    repeated (n*,l) pairs share a single row of the grid
+    """
+    grid = Radial_grid([20.1,20.1,21.1],[1,1,2])
+    assert len(grid) == 2 and list(grid.index) == [0,0,1]
+
+def test_block_matches_pairwise():
+    """
+    the matrix product agrees with the pairwise numerov overlap
+    """
+    neffs = [20.2,21.2,22.2,20.1,21.1]
+    ls = [1,1,1,2,2]
+    grid = Radial_grid(neffs,ls)
+    rows1,rows2,block = grid.block(1,2)
+    for i,r1 in enumerate(rows1):
+        for j,r2 in enumerate(rows2):
+            direct = radial_overlap(neffs[r1],1,neffs[r2],2,1.0)
+            assert block[i,j] == pytest.approx(direct,rel=1e-3)
+
+def test_matrix_symmetric():
+    grid = Radial_grid([20.2,21.2,20.1,21.1],[1,1,2,2])
+    table = grid.matrix(1.0).toarray()
+    assert np.allclose(table,table.T)
+
+def test_matrix_selection():
+    """
+    only pairs with l differing by dl are filled
+    """
+    grid = Radial_grid([20.2,21.2,20.1],[1,1,2])
+    table = grid.matrix(1.0)
+    assert table[0,1] == 0.0 and table[0,2] != 0.0
+
+def test_table_blocks():
+    """
+    the table keeps only the l blocks, and indexing it matches the blocks in either order
+    """
+    grid = Radial_grid([20.2,21.2,22.2,20.1,21.1,20.0],[1,1,1,2,2,3])
+    table = grid.matrix(1.0)
+    rows1,rows2,block = grid.block(1,2)
+    assert table.nbytes == block.nbytes + grid.block(2,3)[2].nbytes
+    assert np.array_equal(table[rows1[:,None],rows2[None,:]],block)
+    assert np.array_equal(table[rows2[:,None],rows1[None,:]],block.T)
+    assert np.all(table.toarray()[np.ix_(rows1,rows1)] == 0.0)
+
+@pytest.mark.xfail(raises=ValueError)
+def test_mismatched_lengths():
+    Radial_grid([20.2,21.2],[1])
+
+def test_block_moments():
+    """
+    the stacked product gives the same blocks as one power at a time
+    """
+    grid = Radial_grid([20.2,21.2,20.1,21.1],[1,1,2,2])
+    rows1,rows2,values = grid.block_moments(1,2,[1.0,2.0])
+    for k,p in enumerate([1.0,2.0]):
+        assert np.allclose(values[k],grid.block(1,2,p)[2])
+
+def test_independent_of_other_states():
+    """
+    integrals between two states are the same whatever else is on the grid, and the
+    wavefunctions of a second grid come from the cache
+    """
+    from ..numerov import clear_wf_cache,wf_cache_info
+    clear_wf_cache()
+    small = Radial_grid([20.2,20.1],[1,2])
+    large = Radial_grid([20.2,35.2,20.1,41.1],[1,1,2,2])
+    assert small.block(1,2)[2][0,0] == pytest.approx(large.block(1,2)[2][0,0],rel=1e-12)
+    assert wf_cache_info()['hits'] == 2
+
+@pytest.mark.parametrize("rows1,rows2",[([0,0,1,1],[3,4,3,4]),([0,2],[4,3])])
+def test_pairs_match_block(rows1,rows2):
+    """
+    the pairs are the entries of the block, whether taken from the product or summed one at a time
+    """
+    grid = Radial_grid([20.2,21.2,22.2,20.1,21.1],[1,1,1,2,2])
+    block_rows1,block_rows2,block = grid.block(1,2)
+    expected = [block[list(block_rows1).index(r1),list(block_rows2).index(r2)] for r1,r2 in zip(rows1,rows2)]
+    assert np.allclose(grid.pairs(rows1,rows2),expected,rtol=1e-12,atol=0)
+    assert np.all(grid.pairs(rows1,rows2,workers=2) == grid.pairs(rows1,rows2))
@@ -0,0 +1,171 @@
+from ..atom import RydbergAtom
+from ..state import State_nlm,State_nlj
+from ..space import Space
+import pickle
+import pytest
+
+
+def test_states_hashable():
+    assert State_nlm(10,2,1) == State_nlm(10,2,1)
+    assert hash(State_nlm(10,2,1)) == hash(State_nlm(10,2,1))
+    assert len({State_nlm(10,2,1),State_nlm(10,2,1),State_nlm(10,2,-1)}) == 2
+    assert State_nlj(10,2,2.5,-1.5) == State_nlj(10,2,2.5,-1.5)
+    assert State_nlm(10,2,1) != State_nlj(10,2,2.5,1.5)
+
+def test_states_immutable():
+    state = State_nlm(10,2,1)
+    with pytest.raises(AttributeError):
+        state._n = 11
+    with pytest.raises(AttributeError):
+        state.extra = 1
+    assert pickle.loads(pickle.dumps(state)) == state
+
+def test_space_index():
+    space = Space(RydbergAtom())
+    states = [State_nlm(n,l,ml) for n in range(10,30) for l in range(3) for ml in range(-l,l+1)]
+    for state in states:
+        space.append(state)
+    assert all(space.index(State_nlm(*state.quantum_numbers)) == i for i,state in enumerate(states))
+    assert space.index(State_nlm(40,0,0)) == None and State_nlm(40,0,0) not in space
+    assert State_nlm(12,1,-1) in space
+    with pytest.raises(ValueError):
+        space.append(State_nlm(10,0,0))
+    with pytest.raises(TypeError):
+        space.append(State_nlj(10,0,0.5,0.5))
+
+def test_array_columns():
+    """
+    the quantum numbers are held as columns and the states are rebuilt from them
+    """
+    space = Space(RydbergAtom())
+    states = [State_nlm(n,l,ml) for n in range(10,15) for l in range(3) for ml in range(-l,l+1)]
+    for state in states:
+        space.append(state)
+    assert space.array.dtype.names == ('n','l','ml') and len(space.array) == len(states)
+    assert list(space.array['ml']) == [s.ml for s in states]
+    assert list(space) == states and space[-1] == states[-1] and space.states[3:6] == states[3:6]
+    assert space.states.index(states[7]) == 7
+    with pytest.raises(ValueError):
+        space.array['n'][0] = 3
+    with pytest.raises(IndexError):
+        space[len(states)]
+    views = space.states
+    space.append(State_nlm(20,0,0))
+    assert space.states is views and views[-1] == State_nlm(20,0,0)
+
+def test_nlj_space():
+    from ..state import basis_options
+    atom = RydbergAtom(basis='nlj')
+    space = Space(atom)
+    space.append(State_nlj(10,2,2.5,-1.5))
+    space.append(State_nlj(10,2,1.5,-1.5))
+    assert space.index(State_nlj(10,2,1.5,-1.5)) == 1 and space[0] == State_nlj(10,2,2.5,-1.5)
+
+def test_from_ranges():
+    atom = RydbergAtom()
+    space = Space.from_ranges(atom,n=(10,12),l=(1,3),ml=(-1,2))
+    expected = [State_nlm(n,l,ml) for n in range(10,13) for l in range(1,4) for ml in range(max(-1,-l),min(2,l)+1)]
+    assert list(space) == expected and space.index(expected[-1]) == len(expected) - 1
+    assert len(Space.from_ranges(atom,n=5)) == 25
+    assert [s.l for s in Space.from_ranges(atom,n=(3,4),ml=2)] == [2,2,3]
+    with pytest.raises(ValueError):
+        space.append(State_nlm(11,2,0))
+
+def test_from_energy_window():
+    from ..elements import TripletHelium
+    atom = TripletHelium()
+    Emin,Emax = atom.energy(State_nlm(20,0,0)),atom.energy(State_nlm(23,0,0))
+    space = Space.from_energy_window(atom,Emin,Emax,ml=0)
+    expected = [State_nlm(n,l,0) for n in range(15,30) for l in range(n)
+                if Emin <= atom.energy(State_nlm(n,l,0)) <= Emax]
+    assert list(space) == expected
+    with pytest.raises(ValueError):
+        Space.from_energy_window(atom,Emax,Emin)
+
+def test_energy_window_negative_defects():
+    """
+    states whose n lies below n* are still found, as are those whose defect is far from its limit
+    """
+    atom = RydbergAtom(defects={0:{1:[-1.6,0.0]},1:{2:[0.3,-4.0]},2:{3:[2.2,15.0]}})
+    Emin,Emax = -0.5/20.0**2,-0.5/22.0**2
+    Emin,Emax = Emin*atom.scalefactor,Emax*atom.scalefactor
+    space = Space.from_energy_window(atom,Emin,Emax,l=(0,3),ml=0)
+    expected = [State_nlm(n,l,0) for n in range(4,40) for l in range(min(n,4))
+                if Emin <= atom.energy(State_nlm(n,l,0)) <= Emax]
+    assert list(space) == expected and State_nlm(19,0,0) in space
+
+def test_blocks():
+    atom = RydbergAtom()
+    space = Space.from_ranges(atom,n=(5,6))
+    blocks = space.blocks('ml')
+    assert [block.label['ml'] for block in blocks] == list(range(-5,6))
+    assert sum(len(block) for block in blocks) == len(space)
+    for block in blocks:
+        assert all(space[i] == state for i,state in zip(block.parent_index,block))
+    both = space.blocks(['ml','parity'])
+    assert all(len(set((s.l % 2) for s in block)) == 1 for block in both)
+    with pytest.raises(KeyError):
+        space.blocks('j')
+
+def test_block_hamiltonians():
+    """
+    the block matrices are the diagonal blocks of the whole matrix, and nothing is lost off them
+    """
+    from ..interaction import interaction
+    from ..elements import TripletHelium
+    import numpy as np
+    space = Space.from_ranges(TripletHelium(),n=(6,7),l=(0,3))
+    whole = (space.H0() + 1e-3*interaction(space,'elec',True)).toarray()
+    blocks = space.blocks('ml')
+    matrices = [h0 + 1e-3*h1 for h0,h1 in zip(space.H0('ml'),interaction(space,'elec',True,symmetry='ml'))]
+    assembled = np.zeros_like(whole)
+    for block,matrix in zip(blocks,matrices):
+        assembled[np.ix_(block.parent_index,block.parent_index)] = matrix.toarray()
+    assert np.all(assembled == whole)
+    with pytest.raises(ValueError):
+        interaction(space,'elec',False,symmetry='ml')
+
+def test_incremental_matrices():
+    """
+    appending a manifold only builds the new rows, and gives the matrix of a fresh build
+    """
+    from ..interaction import interaction
+    from ..elements import TripletHelium
+    import numpy as np
+    space = Space.from_ranges(TripletHelium(),n=(8,9),l=(0,3),ml=0)
+    h0 = space.H0()
+    h1 = interaction(space,'elec',True)
+    for l in range(4):
+        space.append(State_nlm(10,l,0))
+    atom = space.atom
+    misses = atom.element_cache_info()['misses']
+    grown = interaction(space,'elec',True)
+    #only the pairs with an n = 10 state are looked up
+    assert atom.element_cache_info()['misses'] - misses == sum(1 for i in range(8,12) for j in range(i) if abs(space[i].l - space[j].l) == 1)
+    fresh = Space.from_ranges(TripletHelium(),n=(8,10),l=(0,3),ml=0)
+    assert np.allclose(grown.toarray(),interaction(fresh,'elec',True).toarray(),rtol=1e-10,atol=0)
+    assert np.all(grown.toarray()[:8,:8] == h1.toarray())
+    assert np.all(space.H0().diagonal() == fresh.H0().diagonal())
+    assert np.all(space.H0().diagonal()[:8] == h0.diagonal())
+
+@pytest.mark.parametrize("mmap",[True,False])
+def test_save_load(tmp_path,mmap):
+    from ..interaction import interaction
+    from ..elements import TripletHelium
+    import numpy as np
+    space = Space.from_ranges(TripletHelium(),n=(8,9),l=(0,3),ml=(-1,1))
+    h0 = space.H0()
+    h1 = interaction(space,'elec',True)
+    space.save(str(tmp_path))
+
+    loaded = Space.load(str(tmp_path),mmap=mmap)
+    assert list(loaded) == list(space) and loaded.index(space[5]) == 5
+    assert loaded.atom.defects == space.atom.defects and loaded.atom.mass == pytest.approx(space.atom.mass,rel=1e-15)
+    misses = loaded.atom.element_cache_info()['misses']
+    assert np.all(interaction(loaded,'elec',True).toarray() == h1.toarray())
+    assert np.all(loaded.H0().diagonal() == h0.diagonal())
+    assert loaded.atom.element_cache_info()['misses'] == misses
+    if mmap:
+        assert not loaded.H0().data.flags.writeable
+    loaded.append(State_nlm(10,0,0))
+    assert loaded.H0().shape == (len(space)+1,len(space)+1)
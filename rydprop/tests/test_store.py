@@ -0,0 +1,75 @@
+from ..store import Radial_store,pack_keys
+from ..atom import RydbergAtom
+import pytest
+import numpy as np
+
+
+def test_symmetric_keys():
+    """
+    <a|r^p|b> and <b|r^p|a> share a key
+    """
+    assert pack_keys(30,2,31,3,1.0) == pack_keys(31,3,30,2,1.0)
+    assert pack_keys(30,2,31,3,1.0) != pack_keys(30,2,31,3,2.0)
+
+def test_add_lookup(tmp_path):
+    store = Radial_store(RydbergAtom(),str(tmp_path))
+    store.add([30,31],[2,2],[31,32],[3,3],1.0,[1.5,2.5])
+    values = store.lookup([31,31,40],[3,2,2],[30,32,41],[2,3,3],1.0)
+    assert values[0] == 1.5 and values[1] == 2.5 and np.isnan(values[2])
+
+def test_persistent(tmp_path):
+    """
+    flushed integrals are found by a new store of the same atom
+    """
+    store = Radial_store(RydbergAtom(),str(tmp_path))
+    store.add(30,2,31,3,1.0,1.5)
+    store.flush()
+    store.add(40,2,41,3,1.0,2.5)
+    store.flush()
+    reopened = Radial_store(RydbergAtom(),str(tmp_path))
+    assert reopened.get(30,2,31,3) == 1.5 and reopened.get(40,2,41,3) == 2.5
+
+def test_keyed_by_atom(tmp_path):
+    """
+    atoms with different masses or defects do not share a store
+    """
+    store = Radial_store(RydbergAtom(),str(tmp_path))
+    store.add(30,2,31,3,1.0,1.5)
+    store.flush()
+    other = Radial_store(RydbergAtom(mass=4.002602),str(tmp_path))
+    assert other.get(30,2,31,3) == None and other.path != store.path
+
+def test_compact(tmp_path):
+    store = Radial_store(RydbergAtom(),str(tmp_path))
+    for n in range(10,13):
+        store.add(n,0,n,1,1.0,float(n))
+        store.flush()
+    store.compact()
+    assert len(store._chunks['pair']) == 1 and len(store) == 3 and store.get(11,0,11,1) == 11.0
+
+def test_auto_compact(tmp_path):
+    """
+    flushing more than max_chunks chunks merges them, so lookups stay on a few arrays
+    """
+    store = Radial_store(RydbergAtom(),str(tmp_path),max_chunks=2)
+    for n in range(10,15):
+        store.add(n,0,n,1,1.0,float(n))
+        store.flush()
+    assert len(store._chunks['pair']) <= 2 and len(store) == 5 and store.get(10,0,10,1) == 10.0
+
+def test_grids_apart(tmp_path):
+    """
+    integrals from the shared grid and from the pairwise grid do not share keys
+    """
+    store = Radial_store(RydbergAtom(),str(tmp_path))
+    store.add(30,2,31,3,1.0,1.5)
+    store.add(30,2,31,3,1.0,1.6,grid='grid')
+    store.flush()
+    reopened = Radial_store(RydbergAtom(),str(tmp_path))
+    assert reopened.get(30,2,31,3) == 1.5 and reopened.get(30,2,31,3,grid='grid') == 1.6
+    with pytest.raises(KeyError):
+        store.get(30,2,31,3,grid='global')
+
+@pytest.mark.xfail(raises=ValueError)
+def test_power_resolution():
+    pack_keys(30,2,31,3,0.3)
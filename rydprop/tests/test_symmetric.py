@@ -0,0 +1,51 @@
+from ..symmetric import Symmetric_matrix,symmetric_matrix
+from scipy.sparse import random,triu,diags
+import pytest
+import numpy as np
+
+
+def make_matrix(size=40):
+    matrix = random(size,size,density=0.1,random_state=3)
+    return (matrix + matrix.T).tocsr()
+
+def test_matvec():
+    """
+    products with vectors and blocks of vectors are those of the whole matrix
+    """
+    matrix = make_matrix()
+    symmetric = Symmetric_matrix(triu(matrix))
+    x = np.random.rand(40)
+    assert np.allclose(symmetric @ x,matrix @ x)
+    assert np.allclose(symmetric @ (1j*x),matrix @ (1j*x))
+    block = np.random.rand(40,3)
+    assert np.allclose(symmetric @ block,matrix @ block)
+    assert np.all(symmetric.toarray() == matrix.toarray())
+
+def test_half_storage():
+    matrix = make_matrix()
+    symmetric = Symmetric_matrix(triu(matrix))
+    assert symmetric.nnz == (matrix.nnz + np.count_nonzero(matrix.diagonal()))//2
+    assert symmetric.upper.indices.dtype == np.int32 and symmetric.upper.indptr.dtype == np.int32
+
+def test_from_either_triangle():
+    """
+    pairs may be given from either triangle, repeated ones are summed
+    """
+    symmetric = symmetric_matrix([1.0,2.0,3.0,4.0],[0,2,1,0],[1,0,1,2],(3,3))
+    assert np.all(symmetric.toarray() == [[0.0,1.0,6.0],[1.0,3.0,0.0],[6.0,0.0,0.0]])
+
+def test_arithmetic():
+    """
+    sums with sparse matrices and scalar multiples stay symmetric
+    """
+    matrix = make_matrix()
+    symmetric = Symmetric_matrix(triu(matrix))
+    h0 = diags(np.arange(40.0)).tocsr()
+    total = h0 + symmetric * 0.5
+    assert isinstance(total,Symmetric_matrix)
+    assert np.allclose(total.toarray(),(h0 + 0.5*matrix).toarray())
+    assert np.allclose((symmetric - h0).toarray(),(matrix - h0).toarray())
+
+@pytest.mark.xfail(raises=ValueError)
+def test_lower_elements():
+    Symmetric_matrix(make_matrix())